@@ -0,0 +1,85 @@
+# benchmark_tag_extraction.py
+# Post-page metadata extraction: targeted sidebar parser vs BeautifulSoup over the whole page.
+# Usage: python benchmark_tag_extraction.py [--pages benchmark_fixtures/safebooru/*.html] [--fetch 20] [--repeat 200]
+#   Runs on the Safebooru post pages saved in benchmark_fixtures/safebooru by default.
+#   --fetch N downloads N more random post pages into --fixture-dir first (needs network).
+#   Without saved pages a synthetic page shaped like Safebooru's post view is used.
+import argparse
+import asyncio
+import glob
+import os
+import random
+import time
+
+from utils.danbooru_api import extract_post_metadata, extract_post_metadata_bs4, get_post_html
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_fixtures", "safebooru")
+
+def synthetic_page(tags=60, comments=40, seed=0):
+    rng = random.Random(seed)
+    kinds = ["tag-type-copyright"] * 2 + ["tag-type-character"] * 3 + ["tag-type-artist"] + ["tag-type-general"] * (tags - 6)
+    items = "".join(
+        f'<li class="{kind} tag"><a href="index.php?page=wiki&amp;s=list&amp;search=t{i}">?</a> '
+        f'<a href="index.php?page=post&amp;s=list&amp;tags=tag_{i}_name">tag_{i}_name</a> '
+        f'<span class="tag-count">{rng.randint(1, 99999)}</span></li>\n'
+        for i, kind in enumerate(kinds)
+    )
+    head = "<html><head><title>Safebooru</title>" + '<script>var x = 1;</script>' * 20 + "</head><body>"
+    nav = '<div id="header"><ul id="navbar">' + "".join(f'<li><a href="/p{i}">Link {i}</a></li>' for i in range(30)) + "</ul></div>"
+    sidebar = f'<div id="post-view"><div class="sidebar"><ul id="tag-sidebar">{items}</ul>'
+    stats = '<div id="stats"><h5>Statistics</h5><ul><li>Id: 1234</li><li>Score: <span id="psc1234">42</span> (vote up)</li></ul></div></div>'
+    body = '<div class="content"><img id="image" src="/img.jpg"/>' + "".join(
+        f'<div class="comment"><p>Comment {i}: ' + "lorem ipsum " * 30 + "</p></div>" for i in range(comments)
+    ) + "</div></div>"
+    return head + nav + sidebar + stats + body + "</body></html>"
+
+async def fetch_pages(count, directory):
+    from utils.danbooru_api import get_random_danbooru_image
+    from utils.http_client import http_clients
+    os.makedirs(directory, exist_ok=True)
+    saved = 0
+    for _ in range(count * 2):
+        card = await get_random_danbooru_image(random.choice(["1girl", "1boy"]))
+        html = await get_post_html(card["id"]) if card else None
+        if html:
+            with open(os.path.join(directory, f"post_{card['id']}.html"), "w", encoding="utf-8") as f: f.write(html)
+            saved += 1
+        if saved >= count: break
+    await http_clients.close()
+    print(f"Saved {saved} pages to {directory}")
+
+def bench(fn, pages, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for html in pages: fn(html)
+    return (time.perf_counter() - start) / (repeat * len(pages)) * 1e6
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pages", default=os.path.join(FIXTURE_DIR, "*.html"))
+    ap.add_argument("--fixture-dir", default=FIXTURE_DIR)
+    ap.add_argument("--fetch", type=int, default=0)
+    ap.add_argument("--repeat", type=int, default=200)
+    args = ap.parse_args()
+
+    if args.fetch: asyncio.run(fetch_pages(args.fetch, args.fixture_dir))
+
+    paths = sorted(glob.glob(args.pages))
+    if paths:
+        pages = [open(p, encoding="utf-8").read() for p in paths]
+        print(f"{len(pages)} saved page(s), avg {sum(map(len, pages)) // len(pages)} chars")
+    else:
+        pages = [synthetic_page(seed=i) for i in range(5)]
+        print(f"No saved pages; using {len(pages)} synthetic pages, avg {sum(map(len, pages)) // len(pages)} chars")
+
+    mismatches = sum(extract_post_metadata(h) != extract_post_metadata_bs4(h) for h in pages)
+    print(f"Results identical on {len(pages) - mismatches}/{len(pages)} pages")
+
+    repeat = max(1, args.repeat // 10)
+    soup = bench(extract_post_metadata_bs4, pages, repeat)
+    fast = bench(extract_post_metadata, pages, args.repeat)
+    print(f"{'BeautifulSoup (whole page)':<28} {soup:10.1f} us/page")
+    print(f"{'sidebar parser':<28} {fast:10.1f} us/page   ({soup / fast:.1f}x)")
+
+if __name__ == "__main__":
+    main()
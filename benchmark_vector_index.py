@@ -0,0 +1,66 @@
+# benchmark_vector_index.py
+# Recall / latency comparison of exact vs IVF search on synthetic RPG memory threads.
+# Usage: python benchmark_vector_index.py [--sizes 10000,100000] [--dim 768] [--queries 200]
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+# Import the module directly: the cogs.rpg_system package pulls in discord and the DB on import
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "cogs", "rpg_system"))
+from vector_index import ThreadVectorIndex, IVFQuantizer
+
+def synthetic_thread(n, dim, rng, topics=200, spread=1.0):
+    """Embeddings cluster by topic in practice, so draw rows around a few hundred topic centres."""
+    centres = rng.standard_normal((topics, dim)).astype(np.float32)
+    labels = rng.integers(0, topics, n)
+    rows = centres[labels] + spread * rng.standard_normal((n, dim)).astype(np.float32)
+    return rows, centres
+
+def build_index(rows):
+    index = ThreadVectorIndex()
+    docs = [{"_id": i, "text": str(i), "vector": row, "timestamp": None} for i, row in enumerate(rows)]
+    index.add_many(docs)
+    return index
+
+def time_queries(index, queries, limit, exact):
+    results, start = [], time.perf_counter()
+    for q in queries:
+        results.append([int(t) for _, t in index.search(q, limit, threshold=-1.0, exact=exact)])
+    return results, (time.perf_counter() - start) / len(queries) * 1000
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="10000,100000")
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=5)
+    parser.add_argument("--nprobe", default="", help="comma list to sweep; default is the index's own choice")
+    args = parser.parse_args()
+    rng = np.random.default_rng(42)
+
+    for n in [int(s) for s in args.sizes.split(",")]:
+        rows, centres = synthetic_thread(n, args.dim, rng)
+        index = build_index(rows)
+        queries = centres[rng.integers(0, len(centres), args.queries)] + rng.standard_normal((args.queries, args.dim)).astype(np.float32)
+
+        truth, exact_ms = time_queries(index, queries, args.limit, exact=True)
+        print(f"\n=== {n} vectors x {args.dim} dims ===")
+        print(f"exact          : {exact_ms:8.3f} ms/query   recall@{args.limit} 1.000")
+
+        start = time.perf_counter()
+        unit, size, generation = index.unit_snapshot()
+        ivf = IVFQuantizer.train(unit)
+        index.attach_ivf(ivf, ivf.assign(unit), size, generation)
+        print(f"ivf build      : {time.perf_counter() - start:8.2f} s  ({ivf.nlist} lists)")
+
+        sweep = [int(p) for p in args.nprobe.split(",") if p] or [index.nprobe]
+        for nprobe in sweep:
+            index.nprobe = nprobe
+            found, ivf_ms = time_queries(index, queries, args.limit, exact=False)
+            recall = np.mean([len(set(f) & set(t)) / len(t) for f, t in zip(found, truth)])
+            print(f"ivf nprobe={nprobe:<4}: {ivf_ms:8.3f} ms/query   recall@{args.limit} {recall:.3f}   speedup {exact_ms / ivf_ms:5.1f}x")
+
+if __name__ == "__main__":
+    main()
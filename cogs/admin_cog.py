@@ -2,7 +2,7 @@
 import discord
 from discord import app_commands
 from discord.ext import commands
-from utils.db import rpg_world_state_collection
+from utils import world_store
 
 class AdminCog(commands.Cog, name="Admin"):
     def __init__(self, bot: commands.Bot):
@@ -79,15 +79,11 @@ class AdminCog(commands.Cog, name="Admin"):
         await interaction.response.defer(ephemeral=True)
         
         try:
-            # MongoDB Update: Set status='background' for all NPCs where role does NOT contain 'companion' or 'party'
-            result = rpg_world_state_collection.update_many(
-                {"thread_id": interaction.channel_id},
-                {"$set": {"npcs.$[elem].status": "background"}},
-                array_filters=[{"elem.attributes.role": {"$not": {"$regex": "companion|party", "$options": "i"}}}]
-            )
+            # Set status='background' for all NPCs whose role does NOT contain 'companion' or 'party'
+            modified = await world_store.demote_background_npcs(interaction.channel_id)
             
-            if result.modified_count > 0:
-                msg = f"✅ **Success:** Reset {result.modified_count} NPCs to background status.\n📉 **Context Bloat:** Reduced.\n🚀 **Next Turn:** Should be much faster."
+            if modified > 0:
+                msg = f"✅ **Success:** Reset {modified} NPCs to background status.\n📉 **Context Bloat:** Reduced.\n🚀 **Next Turn:** Should be much faster."
             else:
                 msg = "ℹ️ **No changes made.** Population was already optimized or no Matching NPCs found."
                 
@@ -96,5 +92,25 @@ class AdminCog(commands.Cog, name="Admin"):
         except Exception as e:
             await interaction.followup.send(f"❌ **Fix Failed:** {str(e)}", ephemeral=True)
 
+    @app_commands.command(name="migrate_world", description="[Admin] Move this adventure's world state to per-entity storage.")
+    @app_commands.checks.has_permissions(administrator=True)
+    async def migrate_world(self, interaction: discord.Interaction):
+        """
+        One NPC/location/quest/event per document: context building then reads only the active
+        entities and scribe updates rewrite a single small document. Safe to run more than once.
+        """
+        if not isinstance(interaction.channel, discord.Thread):
+            return await interaction.response.send_message("⚠️ Please run this command inside the Adventure Thread.", ephemeral=True)
+
+        await interaction.response.defer(ephemeral=True)
+        try:
+            moved = await world_store.migrate_thread(interaction.channel_id)
+            if moved:
+                await interaction.followup.send(f"✅ **Migrated:** {moved} entities moved to per-entity storage.", ephemeral=True)
+            else:
+                await interaction.followup.send("ℹ️ **Nothing to migrate.** This thread already uses per-entity storage or has no world data.", ephemeral=True)
+        except Exception as e:
+            await interaction.followup.send(f"❌ **Migration Failed:** {str(e)}", ephemeral=True)
+
 async def setup(bot: commands.Bot):
     await bot.add_cog(AdminCog(bot))
\ No newline at end of file
@@ -9,11 +9,18 @@ import asyncio
 from datetime import datetime, timedelta, timezone
 import google.generativeai as genai
 from google.generativeai.types import HarmCategory, HarmBlockThreshold
-import aiohttp
 import collections
-import functools
 # Updated imports to ensure they match utils/db.py
-from utils.db import ai_config_collection, ai_personal_memories_collection, server_lore_collection, rpg_sessions_collection, web_actions_collection
+from utils.db import (
+    async_ai_config_collection, async_ai_personal_memories_collection, async_server_lore_collection,
+    async_rpg_sessions_collection, async_web_actions_collection
+)
+from utils.config_cache import (
+    get_guild_config, invalidate_guild_config, update_guild_config,
+    add_invalidation_listener, remove_invalidation_listener
+)
+from utils.event_bus import event_bus
+from utils.http_client import http_clients
 
 from .prompts import SYSTEM_PROMPT
 from .response_handler import should_bot_respond_ai_check, process_message_batch, handle_single_user_response
@@ -21,17 +28,24 @@ from .proactive_chat import _initiate_conversation
 from .personality_updater import personality_update_loop, update_guild_personality
 from .server_context_learner import update_server_lore_summary
 from .utils import perform_web_search, identify_visual_content
+from .message_buffer import ChannelMessageBuffer
+from .respond_prefilter import ResponsePrefilter
+from .proactive_scheduler import ProactiveScheduler
 
 logger = logging.getLogger(__name__)
 
 class AIChatCog(commands.Cog, name="AIChat"):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
-        self.http_session = aiohttp.ClientSession()
+        self.http_session = http_clients.session()
         self.message_batches = {}
         self.batch_timers = {}
         self.BATCH_DELAY = 5
         self.ignored_messages = collections.deque(maxlen=500)
+        # Recent messages per channel, so the reply path never has to call channel.history()
+        self.message_buffer = ChannelMessageBuffer(maxlen=50)
+        # Local heuristics in front of the Flash "should I respond" call
+        self.respond_prefilter = ResponsePrefilter(bot_names=("antima",))
 
         safety_settings = {
             HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
@@ -49,19 +63,23 @@ class AIChatCog(commands.Cog, name="AIChat"):
             logger.error(f"Failed to configure Gemini AI: {e}")
             self.model = None
         
-        self.proactive_chat_loop.start()
+        self.control_events = event_bus.subscribe(
+            "chat_control_actions", async_web_actions_collection,
+            {"operationType": "insert", "fullDocument.type": {"$in": ["reload_chat", "invalidate_config"]}}
+        )
+        # Guilds sit in a heap keyed by next_chat_time; config changes reschedule them
+        self.proactive_scheduler = ProactiveScheduler(self._run_proactive_chat)
+        add_invalidation_listener(self.proactive_scheduler.on_config_invalidated)
+        self.proactive_scheduler.start(wait_for=self.bot.wait_until_ready)
         self.server_lore_update_loop.start()
         self.check_reload_requests.start()
 
     def cog_unload(self):
-        self.proactive_chat_loop.cancel()
+        remove_invalidation_listener(self.proactive_scheduler.on_config_invalidated)
+        self.proactive_scheduler.stop()
         self.server_lore_update_loop.cancel()
         self.check_reload_requests.cancel()
-        self.bot.loop.create_task(self.http_session.close())
-
-    async def run_db(self, func, *args, **kwargs):
-        partial_func = functools.partial(func, *args, **kwargs)
-        return await self.bot.loop.run_in_executor(None, partial_func)
+        self.control_events.close()
 
     def _calculate_next_chat_time(self, frequency: str = "normal") -> datetime | None:
         if frequency == "disabled": return None
@@ -72,18 +90,28 @@ class AIChatCog(commands.Cog, name="AIChat"):
         else: minutes = random.randint(120, 300)
         return now + timedelta(minutes=minutes)
 
-    @tasks.loop(seconds=3)
+    @tasks.loop(seconds=0)
     async def check_reload_requests(self):
         """Watches for restart signals from the dashboard for instant apply."""
         try:
-            req = await self.run_db(web_actions_collection.find_one_and_update, 
+            req = await async_web_actions_collection.find_one_and_update(
                 {"type": "reload_chat", "status": "pending"},
                 {"$set": {"status": "completed"}}
             )
             if req:
-                logger.info("♻️ Reload signal received. Restarting Proactive Chat Loop...")
-                self.proactive_chat_loop.restart()
+                logger.info("♻️ Reload signal received. Reloading Proactive Chat Schedule...")
+                invalidate_guild_config() # Also rebuilds the proactive scheduler's heap
+
+            # Config edits made from the dashboard process invalidate our cached copy here
+            while True:
+                inv = await async_web_actions_collection.find_one_and_update(
+                    {"type": "invalidate_config", "status": "pending"},
+                    {"$set": {"status": "completed"}}
+                )
+                if not inv: break
+                invalidate_guild_config(inv.get("guild_id"))
         except Exception: pass
+        await self.control_events.wait(3)
 
     @check_reload_requests.before_loop
     async def before_check_reload_requests(self):
@@ -93,7 +121,7 @@ class AIChatCog(commands.Cog, name="AIChat"):
     async def server_lore_update_loop(self):
         for guild in self.bot.guilds:
             try:
-                config = await self.run_db(ai_config_collection.find_one, {"_id": str(guild.id)})
+                config = await get_guild_config(guild.id)
                 if config and config.get("bot_disabled", False): continue
                 await update_server_lore_summary(self.summarizer_model, guild)
                 await asyncio.sleep(5)
@@ -103,72 +131,56 @@ class AIChatCog(commands.Cog, name="AIChat"):
     async def before_server_lore_update_loop(self):
         await self.bot.wait_until_ready()
 
-    @tasks.loop(minutes=1)
-    async def proactive_chat_loop(self):
-        try:
-            guild_configs = await self.run_db(lambda: list(ai_config_collection.find({"channel": {"$exists": True, "$ne": None}})))
-            now = datetime.now(timezone.utc)
-            for config in guild_configs:
-                try:
-                    guild_id = config["_id"]
-                    
-                    # 1. Immediate Disabled Check
-                    if config.get("bot_disabled", False): continue
-                    
-                    # 2. Frequency Check
-                    freq = config.get("chat_frequency", "normal")
-                    if freq == "disabled": continue
-
-                    # 3. Time Check
-                    next_time = config.get("next_chat_time")
-                    if next_time and next_time.tzinfo is None: next_time = next_time.replace(tzinfo=timezone.utc)
-                    
-                    if not next_time:
-                        new_next_time = self._calculate_next_chat_time(freq)
-                        if new_next_time:
-                            await self.run_db(ai_config_collection.update_one, {"_id": guild_id}, {"$set": {"next_chat_time": new_next_time}})
-                        continue
-
-                    if now < next_time: continue 
-                    
-                    # 4. Logic Execution
-                    guild = self.bot.get_guild(int(guild_id))
-                    channel = self.bot.get_channel(int(config.get('channel')))
-                    if not guild or not channel: continue
-
-                    if channel.last_message_id:
-                        try:
-                            last_msg = await channel.fetch_message(channel.last_message_id)
-                            if (now - last_msg.created_at) < timedelta(minutes=2):
-                                retry_time = now + timedelta(minutes=15)
-                                await self.run_db(ai_config_collection.update_one, {"_id": guild_id}, {"$set": {"next_chat_time": retry_time}})
-                                continue
-                        except: pass
-
-                    recent_users = await self.run_db(ai_personal_memories_collection.distinct, "user_id", {"guild_id": int(guild_id)})
-                    target_user = None
-                    if recent_users:
-                        for uid in recent_users:
-                            mem = guild.get_member(uid)
-                            if mem and not mem.bot:
-                                target_user = mem
-                                break
-                    if not target_user:
-                         online_members = [m for m in guild.members if not m.bot and m.status != discord.Status.offline]
-                         if online_members: target_user = random.choice(online_members)
-
-                    if target_user:
-                        await _initiate_conversation(self, channel, target_user)
-
-                    new_next_time = self._calculate_next_chat_time(freq)
-                    if new_next_time:
-                        await self.run_db(ai_config_collection.update_one, {"_id": guild_id}, {"$set": {"next_chat_time": new_next_time}})
-                except: continue
-        except: pass
-
-    @proactive_chat_loop.before_loop
-    async def before_proactive_chat_loop(self):
-        await self.bot.wait_until_ready()
+    async def _run_proactive_chat(self, guild_id: str):
+        """Called by the scheduler when a guild's next_chat_time is due; writes the next one."""
+        config = await async_ai_config_collection.find_one({"_id": guild_id})
+        if not config or config.get("bot_disabled", False): return
+        freq = config.get("chat_frequency", "normal")
+        if freq == "disabled": return
+
+        now = datetime.now(timezone.utc)
+        next_time = config.get("next_chat_time")
+        if next_time and next_time.tzinfo is None: next_time = next_time.replace(tzinfo=timezone.utc)
+
+        if not next_time:
+            new_next_time = self._calculate_next_chat_time(freq)
+            if new_next_time:
+                await update_guild_config(guild_id, {"next_chat_time": new_next_time}, upsert=False)
+            return
+
+        if now < next_time: return # Moved later since it was scheduled; the refresh picks up the new time
+
+        guild = self.bot.get_guild(int(guild_id))
+        channel = self.bot.get_channel(int(config.get('channel')))
+        if not guild or not channel: return
+
+        if channel.last_message_id:
+            try:
+                last_msg = await channel.fetch_message(channel.last_message_id)
+                if (now - last_msg.created_at) < timedelta(minutes=2):
+                    retry_time = now + timedelta(minutes=15)
+                    await update_guild_config(guild_id, {"next_chat_time": retry_time}, upsert=False)
+                    return
+            except: pass
+
+        recent_users = await async_ai_personal_memories_collection.distinct("user_id", {"guild_id": int(guild_id)})
+        target_user = None
+        if recent_users:
+            for uid in recent_users:
+                mem = guild.get_member(uid)
+                if mem and not mem.bot:
+                    target_user = mem
+                    break
+        if not target_user:
+             online_members = [m for m in guild.members if not m.bot and m.status != discord.Status.offline]
+             if online_members: target_user = random.choice(online_members)
+
+        if target_user:
+            await _initiate_conversation(self, channel, target_user)
+
+        new_next_time = self._calculate_next_chat_time(freq)
+        if new_next_time:
+            await update_guild_config(guild_id, {"next_chat_time": new_next_time}, upsert=False)
 
     # --- AI COMMAND GROUP ---
     ai_group = app_commands.Group(name="ai", description="🧠 AI Interaction Tools")
@@ -183,13 +195,13 @@ class AIChatCog(commands.Cog, name="AIChat"):
             return await interaction.response.send_message("❌ Admin permission required.", ephemeral=True)
         
         await interaction.response.defer(ephemeral=True)
-        if scope == 'guild': await self.run_db(ai_personal_memories_collection.delete_many, {"guild_id": interaction.guild_id})
-        else: await self.run_db(ai_personal_memories_collection.delete_many, {"user_id": interaction.user.id, "guild_id": interaction.guild_id})
+        if scope == 'guild': await async_ai_personal_memories_collection.delete_many({"guild_id": interaction.guild_id})
+        else: await async_ai_personal_memories_collection.delete_many({"user_id": interaction.user.id, "guild_id": interaction.guild_id})
         await interaction.followup.send(f"✅ **Memory Wiped:** {scope.capitalize()}")
 
     @ai_group.command(name="lore", description="View the AI's understanding of this server.")
     async def ai_lore(self, interaction: discord.Interaction):
-        data = await self.run_db(server_lore_collection.find_one, {"_id": str(interaction.guild_id)})
+        data = await async_server_lore_collection.find_one({"_id": str(interaction.guild_id)})
         if not data: return await interaction.response.send_message("🧠 No lore data yet.", ephemeral=True)
         embed = discord.Embed(title=f"🧠 Context: {interaction.guild.name}", color=discord.Color.purple())
         embed.add_field(name="Manual", value=data.get("manual_description", "None"), inline=False)
@@ -210,6 +222,18 @@ class AIChatCog(commands.Cog, name="AIChat"):
         await update_guild_personality(self.summarizer_model, interaction.guild)
         await interaction.followup.send("✅ Personality Refreshed.")
 
+    @ai_group.command(name="gate", description="[Admin] Show how many reply-gate model calls were skipped locally.")
+    @app_commands.checks.has_permissions(manage_guild=True)
+    async def ai_gate(self, interaction: discord.Interaction):
+        st = self.respond_prefilter.stats
+        embed = discord.Embed(title="🚦 Reply Gate", color=discord.Color.teal())
+        embed.add_field(name="Evaluated", value=str(st["evaluated"]), inline=True)
+        embed.add_field(name="Skipped (No)", value=str(st["local_no"]), inline=True)
+        embed.add_field(name="Forced (Yes)", value=str(st["local_yes"]), inline=True)
+        embed.add_field(name="Asked Model", value=f"{st['asked_model']} ({st['model_yes']} yes)", inline=True)
+        embed.add_field(name="LLM Calls Avoided", value=f"**{self.respond_prefilter.llm_calls_avoided}**", inline=True)
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
     @ai_group.command(name="chat", description="[Admin] Trigger a proactive message to a user.")
     @app_commands.checks.has_permissions(manage_guild=True)
     async def ai_chat(self, interaction: discord.Interaction, user: discord.Member):
@@ -218,13 +242,27 @@ class AIChatCog(commands.Cog, name="AIChat"):
         await _initiate_conversation(self, interaction.channel, user)
         await interaction.followup.send(f"✅ Triggered chat with {user.mention}.")
 
+    @commands.Cog.listener()
+    async def on_message_edit(self, before: discord.Message, after: discord.Message):
+        self.message_buffer.edit(after)
+
+    @commands.Cog.listener()
+    async def on_raw_message_delete(self, payload: discord.RawMessageDeleteEvent):
+        self.message_buffer.remove(payload.channel_id, [payload.message_id])
+
+    @commands.Cog.listener()
+    async def on_raw_bulk_message_delete(self, payload: discord.RawBulkMessageDeleteEvent):
+        self.message_buffer.remove(payload.channel_id, payload.message_ids)
+
     @commands.Cog.listener()
     async def on_message(self, message: discord.Message):
+        # Record before any filtering: the buffer needs the bot's own replies too
+        self.message_buffer.add(message)
         if message.author.bot or self.model is None or not message.guild: return
         
         if isinstance(message.channel, discord.Thread):
             try:
-                if rpg_sessions_collection.find_one({"thread_id": message.channel.id}): return 
+                if await async_rpg_sessions_collection.find_one({"thread_id": message.channel.id}, {"_id": 1}): return 
             except: pass
 
         is_targeted = self.bot.user in message.mentions or (message.reference and message.reference.resolved and message.reference.resolved.author == self.bot.user)
@@ -233,7 +271,7 @@ class AIChatCog(commands.Cog, name="AIChat"):
 
 
         guild_id = str(message.guild.id)
-        guild_config = await self.run_db(ai_config_collection.find_one, {"_id": guild_id}) or {}
+        guild_config = await get_guild_config(guild_id)
 
         if guild_config.get("bot_disabled", False):
             if self.bot.user in message.mentions: await message.reply("💤 Disabled.")
@@ -1,21 +1,19 @@
 # cogs/ai_chat/memory_handler.py
 import logging
 from datetime import datetime, timezone
-from utils.db import ai_personal_memories_collection, ai_global_memories_collection
+from utils.db import async_ai_personal_memories_collection, async_ai_global_memories_collection
+from utils.limiter import limiter, PRIORITY_BACKGROUND
 
 logger = logging.getLogger(__name__)
 
 async def load_user_memories(user_id: int, guild_id: int, limit: int = 5) -> str:
     """Loads specific memories about a user in a specific guild."""
     try:
-        # PyMongo is synchronous. We strictly use sync methods here.
-        # We do NOT use 'await' or '.to_list()' because those are for Motor/Asyncio drivers.
-        cursor = ai_personal_memories_collection.find(
+        cursor = async_ai_personal_memories_collection.find(
             {"user_id": user_id, "guild_id": int(guild_id)}
         ).sort("timestamp", -1).limit(limit)
         
-        # Convert the synchronous cursor directly to a list
-        memories = list(cursor)
+        memories = await cursor.to_list(length=limit)
         
         if not memories:
             return ""
@@ -29,11 +27,8 @@ async def load_user_memories(user_id: int, guild_id: int, limit: int = 5) -> str
 async def load_global_memories(limit: int = 5) -> str:
     """Loads general/global facts the bot has learned."""
     try:
-        # Synchronous find and sort
-        cursor = ai_global_memories_collection.find({}).sort("timestamp", -1).limit(limit)
-        
-        # Convert to list immediately
-        memories = list(cursor)
+        cursor = async_ai_global_memories_collection.find({}).sort("timestamp", -1).limit(limit)
+        memories = await cursor.to_list(length=limit)
         
         if not memories:
             return ""
@@ -72,7 +67,8 @@ async def summarize_and_save_memory(model, user, guild_id, conversation_history)
         )
 
         # The AI generation IS asynchronous, so we keep 'await' here
-        response = await model.generate_content_async(prompt)
+        async with limiter.slot(model, PRIORITY_BACKGROUND):
+            response = await model.generate_content_async(prompt)
         text = response.text if response.parts else ""
         
         lines = text.split('\n')
@@ -85,9 +81,8 @@ async def summarize_and_save_memory(model, user, guild_id, conversation_history)
             elif line.startswith("Global Fact:") and "None" not in line:
                 global_fact = line.replace("Global Fact:", "").strip()
 
-        # Database writes are synchronous in PyMongo, so NO 'await' here
         if user_fact:
-            ai_personal_memories_collection.insert_one({
+            await async_ai_personal_memories_collection.insert_one({
                 "user_id": user.id,
                 "guild_id": int(guild_id),
                 "memory": user_fact,
@@ -96,7 +91,7 @@ async def summarize_and_save_memory(model, user, guild_id, conversation_history)
             logger.info(f"Saved new personal memory for user {user.name} in guild {guild_id}.")
 
         if global_fact:
-            ai_global_memories_collection.insert_one({
+            await async_ai_global_memories_collection.insert_one({
                 "memory": global_fact,
                 "timestamp": datetime.now(timezone.utc)
             })
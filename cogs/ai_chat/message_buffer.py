@@ -0,0 +1,99 @@
+# cogs/ai_chat/message_buffer.py
+import asyncio
+import collections
+import logging
+
+logger = logging.getLogger(__name__)
+
+class ChannelMessageBuffer:
+    """
+    Bounded per-channel ring buffer of recent discord.Message objects, fed by gateway events.
+    A channel is only tracked once something reads its history: the first read backfills it
+    with a single REST call, after which on_message/edit/delete keep it current.
+    """
+    def __init__(self, maxlen: int = 50, max_channels: int = 500):
+        self.maxlen = maxlen
+        self.max_channels = max_channels
+        self._buffers = collections.OrderedDict() # channel_id -> deque (oldest -> newest), LRU ordered
+        self._backfill_locks = {}
+        self.stats = {"hits": 0, "backfills": 0}
+
+    # --- GATEWAY FEED ---
+
+    def add(self, message):
+        buf = self._buffers.get(message.channel.id)
+        if buf is None: return # Channel not tracked yet; first read will backfill it
+        if buf and buf[-1].id >= message.id:
+            # Out-of-order or duplicate delivery: keep the deque sorted by snowflake
+            if any(m.id == message.id for m in buf): return
+            items = sorted([*buf, message], key=lambda m: m.id)
+            buf.clear()
+            buf.extend(items[-self.maxlen:])
+        else:
+            buf.append(message)
+
+    def edit(self, message):
+        buf = self._buffers.get(message.channel.id)
+        if not buf: return
+        for i, m in enumerate(buf):
+            if m.id == message.id:
+                buf[i] = message
+                return
+
+    def remove(self, channel_id: int, message_ids):
+        buf = self._buffers.get(channel_id)
+        if not buf: return
+        ids = set(message_ids)
+        kept = [m for m in buf if m.id not in ids]
+        if len(kept) != len(buf):
+            buf.clear()
+            buf.extend(kept)
+
+    def drop_channel(self, channel_id: int):
+        self._buffers.pop(channel_id, None)
+        self._backfill_locks.pop(channel_id, None)
+
+    # --- READ PATH ---
+
+    async def history(self, channel, limit: int) -> list:
+        """Drop-in for `[m async for m in channel.history(limit=limit)]` (newest first)."""
+        if limit > self.maxlen:
+            return [m async for m in channel.history(limit=limit)]
+
+        buf = self._buffers.get(channel.id)
+        if buf is None:
+            buf = await self._backfill(channel)
+        else:
+            self.stats["hits"] += 1
+        self._buffers.move_to_end(channel.id)
+
+        recent = list(buf)[-limit:]
+        recent.reverse()
+        return recent
+
+    async def _backfill(self, channel):
+        lock = self._backfill_locks.setdefault(channel.id, asyncio.Lock())
+        async with lock:
+            buf = self._buffers.get(channel.id)
+            if buf is not None: return buf
+
+            # Register first so messages arriving during the fetch are captured, then merge
+            buf = collections.deque(maxlen=self.maxlen)
+            self._buffers[channel.id] = buf
+            while len(self._buffers) > self.max_channels:
+                old_id, _ = self._buffers.popitem(last=False)
+                self._backfill_locks.pop(old_id, None)
+
+            try:
+                fetched = [m async for m in channel.history(limit=self.maxlen)]
+            except Exception as e:
+                logger.warning(f"History backfill failed for channel {channel.id}: {e}")
+                self._buffers.pop(channel.id, None)
+                raise
+
+            merged = {m.id: m for m in fetched}
+            merged.update({m.id: m for m in buf}) # Live copies win over fetched ones
+            buf.clear()
+            buf.extend(sorted(merged.values(), key=lambda m: m.id)[-self.maxlen:])
+            self.stats["backfills"] += 1
+            return buf
@@ -2,7 +2,9 @@
 import discord
 from discord.ext import tasks
 import logging
-from utils.db import ai_config_collection, ai_personal_memories_collection
+from utils.db import async_ai_config_collection, async_ai_personal_memories_collection
+from utils.config_cache import update_guild_config
+from utils.limiter import limiter, PRIORITY_BACKGROUND
 from .utils import _safe_get_response_text
 
 logger = logging.getLogger(__name__)
@@ -12,8 +14,8 @@ logger = logging.getLogger(__name__)
 async def personality_update_loop(cog):
     logger.info("Starting daily personality adaptation task...")
     try:
-        guild_configs = ai_config_collection.find({"channel": {"$exists": True, "$ne": None}})
-        for config in guild_configs:
+        guild_configs = async_ai_config_collection.find({"channel": {"$exists": True, "$ne": None}})
+        async for config in guild_configs:
             guild_id = int(config["_id"])
             guild = cog.bot.get_guild(guild_id)
             if guild:
@@ -33,8 +35,8 @@ async def update_guild_personality(summarizer_model, guild: discord.Guild):
         {"$limit": 50}, # Use last 50 memories as a sample
         {"$project": {"summary": 1, "_id": 0}}
     ]
-    memories_cursor = ai_personal_memories_collection.aggregate(pipeline)
-    memories = [mem['summary'] for mem in memories_cursor]
+    memories_cursor = async_ai_personal_memories_collection.aggregate(pipeline)
+    memories = [mem['summary'] async for mem in memories_cursor]
 
     if len(memories) < 10: # Don't update if there's not enough recent interaction
         logger.info(f"Not enough memories for guild {guild.name} ({len(memories)}). Skipping personality update.")
@@ -54,15 +56,12 @@ async def update_guild_personality(summarizer_model, guild: discord.Guild):
     )
 
     try:
-        response = await summarizer_model.generate_content_async(prompt)
+        async with limiter.slot(summarizer_model, PRIORITY_BACKGROUND):
+            response = await summarizer_model.generate_content_async(prompt)
         style_guide = _safe_get_response_text(response)
 
         if style_guide:
-            ai_config_collection.update_one(
-                {"_id": str(guild.id)},
-                {"$set": {"personality_style_guide": style_guide}},
-                upsert=True
-            )
+            await update_guild_config(guild.id, {"personality_style_guide": style_guide})
             logger.info(f"Successfully updated personality style guide for guild {guild.name}.")
         else:
             logger.warning(f"Personality synthesis for guild {guild.name} generated an empty response.")
@@ -5,6 +5,7 @@ import random
 import asyncio
 import re
 from datetime import datetime, timedelta, timezone
+from utils.limiter import limiter, PRIORITY_BACKGROUND
 from .memory_handler import load_user_memories
 from .utils import _safe_get_response_text
 
@@ -96,7 +97,8 @@ async def _initiate_conversation(cog, channel, user):
         )
         
         # 4. Generate
-        response = await cog.summarizer_model.generate_content_async(system_instruction + "\n" + data_block)
+        async with limiter.slot(cog.summarizer_model, PRIORITY_BACKGROUND):
+            response = await cog.summarizer_model.generate_content_async(system_instruction + "\n" + data_block)
         text = _safe_get_response_text(response).strip()
         
         if not text:
@@ -0,0 +1,138 @@
+# cogs/ai_chat/proactive_scheduler.py
+import asyncio
+import heapq
+import logging
+from datetime import datetime, timedelta, timezone
+from utils.db import async_ai_config_collection
+
+logger = logging.getLogger(__name__)
+
+# Guilds handled at the same time when several come due together
+PROACTIVE_CHAT_CONCURRENCY = 4
+# If a run leaves next_chat_time in the past (guild gone, handler error), try again after this
+PROACTIVE_RETRY = timedelta(minutes=15)
+
+# Configs that can ever come due; anything else is simply not in the heap
+SCHEDULABLE_QUERY = {
+    "channel": {"$exists": True, "$ne": None},
+    "bot_disabled": {"$ne": True},
+    "chat_frequency": {"$ne": "disabled"},
+}
+
+def _aware(dt):
+    if dt is not None and dt.tzinfo is None: return dt.replace(tzinfo=timezone.utc)
+    return dt
+
+class ProactiveScheduler:
+    """
+    Keeps schedulable guilds in a min-heap keyed by next_chat_time and sleeps until the earliest
+    one is due, instead of scanning every config each minute.
+
+    The heap uses lazy deletion: `_due` holds each guild's current time, and popped entries that
+    don't match it are stale. `handler(guild_id)` does the actual work and is expected to write
+    the guild's new next_chat_time; the scheduler re-reads that one document afterwards.
+    """
+    def __init__(self, handler, concurrency: int = PROACTIVE_CHAT_CONCURRENCY):
+        self.handler = handler
+        self._heap = []       # (when, guild_id)
+        self._due = {}        # guild_id -> when
+        self._running = set() # guild_ids currently inside handler
+        self._wake = asyncio.Event()
+        self._sem = asyncio.Semaphore(concurrency)
+        self._workers = set()
+        self._task = None
+
+    def start(self, wait_for=None):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run(wait_for))
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        for task in list(self._workers): task.cancel()
+
+    # --- HEAP ---
+
+    def schedule(self, guild_id, when):
+        """Sets (or with when=None, removes) a guild's next run."""
+        guild_id = str(guild_id)
+        if when is None:
+            self._due.pop(guild_id, None)
+        else:
+            when = _aware(when)
+            self._due[guild_id] = when
+            heapq.heappush(self._heap, (when, guild_id))
+            # Rebuild once stale entries dominate, so the heap stays proportional to the guild count
+            if len(self._heap) > 2 * len(self._due) + 64:
+                self._heap = [(w, g) for g, w in self._due.items()]
+                heapq.heapify(self._heap)
+        self._wake.set()
+
+    async def load(self):
+        """Rebuilds the heap from ai_config (startup and global reloads)."""
+        now = datetime.now(timezone.utc)
+        due = {}
+        async for doc in async_ai_config_collection.find(SCHEDULABLE_QUERY, {"next_chat_time": 1}):
+            due[str(doc["_id"])] = _aware(doc.get("next_chat_time")) or now
+        self._due = due
+        self._heap = [(w, g) for g, w in due.items()]
+        heapq.heapify(self._heap)
+        self._wake.set()
+        logger.info(f"Proactive chat scheduler loaded {len(due)} guild(s).")
+
+    async def refresh(self, guild_id, after_run: bool = False):
+        """Re-reads one guild's config and reschedules it."""
+        guild_id = str(guild_id)
+        if not after_run and guild_id in self._running: return # Rescheduled when the run finishes
+        doc = await async_ai_config_collection.find_one({"_id": guild_id, **SCHEDULABLE_QUERY}, {"next_chat_time": 1})
+        if not doc:
+            self.schedule(guild_id, None)
+            return
+        now = datetime.now(timezone.utc)
+        when = _aware(doc.get("next_chat_time")) or now
+        if after_run and when <= now: when = now + PROACTIVE_RETRY
+        self.schedule(guild_id, when)
+
+    def on_config_invalidated(self, guild_id=None):
+        """config_cache listener: a guild (or every guild) changed outside the scheduler."""
+        if self._task is None: return
+        loop = asyncio.get_running_loop()
+        if guild_id is None: loop.create_task(self.load())
+        else: loop.create_task(self.refresh(guild_id))
+
+    # --- RUNNER ---
+
+    async def _run(self, wait_for):
+        if wait_for: await wait_for()
+        await self.load()
+        while True:
+            self._wake.clear()
+            now = datetime.now(timezone.utc)
+            while self._heap and self._heap[0][0] <= now:
+                when, guild_id = heapq.heappop(self._heap)
+                if self._due.get(guild_id) != when or guild_id in self._running: continue
+                del self._due[guild_id]
+                self._running.add(guild_id)
+                task = asyncio.create_task(self._work(guild_id))
+                self._workers.add(task)
+                task.add_done_callback(self._workers.discard)
+
+            timeout = (self._heap[0][0] - now).total_seconds() if self._heap else None
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _work(self, guild_id: str):
+        try:
+            async with self._sem:
+                await self.handler(guild_id)
+        except Exception as e:
+            logger.error(f"Proactive chat failed for {guild_id}: {e}")
+        finally:
+            self._running.discard(guild_id)
+        try:
+            await self.refresh(guild_id, after_run=True)
+        except Exception:
+            self.schedule(guild_id, datetime.now(timezone.utc) + PROACTIVE_RETRY)
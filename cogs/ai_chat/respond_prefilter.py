@@ -0,0 +1,105 @@
+# cogs/ai_chat/respond_prefilter.py
+import re
+import time
+
+# Decisions returned by ResponsePrefilter.evaluate
+DECIDE_NO = "no"
+DECIDE_YES = "yes"
+DECIDE_ASK = "ask"
+
+# Whole first word only: "however", "whatever", "whoa" or "anyone's" are not questions
+QUESTION_START = re.compile(r"(who|what|when|where|why|how|is|are|can|could|should|does|do)\b|(anyone|any1)\b(?!')")
+SECOND_PERSON = re.compile(r"\b(you|u|ur|your|yours)\b")
+NOISE_ONLY = re.compile(r"^[\W_]*$")
+URL_ONLY = re.compile(r"^\s*<?https?://\S+>?\s*$")
+FILLER = {"lol", "lmao", "lmfao", "ok", "okay", "k", "kk", "ya", "ye", "yea", "yeah", "xd", "haha", "hahaha", "bruh", "nice", "true", "fr", "same", "rip", "gg", "ty", "thx", "np"}
+
+class ResponsePrefilter:
+    """
+    CPU-only scoring stage in front of the LLM "should I respond" gate.
+    Confident cases are answered locally; only the ambiguous middle band is sent to the model.
+    """
+    def __init__(self, bot_names=("antima",), yes_threshold: int = 5, no_threshold: int = 0, rejection_cooldown: float = 20.0):
+        self.bot_names = tuple(n.lower() for n in bot_names)
+        self.yes_threshold = yes_threshold
+        self.no_threshold = no_threshold
+        self.rejection_cooldown = rejection_cooldown
+        self._rejections = {} # (channel_id, user_id) -> monotonic time the model last said "no"
+        self.stats = {"evaluated": 0, "local_no": 0, "local_yes": 0, "asked_model": 0, "model_yes": 0}
+
+    @property
+    def llm_calls_avoided(self) -> int:
+        return self.stats["local_no"] + self.stats["local_yes"]
+
+    def _names_for(self, message, bot_user):
+        names = set(self.bot_names)
+        names.add(bot_user.name.lower())
+        me = message.guild.me if message.guild else None
+        if me and me.display_name: names.add(me.display_name.lower())
+        return names
+
+    def score(self, message, history, bot_user) -> int:
+        """history: newest-first list of recent messages in the channel (may include `message`)."""
+        text = message.clean_content.strip().lower()
+        previous = [m for m in history if m.id != message.id]
+
+        if any(re.search(rf"\b{re.escape(n)}\b", text) for n in self._names_for(message, bot_user) if n):
+            return self.yes_threshold + 5
+
+        if not text or NOISE_ONLY.match(text) or URL_ONLY.match(text) or text in FILLER:
+            return self.no_threshold - 5
+
+        score = 1
+        is_question = text.endswith("?") or bool(QUESTION_START.match(text))
+        bot_positions = [i for i, m in enumerate(previous[:4]) if m.author.id == bot_user.id]
+        bot_recent = bool(bot_positions)
+
+        if is_question: score += 2
+        if bot_recent:
+            score += 2
+            if bot_positions[0] == 0: score += 1 # Bot spoke immediately before this message
+            if SECOND_PERSON.search(text): score += 1
+        elif not is_question:
+            score -= 1 # Background chatter the bot isn't part of
+
+        # Clearly aimed at someone else
+        other_mentions = [u for u in message.mentions if u.id != bot_user.id]
+        if other_mentions: score -= 3
+        ref = message.reference.resolved if message.reference else None
+        if ref is not None and getattr(ref, "author", None) and ref.author.id != bot_user.id: score -= 3
+
+        if len(text) < 6 and not is_question: score -= 1
+        return score
+
+    def evaluate(self, message, history, bot_user) -> str:
+        self.stats["evaluated"] += 1
+        s = self.score(message, history, bot_user)
+        key = (message.channel.id, message.author.id)
+
+        if s >= self.yes_threshold:
+            decision = DECIDE_YES
+        elif s <= self.no_threshold:
+            decision = DECIDE_NO
+        else:
+            last_no = self._rejections.get(key)
+            bot_spoke_last = bool(history) and any(m.author.id == bot_user.id for m in history[:2])
+            if last_no and (time.monotonic() - last_no) < self.rejection_cooldown and not bot_spoke_last:
+                decision = DECIDE_NO # Model just turned this user down; don't re-ask on every message
+            else:
+                decision = DECIDE_ASK
+
+        if decision == DECIDE_NO: self.stats["local_no"] += 1
+        elif decision == DECIDE_YES: self.stats["local_yes"] += 1
+        else: self.stats["asked_model"] += 1
+        return decision
+
+    def record_model_decision(self, message, should_respond: bool):
+        key = (message.channel.id, message.author.id)
+        if should_respond:
+            self.stats["model_yes"] += 1
+            self._rejections.pop(key, None)
+        else:
+            self._rejections[key] = time.monotonic()
+            if len(self._rejections) > 5000:
+                cutoff = time.monotonic() - self.rejection_cooldown
+                self._rejections = {k: t for k, t in self._rejections.items() if t > cutoff}
@@ -12,21 +12,27 @@ import functools
 import google.generativeai as genai
 
 from .memory_handler import summarize_and_save_memory
+from .respond_prefilter import DECIDE_NO, DECIDE_YES
 from .utils import _find_member, _safe_get_response_text, get_gif_url, should_send_gif, perform_web_search, identify_visual_content
-from utils.db import ai_config_collection
+from utils.config_cache import get_guild_config
+from utils.limiter import limiter, PRIORITY_INTERACTIVE, PRIORITY_GATE
 
 
 logger = logging.getLogger(__name__)
 MAX_HISTORY = 15
+# Send each '|||' reply part as soon as the model has finished writing it ("0" waits for the whole reply)
+STREAM_REPLIES = os.environ.get("STREAM_REPLIES", "1") != "0"
 
-async def detect_conversation_topic(summarizer_model, channel):
+async def detect_conversation_topic(summarizer_model, channel, message_buffer=None):
     """Identifies the main subject(s) of the current conversation turn."""
     try:
-        history = [msg async for msg in channel.history(limit=6)]
+        if message_buffer: history = await message_buffer.history(channel, limit=6)
+        else: history = [msg async for msg in channel.history(limit=6)]
         history.reverse()
         chat_text = "\n".join([f"{msg.author.display_name}: {msg.clean_content}" for msg in history])
         prompt = f"Analyze chat. Identify the MAIN Subject or subjects (if multiple). Keep it very concise.\nChat:\n{chat_text}"
-        response = await summarizer_model.generate_content_async(prompt)
+        async with limiter.slot(summarizer_model, PRIORITY_GATE):
+            response = await summarizer_model.generate_content_async(prompt)
         topic = _safe_get_response_text(response).strip()
         if "None" in topic or len(topic) > 50: return None
         return topic
@@ -54,12 +60,110 @@ async def process_video_attachment(attachment):
     finally:
         if os.path.exists(temp_path): os.remove(temp_path)
 
-async def _send_and_handle_tool_loop(chat, prompt_content, message_channel, summarizer_model, current_topic=None):
+def _has_function_call(response) -> bool:
+    try: return any(part.function_call for part in response.parts)
+    except Exception: return False
+
+async def _send_chat(chat, payload, streamer=None):
+    """
+    One model call; with a streamer it streams and reports this call's accumulated text as it
+    arrives. A call that turns out to request a tool is retracted: the user only sees the final call.
+    """
+    async with limiter.slot(chat, PRIORITY_INTERACTIVE):
+        if not streamer: return await chat.send_message_async(payload)
+        streamer.reset()
+        response = await chat.send_message_async(payload, stream=True)
+        text, tool_call = "", False
+        async for chunk in response:
+            if tool_call: continue
+            if _has_function_call(chunk):
+                tool_call = True
+                streamer.retract()
+                continue
+            try: text += chunk.text
+            except ValueError: continue # Function-call chunk
+            streamer.update(text)
+        if not tool_call and _has_function_call(response): streamer.retract()
+        return response
+
+class _PartSender:
+    """
+    Delivers '|||'-separated reply parts in order while the reply is still streaming. Parts are
+    tagged with the model call that wrote them; retracting a call skips its unsent parts and
+    deletes the messages it already sent (the "let me search" preamble of a tool call).
+    """
+    def __init__(self, cog, message):
+        self.cog = cog
+        self.message = message
+        self.queued = 0
+        self._call = 0
+        self._retracted = set()
+        self._sent = {} # call -> [discord.Message]
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    def reset(self):
+        """A new model call starts; its text is counted from its own first part."""
+        self._call += 1
+        self.queued = 0
+
+    def update(self, text):
+        # Everything before the last delimiter is a finished part
+        parts = text.split('|||')
+        for part in parts[self.queued:-1]: self._queue.put_nowait((self._call, part))
+        self.queued = max(self.queued, len(parts) - 1)
+
+    def retract(self):
+        """The current call is a tool call: none of its text should stay in the channel."""
+        self._retracted.add(self._call)
+        self._queue.put_nowait((self._call, None))
+
+    async def finish(self, final_text=None):
+        if final_text:
+            # The loop gave up on a tool call: its text is the reply after all, sent in full
+            if self._call in self._retracted: self.reset()
+            for part in final_text.split('|||')[self.queued:]: self._queue.put_nowait((self._call, part))
+        self._queue.put_nowait(None)
+        await self._task
+
+    async def _run(self):
+        while (item := await self._queue.get()) is not None:
+            call, part = item
+            if part is None:
+                for sent in self._sent.pop(call, []):
+                    try: await sent.delete()
+                    except Exception as e: logger.warning(f"Could not retract reply part: {e}")
+                continue
+            if call in self._retracted: continue
+            try: self._sent.setdefault(call, []).extend(await _deliver_part(self.cog, self.message, part))
+            except Exception as e: logger.error(f"Error sending reply part: {e}")
+
+async def _deliver_part(cog, message, part):
+    """Resolves [MENTION]/[GIF] tags in one reply part and sends it with a typing delay; returns the sent messages."""
+    part = re.sub(r"\[MENTION: (.+?)\]", lambda m: f"<@{_find_member(message.guild, m.group(1).strip()).id}>" if _find_member(message.guild, m.group(1).strip()) else m.group(1).strip(), part).strip()
+    if not part: return []
+
+    gif_url, gif_match = None, re.search(r"\[GIF: (.+?)\]", part)
+    if gif_match:
+        search_term = gif_match.group(1).strip()
+        part = part.replace(gif_match.group(0), "").strip()
+        if await should_send_gif(cog.summarizer_model, message.channel, part, search_term, cog.message_buffer):
+            gif_url = await get_gif_url(cog.http_session, search_term)
+
+    sent = []
+    if part:
+        async with message.channel.typing():
+            await asyncio.sleep(len(part)*0.02)
+            sent.append(await message.channel.send(part))
+    if gif_url: sent.append(await message.channel.send(gif_url))
+    return sent
+
+async def _send_and_handle_tool_loop(chat, prompt_content, message_channel, summarizer_model, current_topic=None, streamer=None):
     """
     Enhanced tool loop that executes search tools silently in the background.
     Supports Parallel Function Calling for multiple research tasks.
     """
-    response = await chat.send_message_async(prompt_content)
+    response = await _send_chat(chat, prompt_content, streamer)
     loop_count = 0
     max_loops = 5 
     
@@ -103,15 +207,14 @@ async def _send_and_handle_tool_loop(chat, prompt_content, message_channel, summ
                         "response": {"result": results[i]}
                     }
                 })
-            response = await chat.send_message_async(response_payload)
+            response = await _send_chat(chat, response_payload, streamer)
         else: break
 
     return response
 
 async def should_bot_respond_ai_check(cog, bot, summarizer_model, message: discord.Message) -> bool:
     """Uses a lightweight model to decide if AnTiMa should join the conversation."""
-    guild_id = str(message.guild.id)
-    guild_config = ai_config_collection.find_one({"_id": guild_id}) or {}
+    guild_config = await get_guild_config(message.guild.id)
     is_chat_channel = message.channel.id == guild_config.get("channel")
     is_chat_forum = isinstance(message.channel, discord.Thread) and message.channel.parent_id == guild_config.get("forum")
 
@@ -120,28 +223,38 @@ async def should_bot_respond_ai_check(cog, bot, summarizer_model, message: disco
 
     if not is_chat_channel: return False
 
-    history = [msg async for msg in message.channel.history(limit=6)]
+    history = await cog.message_buffer.history(message.channel, limit=6)
+
+    # Cheap local pass first: only ambiguous messages cost a model call
+    decision = cog.respond_prefilter.evaluate(message, history, bot.user)
+    if decision == DECIDE_NO: return False
+    if decision == DECIDE_YES: return True
+
     history.reverse()
     conversation_log = "\n".join([f"{m.author.display_name}: {m.clean_content}" for m in history])
     prompt = f"Analyze chat. Should AnTiMa respond to the last message based on context?\n---\n{conversation_log}\n---\nAnswer 'yes' or 'no'."
     
     try:
-        response = await summarizer_model.generate_content_async(prompt)
-        return 'yes' in _safe_get_response_text(response).strip().lower()
+        async with limiter.slot(summarizer_model, PRIORITY_GATE):
+            response = await summarizer_model.generate_content_async(prompt)
+        should_respond = 'yes' in _safe_get_response_text(response).strip().lower()
+        cog.respond_prefilter.record_model_decision(message, should_respond)
+        return should_respond
     except: return False
 
 async def handle_single_user_response(cog, message, prompt, author):
     """Processes a single message, handles attachments, and manages the output flow."""
     try:
         async with message.channel.typing():
-            guild_config = ai_config_collection.find_one({"_id": str(message.guild.id)}) or {}
+            guild_config = await get_guild_config(message.guild.id)
 
             
-            history = [{'role': 'model' if m.author==cog.bot.user else 'user', 'parts': [f"{m.author.display_name}: {m.clean_content}" if m.author!=cog.bot.user else m.clean_content]} async for m in message.channel.history(limit=MAX_HISTORY) if m.id != message.id]
+            recent = await cog.message_buffer.history(message.channel, limit=MAX_HISTORY)
+            history = [{'role': 'model' if m.author==cog.bot.user else 'user', 'parts': [f"{m.author.display_name}: {m.clean_content}" if m.author!=cog.bot.user else m.clean_content]} for m in recent if m.id != message.id]
             history.reverse()
             chat = cog.model.start_chat(history=history)
             
-            current_topic = await detect_conversation_topic(cog.summarizer_model, message.channel)
+            current_topic = await detect_conversation_topic(cog.summarizer_model, message.channel, cog.message_buffer)
             content = [f"User {author.display_name} says: \"{prompt}\"."]
             
             uploaded_files_cleanup = []
@@ -158,7 +271,15 @@ async def handle_single_user_response(cog, message, prompt, author):
 
 
 
-            response = await _send_and_handle_tool_loop(chat, content, message.channel, cog.summarizer_model, current_topic=current_topic)
+            sender = _PartSender(cog, message) if STREAM_REPLIES else None
+            try:
+                response = await _send_and_handle_tool_loop(
+                    chat, content, message.channel, cog.summarizer_model, current_topic=current_topic,
+                    streamer=sender
+                )
+            except Exception:
+                if sender: await sender.finish()
+                raise
             
             if uploaded_files_cleanup:
                 for f in uploaded_files_cleanup:
@@ -166,27 +287,11 @@ async def handle_single_user_response(cog, message, prompt, author):
                     except: pass
 
             final_text = _safe_get_response_text(response)
+            # Final Processing: Mentions, Splitting, and GIF Resolution (parts already streamed are skipped)
+            if sender: await sender.finish(final_text)
             if not final_text: return
-
-            # Final Processing: Mentions, Splitting, and GIF Resolution
-            processed_text = re.sub(r"\[MENTION: (.+?)\]", lambda m: f"<@{_find_member(message.guild, m.group(1).strip()).id}>" if _find_member(message.guild, m.group(1).strip()) else m.group(1).strip(), final_text)
-            
-            for part in processed_text.split('|||'):
-                part = part.strip()
-                if not part: continue
-
-                gif_url, gif_match = None, re.search(r"\[GIF: (.+?)\]", part)
-                if gif_match:
-                    search_term = gif_match.group(1).strip()
-                    part = part.replace(gif_match.group(0), "").strip()
-                    if await should_send_gif(cog.summarizer_model, message.channel, part, search_term):
-                        gif_url = await get_gif_url(cog.http_session, search_term)
-
-                if part:
-                    async with message.channel.typing():
-                        await asyncio.sleep(len(part)*0.02)
-                        await message.channel.send(part)
-                if gif_url: await message.channel.send(gif_url)
+            if not sender:
+                for part in final_text.split('|||'): await _deliver_part(cog, message, part)
             
             cog.bot.loop.create_task(summarize_and_save_memory(cog.summarizer_model, author, message.guild.id, chat.history))
     except Exception as e: logger.error(f"Error: {e}")
@@ -206,10 +311,12 @@ async def process_message_batch(cog, channel_id):
 
     try:
         async with last_message.channel.typing():
-            guild_config = ai_config_collection.find_one({"_id": str(last_message.guild.id)}) or {}
+            guild_config = await get_guild_config(last_message.guild.id)
 
             
-            history = [{'role': 'model' if m.author==cog.bot.user else 'user', 'parts': [f"{m.author.display_name}: {m.clean_content}" if m.author!=cog.bot.user else m.clean_content]} async for m in last_message.channel.history(limit=MAX_HISTORY) if m.id not in [msg.id for msg in batch]]
+            batch_ids = {msg.id for msg in batch}
+            recent = await cog.message_buffer.history(last_message.channel, limit=MAX_HISTORY)
+            history = [{'role': 'model' if m.author==cog.bot.user else 'user', 'parts': [f"{m.author.display_name}: {m.clean_content}" if m.author!=cog.bot.user else m.clean_content]} for m in recent if m.id not in batch_ids]
             history.reverse()
             chat = cog.model.start_chat(history=history)
             
@@ -230,7 +337,15 @@ async def process_message_batch(cog, channel_id):
             
 
 
-            response = await _send_and_handle_tool_loop(chat, content, last_message.channel, cog.summarizer_model)
+            sender = _PartSender(cog, last_message) if STREAM_REPLIES else None
+            try:
+                response = await _send_and_handle_tool_loop(
+                    chat, content, last_message.channel, cog.summarizer_model,
+                    streamer=sender
+                )
+            except Exception:
+                if sender: await sender.finish()
+                raise
             
             if uploaded_files_cleanup:
                 for f in uploaded_files_cleanup:
@@ -238,26 +353,10 @@ async def process_message_batch(cog, channel_id):
                     except: pass
 
             final_text = _safe_get_response_text(response)
+            if sender: await sender.finish(final_text)
             if not final_text: return
-
-            processed_text = re.sub(r"\[MENTION: (.+?)\]", lambda m: f"<@{_find_member(last_message.guild, m.group(1).strip()).id}>" if _find_member(last_message.guild, m.group(1).strip()) else m.group(1).strip(), final_text)
-            
-            for part in processed_text.split('|||'):
-                part = part.strip()
-                if not part: continue
-
-                gif_url, gif_match = None, re.search(r"\[GIF: (.+?)\]", part)
-                if gif_match:
-                    search_term = gif_match.group(1).strip()
-                    part = part.replace(gif_match.group(0), "").strip()
-                    if await should_send_gif(cog.summarizer_model, last_message.channel, part, search_term):
-                        gif_url = await get_gif_url(cog.http_session, search_term)
-
-                if part:
-                    async with last_message.channel.typing():
-                        await asyncio.sleep(len(part)*0.02)
-                        await last_message.channel.send(part)
-                if gif_url: await last_message.channel.send(gif_url)
+            if not sender:
+                for part in final_text.split('|||'): await _deliver_part(cog, last_message, part)
             
             for author in unique_authors: 
                 cog.bot.loop.create_task(summarize_and_save_memory(cog.summarizer_model, author, last_message.guild.id, chat.history))
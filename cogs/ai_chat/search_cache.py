@@ -0,0 +1,125 @@
+# cogs/ai_chat/search_cache.py
+import collections
+import hashlib
+import logging
+import os
+import re
+import time
+import unicodedata
+from datetime import datetime, timedelta, timezone
+from utils.single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+SEARCH_CACHE_MAX_ENTRIES = int(os.environ.get("SEARCH_CACHE_MAX_ENTRIES", "512"))
+
+# Freshness policy (seconds). Time-sensitive queries go stale fast; reference lookups barely change.
+SEARCH_TTL_NEWS = 30 * 60
+SEARCH_TTL_DEFAULT = 12 * 3600
+SEARCH_TTL_REFERENCE = 7 * 24 * 3600
+# Scraped page text is never trusted longer than this, whatever the query
+PAGE_TTL_MAX = 6 * 3600
+
+_NEWS_WORDS = re.compile(
+    r"\b(news|latest|today|tonight|yesterday|tomorrow|now|current|currently|live|score|scores|weather|"
+    r"price|prices|stock|stocks|patch|update|release|released|announced|trending|time in|this week|this month|20\d\d)\b"
+)
+_REFERENCE_WORDS = re.compile(r"\b(wiki|who is|what is|definition|meaning|origin|history of|series|character|lore)\b")
+
+def normalize_query(query: str) -> str:
+    """Case, width, punctuation and whitespace-insensitive form of a query, used as the cache key."""
+    text = unicodedata.normalize("NFKC", query).casefold()
+    text = re.sub(r"[^\w\s]", " ", text)
+    return " ".join(text.split())
+
+def query_ttl(normalized: str) -> int:
+    if _NEWS_WORDS.search(normalized): return SEARCH_TTL_NEWS
+    if _REFERENCE_WORDS.search(normalized): return SEARCH_TTL_REFERENCE
+    return SEARCH_TTL_DEFAULT
+
+class SearchCache:
+    """
+    Two-tier cache for the web search tool: an in-process LRU in front of a Mongo tier whose
+    documents carry their own expires_at (TTL index with expireAfterSeconds=0). Entries are
+    namespaced by kind: "summary" (verified answer per query), "results" (raw search hits per
+    query) and "page" (scraped text per URL). Concurrent lookups of the same key share one fetch.
+    """
+    KINDS = ("summary", "results", "page")
+
+    def __init__(self, collection, max_entries: int = SEARCH_CACHE_MAX_ENTRIES, report_every: int = 100):
+        self.collection = collection
+        self.max_entries = max_entries
+        self.report_every = report_every
+        self._lru = collections.OrderedDict() # doc id -> (expires_at epoch, value)
+        self._flights = SingleFlight()
+        self.stats = collections.Counter()
+
+    @staticmethod
+    def make_id(kind: str, key: str) -> str:
+        return f"{kind}:{hashlib.sha256(key.encode('utf-8')).hexdigest()}"
+
+    def hit_rate(self, kind: str) -> float:
+        hits = self.stats[f"{kind}_memory_hits"] + self.stats[f"{kind}_db_hits"]
+        total = hits + self.stats[f"{kind}_misses"]
+        return hits / total if total else 0.0
+
+    def _count(self, kind: str, outcome: str):
+        self.stats[f"{kind}_{outcome}"] += 1
+        self.stats["lookups"] += 1
+        if self.stats["lookups"] % self.report_every == 0:
+            rates = ", ".join(f"{k} {self.hit_rate(k):.0%}" for k in self.KINDS)
+            logger.info(f"Search cache hit rates after {self.stats['lookups']} lookups: {rates}")
+
+    def _remember(self, doc_id: str, expires_at: float, value):
+        self._lru[doc_id] = (expires_at, value)
+        self._lru.move_to_end(doc_id)
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+
+    async def get_or_fetch(self, kind: str, key: str, ttl: int, fetch, should_cache=bool):
+        """
+        Returns the fresh cached value for (kind, key), or awaits `fetch()` and caches its result
+        for `ttl` seconds when `should_cache(result)` holds (error strings and empty hits are not kept).
+        """
+        doc_id = self.make_id(kind, key)
+        entry = self._lru.get(doc_id)
+        if entry:
+            if entry[0] > time.time():
+                self._lru.move_to_end(doc_id)
+                self._count(kind, "memory_hits")
+                return entry[1]
+            del self._lru[doc_id]
+        return await self._flights.run(doc_id, lambda: self._fetch(doc_id, kind, key, ttl, fetch, should_cache))
+
+    async def _fetch(self, doc_id: str, kind: str, key: str, ttl: int, fetch, should_cache):
+        doc = await self._load(doc_id)
+        if doc:
+            self._count(kind, "db_hits")
+            value = doc["value"]
+            self._remember(doc_id, doc["expires_at"].replace(tzinfo=timezone.utc).timestamp(), value)
+            return value
+        self._count(kind, "misses")
+        value = await fetch()
+        if should_cache(value):
+            expires_at = datetime.utcnow() + timedelta(seconds=ttl)
+            self._remember(doc_id, time.time() + ttl, value)
+            await self._save(doc_id, kind, key, value, expires_at)
+        return value
+
+    async def _load(self, doc_id: str):
+        try:
+            # The TTL monitor only sweeps once a minute, so expiry is checked here too
+            return await self.collection.find_one({"_id": doc_id, "expires_at": {"$gt": datetime.utcnow()}}, {"value": 1, "expires_at": 1})
+        except Exception as e:
+            logger.warning(f"Search cache read failed: {e}")
+            return None
+
+    async def _save(self, doc_id: str, kind: str, key: str, value, expires_at: datetime):
+        try:
+            await self.collection.replace_one(
+                {"_id": doc_id},
+                {"kind": kind, "key": key, "value": value, "created_at": datetime.utcnow(), "expires_at": expires_at},
+                upsert=True
+            )
+        except Exception as e:
+            logger.warning(f"Search cache write failed: {e}")
@@ -1,7 +1,8 @@
 # cogs/ai_chat/server_context_learner.py
 import logging
 from datetime import datetime, timezone
-from utils.db import server_lore_collection
+from utils.db import async_server_lore_collection
+from utils.limiter import limiter, PRIORITY_BACKGROUND
 from .utils import _safe_get_response_text
 
 logger = logging.getLogger(__name__)
@@ -11,7 +12,7 @@ async def get_server_lore(guild_id: str) -> dict:
     Retrieves the current server lore (manual + learned) from the DB.
     """
     try:
-        data = server_lore_collection.find_one({"_id": str(guild_id)})
+        data = await async_server_lore_collection.find_one({"_id": str(guild_id)})
         if not data:
             return {"manual": None, "learned": None}
         return {
@@ -31,7 +32,7 @@ async def update_server_lore_summary(model, guild, manual_description=None):
         guild_id = str(guild.id)
         
         # 1. Fetch current data
-        current_data = server_lore_collection.find_one({"_id": guild_id}) or {}
+        current_data = await async_server_lore_collection.find_one({"_id": guild_id}) or {}
         existing_learned = current_data.get("learned_summary", "")
         # If manual description isn't passed, use existing, otherwise update it
         if manual_description is None:
@@ -78,11 +79,12 @@ async def update_server_lore_summary(model, guild, manual_description=None):
             "**OUTPUT:** (Just the monologue text)"
         )
 
-        response = await model.generate_content_async(prompt)
+        async with limiter.slot(model, PRIORITY_BACKGROUND):
+            response = await model.generate_content_async(prompt)
         new_learned_summary = _safe_get_response_text(response).strip()
 
         # 4. Save to DB
-        server_lore_collection.update_one(
+        await async_server_lore_collection.update_one(
             {"_id": guild_id},
             {
                 "$set": {
@@ -14,7 +14,10 @@ import google.generativeai as genai
 from datetime import datetime
 
 # Import database collections for logging
-from utils.db import search_debug_collection 
+from utils.db import async_search_debug_collection, async_search_cache_collection
+from utils.limiter import limiter, PRIORITY_INTERACTIVE, PRIORITY_GATE
+from utils.http_client import http_clients
+from .search_cache import SearchCache, normalize_query, query_ttl, PAGE_TTL_MAX
 
 warnings.filterwarnings("ignore", category=RuntimeWarning, module="duckduckgo_search")
 
@@ -30,6 +33,8 @@ GOOGLE_SEARCH_API_KEY = os.environ.get("GOOGLE_SEARCH_API_KEY")
 GOOGLE_SEARCH_ENGINE_ID = os.environ.get("GOOGLE_SEARCH_ENGINE_ID")
 TENOR_CLIENT_KEY = "AnTiMa-Discord-Bot"
 
+search_cache = SearchCache(async_search_cache_collection)
+
 def _safe_get_response_text(response) -> str:
     try:
         if not response.parts: return ""
@@ -40,10 +45,9 @@ async def fetch_website_content(url: str) -> str:
     """Enhanced scraper with better noise reduction and higher content limits."""
     try:
         ua = UserAgent()
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, headers={'User-Agent': ua.random}, timeout=12) as resp:
-                if resp.status != 200: return f"Error {resp.status}"
-                html = await resp.text()
+        async with http_clients.get(url, headers={'User-Agent': ua.random}, timeout=aiohttp.ClientTimeout(total=12), retries=1) as resp:
+            if resp.status != 200: return f"Error {resp.status}"
+            html = await resp.text()
                 
         soup = BeautifulSoup(html, 'html.parser')
         for s in soup(["script", "style", "nav", "footer", "header", "aside", "form", "ad"]): s.extract()
@@ -73,49 +77,36 @@ async def google_custom_search(query: str, num_results: int = 5):
         'num': num_results
     }
 
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url, params=params) as resp:
-            if resp.status == 200:
-                data = await resp.json()
-                items = data.get('items', [])
-                return [
-                    {
-                        'title': item.get('title'),
-                        'link': item.get('link'),
-                        'snippet': item.get('snippet')
-                    }
-                    for item in items
-                ]
-            else:
-                logger.error(f"Google Search failed: {resp.status} - {await resp.text()}")
-                return None
-
-async def perform_web_search(query: str) -> str:
-    """
-    REQUIRED TOOL: Searches the internet to find real-time information, facts, or news.
-    USE THIS WHENEVER:
-    1. The user asks about current events, games, tech, or specific facts.
-    2. You are unsure about an answer.
-    3. You need to verify something.
-    
-    Args:
-        query: The search string (e.g. "latest Elden Ring patch notes").
-    """
-    start_time = datetime.utcnow()
-    logger.info(f"Deep Search Initiated: {query}")
-    
+    async with http_clients.get(url, params=params) as resp:
+        if resp.status == 200:
+            data = await resp.json()
+            items = data.get('items', [])
+            return [
+                {
+                    'title': item.get('title'),
+                    'link': item.get('link'),
+                    'snippet': item.get('snippet')
+                }
+                for item in items
+            ]
+        else:
+            logger.error(f"Google Search failed: {resp.status} - {await resp.text()}")
+            return None
+
+class SearchFailed(Exception):
+    """Carries the message the tool returns when a search can't produce an answer (never cached)."""
+
+async def _run_search(query: str) -> list:
+    """Google first, DuckDuckGo if Google fails or is unconfigured."""
     raw_results = None
-    
-    # 1. Try Google Search First
     if GOOGLE_SEARCH_API_KEY and GOOGLE_SEARCH_ENGINE_ID:
         try:
             raw_results = await google_custom_search(query, num_results=10)
         except Exception as e:
             logger.error(f"Google Search Exception: {e}")
-    
-    # 2. Fallback to DuckDuckGo if Google fails or is unconfigured
+
     if not raw_results:
-        if not DDGS: return "Search disabled: Missing library and no Google keys."
+        if not DDGS: raise SearchFailed("Search disabled: Missing library and no Google keys.")
         try:
             loop = asyncio.get_running_loop()
             def run_ddg():
@@ -127,20 +118,30 @@ async def perform_web_search(query: str) -> str:
                 if 'href' in r and 'link' not in r: r['link'] = r['href']
                 if 'body' in r and 'snippet' not in r: r['snippet'] = r['body']
         except Exception as e:
-            return f"Search Error: {e}"
+            raise SearchFailed(f"Search Error: {e}")
+    return raw_results or []
 
-    if not raw_results: return "No results found for that query."
+def _is_page_text(text: str) -> bool:
+    return bool(text) and not text.startswith(("Error ", "Scrape failed"))
+
+async def _deep_search(query: str, key: str, ttl: int) -> str:
+    start_time = datetime.utcnow()
+
+    # 1. Search (Google, then DuckDuckGo)
+    raw_results = await search_cache.get_or_fetch("results", key, ttl, lambda: _run_search(query))
+    if not raw_results: raise SearchFailed("No results found for that query.")
 
     # 2. Parallel Deep Scrape (Top 8-10 sources)
     search_data = []
     fetch_tasks = []
+    page_ttl = min(ttl, PAGE_TTL_MAX)
     
     # Filter and prioritize results
     for r in raw_results[:8]:
         link = r.get('link') or r.get('href')
         if not link: continue
         search_data.append({"title": r.get('title'), "link": link, "snippet": r.get('snippet') or r.get('body')})
-        fetch_tasks.append(fetch_website_content(link))
+        fetch_tasks.append(search_cache.get_or_fetch("page", link, page_ttl, functools.partial(fetch_website_content, link), _is_page_text))
 
     scraped_contents = await asyncio.gather(*fetch_tasks)
     
@@ -160,36 +161,60 @@ async def perform_web_search(query: str) -> str:
             f"DATA:\n{context_blob}"
         )
 
-        response = await verification_model.generate_content_async(verify_prompt)
+        # Runs inside a reply's tool loop, so it shares the reply's priority
+        async with limiter.slot(verification_model, PRIORITY_INTERACTIVE):
+            response = await verification_model.generate_content_async(verify_prompt)
         final_info = _safe_get_response_text(response)
+    except Exception as e:
+        logger.error(f"Synthesis failed: {e}")
+        raise SearchFailed("Internal synthesis error during verification.")
         
-        # 4. LOG TO DEBUG (For Dashboard)
-        debug_entry = {
-            "query": query,
-            "timestamp": start_time,
-            "source_count": len(search_data),
-            "sources": search_data,
-            "synthesis": final_info,
-            "processing_time": (datetime.utcnow() - start_time).total_seconds()
-        }
-        try:
-            search_debug_collection.insert_one(debug_entry)
-        except: pass
+    # 4. LOG TO DEBUG (For Dashboard)
+    debug_entry = {
+        "query": query,
+        "timestamp": start_time,
+        "source_count": len(search_data),
+        "sources": search_data,
+        "synthesis": final_info,
+        "processing_time": (datetime.utcnow() - start_time).total_seconds()
+    }
+    try:
+        await async_search_debug_collection.insert_one(debug_entry)
+    except: pass
 
-        return f"### VERIFIED SEARCH RESULTS:\n{final_info}\n\nSources used: " + ", ".join([d['link'] for d in search_data[:5]]) + " (+ more)"
+    return f"### VERIFIED SEARCH RESULTS:\n{final_info}\n\nSources used: " + ", ".join([d['link'] for d in search_data[:5]]) + " (+ more)"
 
-    except Exception as e:
-        logger.error(f"Synthesis failed: {e}")
-        return "Internal synthesis error during verification."
+async def perform_web_search(query: str) -> str:
+    """
+    REQUIRED TOOL: Searches the internet to find real-time information, facts, or news.
+    USE THIS WHENEVER:
+    1. The user asks about current events, games, tech, or specific facts.
+    2. You are unsure about an answer.
+    3. You need to verify something.
+    
+    Args:
+        query: The search string (e.g. "latest Elden Ring patch notes").
+    """
+    logger.info(f"Deep Search Initiated: {query}")
+    key = normalize_query(query)
+    ttl = query_ttl(key)
+    try:
+        # Verified answers, raw hits and scraped pages are each cached, so a repeat of a recent
+        # query (from any guild) skips the search, the scrape and the verification call
+        return await search_cache.get_or_fetch("summary", key, ttl, lambda: _deep_search(query, key, ttl))
+    except SearchFailed as e:
+        return str(e)
 
 async def identify_visual_content(visual_description: str) -> str:
     return await perform_web_search(f"exact name and series origin of {visual_description} wiki")
 
-async def should_send_gif(summarizer_model, channel, bot_response_text, gif_search_term) -> bool:
+async def should_send_gif(summarizer_model, channel, bot_response_text, gif_search_term, message_buffer=None) -> bool:
     try:
-        history = [msg async for msg in channel.history(limit=5)]
+        if message_buffer: history = await message_buffer.history(channel, limit=5)
+        else: history = [msg async for msg in channel.history(limit=5)]
         prompt = f"Context: {[m.clean_content for m in history]}\nResponse: {bot_response_text}\nGIF: {gif_search_term}\nAppropriate? yes/no"
-        res = await summarizer_model.generate_content_async(prompt)
+        async with limiter.slot(summarizer_model, PRIORITY_GATE):
+            res = await summarizer_model.generate_content_async(prompt)
         return 'yes' in _safe_get_response_text(res).lower()
     except: return False
 
@@ -1,11 +1,13 @@
 import discord
 from discord import app_commands
-from discord.ext import commands
+from discord.ext import commands, tasks
 import logging
+import asyncio
 import datetime
 import random
-from utils.danbooru_api import get_random_danbooru_image
-from utils.db import anime_gacha_users_collection, anime_gacha_inventory_collection
+from utils.danbooru_api import get_random_danbooru_image, ensure_tag_index
+from utils.db import async_anime_gacha_users_collection, async_anime_gacha_inventory_collection, async_anime_gacha_card_pool_collection
+from utils.card_pool import CardPool
 
 logger = logging.getLogger(__name__)
 
@@ -28,6 +30,67 @@ def calculate_rarity(fav_count: int):
             return stars, color, name
     return RARITY_MAP[-1][1:] # Fallback
 
+# --- COLLECTION SUMMARY ---
+# Each user document carries a materialized `collection` summary (card count, count per rarity,
+# total value, rarest card), updated with $inc on every claim so /profile and /leaderboard never
+# touch the inventory. Users from before the summary existed are rebuilt once from their inventory.
+RARITY_RANK = {name: len(RARITY_MAP) - i for i, (_, _, _, name) in enumerate(RARITY_MAP)} # LEGENDARY=5 .. COMMON=1
+RARITY_VALUE = {"LEGENDARY": 500, "EPIC": 200, "RARE": 100, "UNCOMMON": 50, "COMMON": 25}
+INVENTORY_PAGE_SIZE = 10
+
+# /leaderboard sort options -> summary field (each backed by an index in init_db)
+LEADERBOARD_FIELDS = {
+    "value": ("collection.value", "Collection Value"),
+    "cards": ("collection.count", "Cards Owned"),
+    "legendary": ("collection.by_rarity.LEGENDARY", "Legendary Cards"),
+}
+# Server boards filter by member ids up to this many members; bigger servers walk the global
+# ranking in batches and keep members, giving up after LEADERBOARD_SCAN_LIMIT users
+LEADERBOARD_MAX_IN_MEMBERS = 5000
+LEADERBOARD_SCAN_BATCH = 500
+LEADERBOARD_SCAN_LIMIT = 20000
+
+def empty_collection() -> dict:
+    return {"count": 0, "by_rarity": {}, "value": 0, "top_card": None}
+
+def _top_card(card: dict) -> dict:
+    return {
+        "character": card["character"], "stars": card["stars"], "rarity": card["rarity"],
+        "image_url": card.get("image_url"), "rank": RARITY_RANK.get(card["rarity"], 0)
+    }
+
+async def rebuild_collection_summary(user_id: int) -> dict:
+    """Recomputes a user's summary from their inventory (backfill and self-repair only)."""
+    summary = empty_collection()
+    projection = {"character": 1, "stars": 1, "rarity": 1, "image_url": 1}
+    async for card in async_anime_gacha_inventory_collection.find({"user_id": user_id}, projection):
+        rarity = card.get("rarity", "COMMON")
+        summary["count"] += 1
+        summary["by_rarity"][rarity] = summary["by_rarity"].get(rarity, 0) + 1
+        summary["value"] += RARITY_VALUE.get(rarity, 0)
+        top = summary["top_card"]
+        if top is None or RARITY_RANK.get(rarity, 0) > top["rank"]:
+            summary["top_card"] = _top_card({**card, "rarity": rarity})
+    await async_anime_gacha_users_collection.update_one({"user_id": user_id}, {"$set": {"collection": summary}})
+    return summary
+
+async def record_claim(user_id: int, card: dict):
+    """Folds one newly claimed inventory card into the owner's summary."""
+    rarity = card["rarity"]
+    result = await async_anime_gacha_users_collection.update_one(
+        {"user_id": user_id, "collection": {"$exists": True}},
+        {"$inc": {"collection.count": 1, f"collection.by_rarity.{rarity}": 1, "collection.value": RARITY_VALUE.get(rarity, 0)}}
+    )
+    if not result.matched_count:
+        # No summary yet: build it from the inventory, which already holds this card
+        await rebuild_collection_summary(user_id)
+        return
+    top = _top_card(card)
+    await async_anime_gacha_users_collection.update_one(
+        {"user_id": user_id, "$or": [{"collection.top_card": None}, {"collection.top_card.rank": {"$lt": top["rank"]}}]},
+        {"$set": {"collection.top_card": top}}
+    )
+
 
 
 class GachaView(discord.ui.View):
@@ -49,7 +112,7 @@ class GachaView(discord.ui.View):
             return
 
         # Check for duplicates
-        existing = anime_gacha_inventory_collection.find_one({
+        existing = await async_anime_gacha_inventory_collection.find_one({
             "user_id": interaction.user.id,
             "image_id": self.image_data['id']
         })
@@ -57,7 +120,7 @@ class GachaView(discord.ui.View):
         if existing:
             # Duplicate mechanic: Convert to coins
             refund = 25
-            anime_gacha_users_collection.update_one(
+            await async_anime_gacha_users_collection.update_one(
                 {"user_id": interaction.user.id},
                 {"$inc": {"credits": refund}}
             )
@@ -75,7 +138,8 @@ class GachaView(discord.ui.View):
             "stars": self.image_data['stars'],
             "claimed_at": datetime.datetime.utcnow()
         }
-        anime_gacha_inventory_collection.insert_one(doc)
+        await async_anime_gacha_inventory_collection.insert_one(doc)
+        await record_claim(interaction.user.id, doc)
 
         self.claimed = True
         button.label = "Claimed!"
@@ -92,20 +156,96 @@ class GachaView(discord.ui.View):
         await interaction.response.edit_message(view=None)
         self.stop()
 
+class InventoryView(discord.ui.View):
+    """
+    Pages through a user's cards newest-first with keyset pagination on (claimed_at, _id):
+    each page starts after the last card of the previous one, so no page skips over earlier ones.
+    """
+    def __init__(self, owner_id: int, total: int):
+        super().__init__(timeout=120)
+        self.owner_id = owner_id
+        self.total = total
+        self.starts = [None] # Cursor each visited page starts after (None = newest)
+        self.next_cursor = None
+
+    async def load_page(self) -> discord.Embed:
+        query = {"user_id": self.owner_id}
+        cursor = self.starts[-1]
+        if cursor:
+            claimed_at, last_id = cursor
+            query["$or"] = [{"claimed_at": {"$lt": claimed_at}}, {"claimed_at": claimed_at, "_id": {"$lt": last_id}}]
+        items = await async_anime_gacha_inventory_collection.find(query).sort(
+            [("claimed_at", -1), ("_id", -1)]
+        ).limit(INVENTORY_PAGE_SIZE + 1).to_list(length=INVENTORY_PAGE_SIZE + 1)
+
+        more = len(items) > INVENTORY_PAGE_SIZE
+        items = items[:INVENTORY_PAGE_SIZE]
+        self.next_cursor = (items[-1]["claimed_at"], items[-1]["_id"]) if more else None
+        self.newer_button.disabled = len(self.starts) == 1
+        self.older_button.disabled = not more
+
+        embed = discord.Embed(title="🎒 Your Collection", color=discord.Color.gold())
+        embed.description = "".join(f"{item['stars']} **{item['character']}** - *{item['rarity']}*\n" for item in items)
+        embed.set_footer(text=f"Page {len(self.starts)} · {self.total} cards total")
+        return embed
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        if interaction.user.id != self.owner_id:
+            await interaction.response.send_message("This isn't your inventory! Use `/inventory` to see yours.", ephemeral=True)
+            return False
+        return True
+
+    @discord.ui.button(label="◀ Newer", style=discord.ButtonStyle.secondary)
+    async def newer_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+        if len(self.starts) > 1: self.starts.pop()
+        await interaction.response.edit_message(embed=await self.load_page(), view=self)
+
+    @discord.ui.button(label="Older ▶", style=discord.ButtonStyle.secondary)
+    async def older_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+        if self.next_cursor: self.starts.append(self.next_cursor)
+        await interaction.response.edit_message(embed=await self.load_page(), view=self)
+
 class AnimeCog(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
+        # Parsed cards are fetched ahead of time so a pull doesn't wait on Safebooru
+        self.card_pool = CardPool(async_anime_gacha_card_pool_collection, get_random_danbooru_image)
+        self.card_pool.start()
+        self.tag_index_loop.start()
+        self._backfill_task = asyncio.get_running_loop().create_task(self.backfill_collection_summaries())
+
+    def cog_unload(self):
+        self.card_pool.stop()
+        self.tag_index_loop.cancel()
+        self._backfill_task.cancel()
+
+    async def backfill_collection_summaries(self):
+        """One-off for users created before summaries existed; new users start with an empty one."""
+        try:
+            count = 0
+            async for user in async_anime_gacha_users_collection.find({"collection": {"$exists": False}}, {"user_id": 1}):
+                await rebuild_collection_summary(user["user_id"])
+                count += 1
+            if count: logger.info(f"Built gacha collection summaries for {count} user(s).")
+        except Exception as e:
+            logger.error(f"Gacha summary backfill failed: {e}")
+
+    @tasks.loop(hours=1)
+    async def tag_index_loop(self):
+        # Loads the saved autocomplete index; downloads a new one only once it is stale
+        await ensure_tag_index()
 
     async def get_user_profile(self, user_id: int):
-        profile = anime_gacha_users_collection.find_one({"user_id": user_id})
+        profile = await async_anime_gacha_users_collection.find_one({"user_id": user_id})
         if not profile:
             profile = {
                 "user_id": user_id,
                 "credits": 500, # Starting bonus
                 "last_daily": None,
-                "pulls": 0
+                "pulls": 0,
+                "collection": empty_collection()
             }
-            anime_gacha_users_collection.insert_one(profile)
+            await async_anime_gacha_users_collection.insert_one(profile)
         return profile
 
     @app_commands.command(name="daily", description="Claim your daily gacha credits (1000 🪙)")
@@ -125,7 +265,7 @@ class AnimeCog(commands.Cog):
                 await interaction.response.send_message(f"⏳ Please wait **{hours}h {minutes}m** for your next daily reward.", ephemeral=True)
                 return
 
-        anime_gacha_users_collection.update_one(
+        await async_anime_gacha_users_collection.update_one(
             {"user_id": user_id},
             {
                 "$inc": {"credits": DAILY_REWARD},
@@ -159,17 +299,17 @@ class AnimeCog(commands.Cog):
             return
 
         # Deduct Cost
-        anime_gacha_users_collection.update_one(
+        await async_anime_gacha_users_collection.update_one(
             {"user_id": user.id},
             {"$inc": {"credits": -PULL_COST, "pulls": 1}}
         )
 
         # Fetch Image
-        result = await get_random_danbooru_image(gender_tag)
+        result = await self.card_pool.take(gender_tag)
         
         if not result or not result.get('image_url'):
             # Refund on failure
-            anime_gacha_users_collection.update_one({"user_id": user.id}, {"$inc": {"credits": PULL_COST}})
+            await async_anime_gacha_users_collection.update_one({"user_id": user.id}, {"$inc": {"credits": PULL_COST}})
             msg = "⚠️ Failed to find a character. Credits refunded."
             if isinstance(ctx, discord.Interaction):
                 await ctx.followup.send(msg, ephemeral=True)
@@ -216,12 +356,9 @@ class AnimeCog(commands.Cog):
     async def profile(self, interaction: discord.Interaction, user: discord.Member = None):
         target_user = user or interaction.user
         profile = await self.get_user_profile(target_user.id)
-        
-        inventory_count = anime_gacha_inventory_collection.count_documents({"user_id": target_user.id})
-        top_card = anime_gacha_inventory_collection.find_one(
-            {"user_id": target_user.id},
-            sort=[("stars", -1)] 
-        )
+        collection = profile.get("collection") or await rebuild_collection_summary(target_user.id)
+        inventory_count = collection["count"]
+        top_card = collection["top_card"]
 
         embed = discord.Embed(
             title=f"📊 Profile: {target_user.display_name}",
@@ -231,6 +368,12 @@ class AnimeCog(commands.Cog):
         embed.add_field(name="💰 Credits", value=f"**{profile['credits']}** 🪙", inline=True)
         embed.add_field(name="🃏 Cards Owned", value=f"**{inventory_count}**", inline=True)
         embed.add_field(name="🎰 Total Pulls", value=f"**{profile.get('pulls', 0)}**", inline=True)
+        embed.add_field(name="💎 Collection Value", value=f"**{collection['value']}**", inline=True)
+
+        by_rarity = collection["by_rarity"]
+        breakdown = " · ".join(f"{name.title()} **{by_rarity[name]}**" for _, _, _, name in RARITY_MAP if by_rarity.get(name))
+        if breakdown:
+            embed.add_field(name="📚 By Rarity", value=breakdown, inline=False)
         
         if top_card:
             embed.add_field(name="🏆 Rarest Card", value=f"{top_card['stars']} **{top_card['character']}**", inline=False)
@@ -240,22 +383,53 @@ class AnimeCog(commands.Cog):
     @app_commands.command(name="inventory", description="View your claimed characters")
     async def inventory(self, interaction: discord.Interaction):
         user_id = interaction.user.id
-        cursor = anime_gacha_inventory_collection.find({"user_id": user_id}).sort("claimed_at", -1).limit(10)
-        items = list(cursor)
+        profile = await async_anime_gacha_users_collection.find_one({"user_id": user_id}, {"collection": 1})
+        collection = profile and (profile.get("collection") or await rebuild_collection_summary(user_id))
 
-        if not items:
+        if not collection or not collection["count"]:
             await interaction.response.send_message("You haven't claimed any characters yet! Use `/pull` to start.", ephemeral=True)
             return
 
-        embed = discord.Embed(title="🎒 Your Latest Acquisitions", color=discord.Color.gold())
-        
-        description = ""
-        for item in items:
-            description += f"{item['stars']} **{item['character']}** - *{item['rarity']}*\n"
-        
-        embed.description = description
-        embed.set_footer(text="Showing last 10 items.")
-        
+        view = InventoryView(user_id, collection["count"])
+        await interaction.response.send_message(embed=await view.load_page(), view=view)
+
+    @app_commands.command(name="leaderboard", description="Top gacha collectors")
+    @app_commands.describe(by="What to rank by", scope="This server or everyone")
+    @app_commands.choices(
+        by=[app_commands.Choice(name=label, value=key) for key, (_, label) in LEADERBOARD_FIELDS.items()],
+        scope=[app_commands.Choice(name="This server", value="server"), app_commands.Choice(name="Global", value="global")]
+    )
+    async def leaderboard(self, interaction: discord.Interaction, by: str = "value", scope: str = "server"):
+        field, label = LEADERBOARD_FIELDS.get(by, LEADERBOARD_FIELDS["value"])
+        # Walks the (field, user_id) index from the top; a server board keeps only its members, by id
+        # list or, on big servers, by skipping non-members
+        local = scope == "server" and interaction.guild is not None
+        members = interaction.guild.members if local else []
+        scan = local and len(members) > LEADERBOARD_MAX_IN_MEMBERS
+        query = {field: {"$gt": 0}}
+        if local and not scan: query["user_id"] = {"$in": [m.id for m in members]}
+        cursor = async_anime_gacha_users_collection.find(query, {"user_id": 1, field: 1}).sort(field, -1)
+        if scan: cursor = cursor.batch_size(LEADERBOARD_SCAN_BATCH).limit(LEADERBOARD_SCAN_LIMIT)
+        else: cursor = cursor.limit(10)
+
+        rows = []
+        async for doc in cursor:
+            if scan and not interaction.guild.get_member(doc["user_id"]): continue
+            value = doc
+            for part in field.split("."): value = (value or {}).get(part)
+            rows.append((doc["user_id"], value or 0))
+            if len(rows) >= 10: break
+        if scan: await cursor.close()
+
+        embed = discord.Embed(
+            title=f"🏆 Gacha Leaderboard: {label}",
+            color=discord.Color.gold()
+        )
+        medals = ["🥇", "🥈", "🥉"]
+        embed.description = "\n".join(
+            f"{medals[i] if i < 3 else f'`#{i + 1}`'} <@{uid}> — **{value}**" for i, (uid, value) in enumerate(rows)
+        ) or "No collectors yet! Use `/waifu` or `/husbando` to start."
+        embed.set_footer(text="This server" if local else "All servers")
         await interaction.response.send_message(embed=embed)
 
 async def setup(bot: commands.Bot):
@@ -2,7 +2,7 @@
 import discord
 from discord import app_commands
 from discord.ext import commands
-from utils.db import ai_config_collection
+from utils.config_cache import update_guild_config
 
 from utils.timezone_manager import set_user_timezone, DEFAULT_TIMEZONE
 from datetime import datetime, timedelta, timezone
@@ -38,7 +38,7 @@ class ConfigurationCog(commands.Cog):
             "next_chat_time": now + timedelta(minutes=minutes),
             "bot_disabled": False, "group_chat_enabled": True
         }
-        ai_config_collection.update_one({"_id": str(interaction.guild_id)}, {"$set": update_data}, upsert=True)
+        await update_guild_config(interaction.guild_id, update_data)
         await interaction.followup.send(f"✅ **Chat Configured:** {channel.mention} ({frequency}).")
 
     @configuration_group.command(name="timezone", description="Set your personal timezone for AI interactions (e.g., Asia/Jakarta).")
@@ -55,13 +55,13 @@ class ConfigurationCog(commands.Cog):
     @app_commands.checks.has_permissions(manage_guild=True)
     async def config_bot(self, interaction: discord.Interaction, status: int):
         disabled = False if status == 1 else True
-        ai_config_collection.update_one({"_id": str(interaction.guild_id)}, {"$set": {"bot_disabled": disabled}}, upsert=True)
+        await update_guild_config(interaction.guild_id, {"bot_disabled": disabled})
         await interaction.response.send_message(f"✅ AnTiMa is now **{'Enabled' if status == 1 else 'Disabled'}**.", ephemeral=True)
 
     @configuration_group.command(name="rpg", description="Set the channel for RPG Adventures.")
     @app_commands.checks.has_permissions(manage_guild=True)
     async def config_rpg(self, interaction: discord.Interaction, channel: discord.TextChannel):
-        ai_config_collection.update_one({"_id": str(interaction.guild_id)}, {"$set": {"rpg_channel_id": channel.id}}, upsert=True)
+        await update_guild_config(interaction.guild_id, {"rpg_channel_id": channel.id})
         await interaction.response.send_message(f"✅ **RPG Channel Set:** {channel.mention}", ephemeral=True)
 
     @configuration_group.command(name="group", description="Allow AI to reply to group conversations?")
@@ -69,7 +69,7 @@ class ConfigurationCog(commands.Cog):
     @app_commands.checks.has_permissions(manage_guild=True)
     async def config_group(self, interaction: discord.Interaction, mode: int):
         enabled = True if mode == 1 else False
-        ai_config_collection.update_one({"_id": str(interaction.guild.id)}, {"$set": {"group_chat_enabled": enabled}}, upsert=True)
+        await update_guild_config(interaction.guild_id, {"group_chat_enabled": enabled})
         await interaction.response.send_message(f"✅ Group Replies: **{'Allowed' if enabled else 'Blocked'}**.", ephemeral=True)
 
 
@@ -1,16 +1,44 @@
 # cogs/logging_cog.py
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
 import logging
 import datetime
 import sys
 import re
-from utils.db import logs_collection
+import asyncio
+import collections
+import threading
+from utils.db import logs_collection, async_logs_collection
+from utils import log_store
+
+# Log shipping: records are queued by emit() and written in batches by a background task
+LOG_FLUSH_SECONDS = 2.0
+LOG_BATCH_SIZE = 500        # A batch this large wakes the writer early
+LOG_QUEUE_MAX = 20000       # Bound on records waiting in memory
 
 class MongoHandler(logging.Handler):
-    def __init__(self, bot):
+    """
+    Queue-based log handler. emit() only formats and enqueues (safe from any thread); a writer
+    task on the bot loop drains the queue every LOG_FLUSH_SECONDS and sends one
+    $push: {$each: [...]} per bucket document, all in a single bulk_write. Bucket documents are
+    capped and roll over (see utils/log_store.py); the handler tracks each open bucket's head.
+
+    When the queue is full, INFO/DEBUG records are dropped; WARNING and above evict the
+    oldest queued record instead. Drops are counted and reported in the log itself.
+    """
+    def __init__(self, bot, loop=None, max_queue: int = LOG_QUEUE_MAX):
         super().__init__()
         self.bot = bot
+        # The event loop Motor writes are scheduled on. emit() can be called from any thread.
+        self.loop = loop
+        self.max_queue = max_queue
+        self._queue = collections.deque()
+        self._lock = threading.Lock()
+        self._wake = asyncio.Event()
+        self._writer = None
+        self._heads = {}  # bucket -> (seq, count) of the document currently being filled
+        self.dropped = 0
+        self.written = 0
         # Pre-compile regex for performance
         self.ansi_escape = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
 
@@ -23,7 +51,7 @@ class MongoHandler(logging.Handler):
             clean_msg = self.ansi_escape.sub('', msg)
 
             log_entry = {
-                "_id": f"{timestamp.strftime('%Y-%m-%d-%H')}-{timestamp.minute // 10}",
+                "bucket": log_store.bucket_id(timestamp),
                 "timestamp": timestamp,
                 "level": record.levelname,
                 "logger": record.name,
@@ -31,16 +59,88 @@ class MongoHandler(logging.Handler):
                 "guild_id": getattr(record, "guild_id", None),
                 "user_id": getattr(record, "user_id", None)
             }
-            
-            # Upsert into 10-minute buckets
-            logs_collection.update_one(
-                {"_id": log_entry["_id"]},
-                {"$push": {"logs": log_entry}, "$setOnInsert": {"created_at": timestamp}},
-                upsert=True
-            )
+
+            with self._lock:
+                if len(self._queue) >= self.max_queue:
+                    self.dropped += 1
+                    if record.levelno < logging.WARNING: return
+                    self._queue.popleft()
+                self._queue.append(log_entry)
+                wake = len(self._queue) >= LOG_BATCH_SIZE
+
+            if wake and self.loop and self.loop.is_running():
+                self.loop.call_soon_threadsafe(self._wake.set)
         except Exception:
             self.handleError(record)
 
+    # --- WRITER ---
+
+    def start(self):
+        if self._writer is None:
+            self._writer = self.loop.create_task(self._run())
+
+    async def stop(self):
+        """Stops the writer and flushes whatever is still queued."""
+        if self._writer:
+            self._writer.cancel()
+            try: await self._writer
+            except asyncio.CancelledError: pass
+            self._writer = None
+        await self.flush()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=LOG_FLUSH_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    def _drain(self) -> list:
+        with self._lock:
+            entries = list(self._queue)
+            self._queue.clear()
+            dropped, self.dropped = self.dropped, 0
+        if dropped:
+            now = datetime.datetime.now(datetime.timezone.utc)
+            entries.append({
+                "bucket": log_store.bucket_id(now), "timestamp": now,
+                "level": "WARNING", "logger": "MongoHandler",
+                "message": f"Log queue full: dropped {dropped} record(s).", "guild_id": None, "user_id": None
+            })
+        return entries
+
+    async def flush(self):
+        entries = self._drain()
+        if not entries: return
+        try:
+            missing = {e["bucket"] for e in entries} - self._heads.keys()
+            if missing: self._heads.update(await log_store.load_heads(missing))
+            ops, heads = log_store.plan_writes(entries, self._heads)
+            await async_logs_collection.bulk_write(ops, ordered=True)
+            # Only buckets written this round stay open; older ones are closed for good
+            self._heads = heads
+            self.written += len(entries)
+        except Exception as e:
+            # Never log from the log writer (would recurse); put the batch back for the next flush
+            with self._lock:
+                room = max(self.max_queue - len(self._queue), 0)
+                self.dropped += len(entries) - min(room, len(entries))
+                self._queue.extendleft(reversed(entries[-room:] if room else []))
+            try: sys.__stderr__.write(f"Log shipping failed: {e}\n")
+            except Exception: pass
+
+    def close(self):
+        # Interpreter shutdown without a cog unload: last-chance synchronous write.
+        # No head lookups here; an unknown bucket may overshoot its cap by one batch.
+        try:
+            entries = self._drain()
+            if entries: logs_collection.bulk_write(log_store.plan_writes(entries, self._heads)[0], ordered=True)
+        except Exception:
+            pass
+        super().close()
+
 class StreamToLogger(object):
     """
     Redirects writes to a logger instance AND the original stream.
@@ -70,7 +170,9 @@ class StreamToLogger(object):
 class LoggingCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.mongo_handler = MongoHandler(bot)
+        self.mongo_handler = MongoHandler(bot, loop=asyncio.get_running_loop())
+        self.mongo_handler.start()
+        self.compact_logs_loop.start()
         
         # 1. Configure Root Logger (for general logging)
         root_logger = logging.getLogger()
@@ -99,11 +201,22 @@ class LoggingCog(commands.Cog):
         
         print("✅ Logging System Online: Terminal output is being mirrored to Dashboard.")
 
-    def cog_unload(self):
+    @tasks.loop(minutes=10)
+    async def compact_logs_loop(self):
+        try:
+            await log_store.compact_buckets()
+        except Exception as e:
+            print(f"Log Compaction Error: {e}")
+
+    async def cog_unload(self):
+        self.compact_logs_loop.cancel()
         # Restore original streams safely
         sys.stdout = self.original_stdout
         sys.stderr = self.original_stderr
         logging.getLogger().removeHandler(self.mongo_handler)
+        self.log_stdout.removeHandler(self.mongo_handler)
+        self.log_stderr.removeHandler(self.mongo_handler)
+        await self.mongo_handler.stop()
 
 async def setup(bot: commands.Bot):
     await bot.add_cog(LoggingCog(bot))
\ No newline at end of file
@@ -5,52 +5,121 @@ from discord.ext import commands
 import logging
 import asyncio
 import datetime
+import time
 import uuid
 import re
 from zoneinfo import ZoneInfo, available_timezones
-from utils.db import reminders_collection, user_timezones_collection # Import the collections
+from pymongo import ReturnDocument, UpdateOne
+from utils.db import async_reminders_collection, async_user_timezones_collection
+from utils.timer_wheel import TimerWheel
 
 logger = logging.getLogger(__name__)
 
+# Only reminders due within this window are held in memory; later ones are paged in as time advances
+REMINDER_WINDOW = datetime.timedelta(hours=1)
+REMINDER_PAGE_SECONDS = 300
+# DMs in flight at once when many reminders fall due together
+REMINDER_SEND_CONCURRENCY = 10
+# A claim older than this belongs to a delivery that died (e.g. a restart mid-repeat) and may be retaken
+REMINDER_CLAIM_TIMEOUT = datetime.timedelta(minutes=10)
+
+def _utc(dt: datetime.datetime) -> datetime.datetime:
+    # Motor returns naive UTC datetimes
+    return dt.replace(tzinfo=datetime.timezone.utc) if dt.tzinfo is None else dt
+
 class RemindersCog(commands.Cog, name="Reminders"):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
-        self.bot.loop.create_task(self.initialize_reminders())
-
-    async def initialize_reminders(self):
-        """On bot startup, load and schedule all pending reminders from the database."""
+        self.wheel = None
+        self._loaded = set()       # reminder _ids currently in the wheel
+        self._loaded_until = None  # due_at horizon already paged in
+        self._early = []           # (id, due_at) set while the initial page-in was still running
+        self._send_sem = asyncio.Semaphore(REMINDER_SEND_CONCURRENCY)
+        self._deliveries = set()
+        self._runner = self.bot.loop.create_task(self.run_reminders())
+
+    def cog_unload(self):
+        self._runner.cancel()
+
+    async def run_reminders(self):
+        """Drives the timer wheel: one tick per second, paging the next window in every REMINDER_PAGE_SECONDS."""
         await self.bot.wait_until_ready()
-        logger.info("Initializing pending reminders from MongoDB...")
-        pending_reminders = list(reminders_collection.find())
-        for reminder in pending_reminders:
-            await self._schedule_reminder(reminder)
-        logger.info(f"Scheduled {len(pending_reminders)} reminders.")
-
-    # --- Core Reminder Logic ---
-    async def _schedule_reminder(self, reminder: dict):
-        """Creates a background task to wait for and send a reminder."""
-        now_utc = datetime.datetime.now(datetime.timezone.utc)
-        remind_time = datetime.datetime.fromisoformat(reminder["remind_time_iso"])
-        delay = (remind_time - now_utc).total_seconds()
-
-        if delay > 0:
-            self.bot.loop.create_task(self._send_reminder_task(delay, reminder))
+        await self._backfill_due_at()
+        wheel = TimerWheel(start=time.time())
+        await self._page_in(initial=True, wheel=wheel)
+        # Publish only once the window is loaded; reminders set meanwhile were parked in _early
+        self.wheel = wheel
+        for reminder_id, due_at in self._early: self._add_to_wheel(reminder_id, due_at)
+        self._early = []
+        logger.info(f"Reminder wheel loaded {len(self.wheel)} reminder(s) due within {REMINDER_WINDOW}.")
+        last_page = time.monotonic()
+
+        while True:
+            await asyncio.sleep(self.wheel.tick)
+            for reminder_id in self.wheel.advance(time.time()):
+                self._loaded.discard(reminder_id)
+                task = asyncio.create_task(self._deliver(reminder_id))
+                self._deliveries.add(task)
+                task.add_done_callback(self._deliveries.discard)
+
+            if time.monotonic() - last_page >= REMINDER_PAGE_SECONDS:
+                try:
+                    await self._page_in()
+                    last_page = time.monotonic()
+                except Exception as e:
+                    logger.error(f"Reminder paging failed: {e}")
+
+    # --- Loading ---
+    async def _backfill_due_at(self):
+        """Reminders created before due_at existed only have remind_time_iso; index them once."""
+        ops = []
+        async for doc in async_reminders_collection.find({"due_at": {"$exists": False}}, {"remind_time_iso": 1}):
+            due = datetime.datetime.fromisoformat(doc["remind_time_iso"]).astimezone(datetime.timezone.utc)
+            ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"due_at": due}}))
+        if ops:
+            await async_reminders_collection.bulk_write(ops, ordered=False)
+            logger.info(f"Indexed {len(ops)} legacy reminder(s) by due time.")
+
+    def _add_to_wheel(self, reminder_id, due_at: datetime.datetime, wheel=None):
+        if reminder_id in self._loaded: return
+        self._loaded.add(reminder_id)
+        (wheel if wheel is not None else self.wheel).add(_utc(due_at).timestamp(), reminder_id)
+
+    async def _page_in(self, initial: bool = False, wheel=None):
+        now = datetime.datetime.now(datetime.timezone.utc)
+        horizon = now + REMINDER_WINDOW
+        if initial:
+            # Everything overdue too, including deliveries a previous run claimed but never finished
+            query = {
+                "due_at": {"$lt": horizon},
+                "$or": [{"claimed_at": None}, {"claimed_at": {"$lt": now - REMINDER_CLAIM_TIMEOUT}}]
+            }
         else:
-            logger.warning(f"Reminder {reminder['_id']} was in the past. Sending now.")
-            self.bot.loop.create_task(self._send_reminder_task(0, reminder))
+            # Overlap the previous page so a reminder inserted while it ran is not skipped
+            lower = self._loaded_until - datetime.timedelta(seconds=REMINDER_PAGE_SECONDS)
+            query = {"due_at": {"$gte": lower, "$lt": horizon}, "claimed_at": None}
+        async for doc in async_reminders_collection.find(query, {"due_at": 1}):
+            self._add_to_wheel(doc["_id"], doc["due_at"], wheel)
+        self._loaded_until = horizon
 
-    async def _send_reminder_task(self, delay: float, reminder: dict):
-        """The actual background task that sleeps and then sends the reminder."""
-        if delay > 0:
-            await asyncio.sleep(delay)
+    # --- Core Reminder Logic ---
+    async def _deliver(self, reminder_id):
+        """Claims the reminder atomically, sends each remaining call and records it, then deletes it."""
+        now = datetime.datetime.now(datetime.timezone.utc)
+        reminder = await async_reminders_collection.find_one_and_update(
+            {"_id": reminder_id, "$or": [{"claimed_at": None}, {"claimed_at": {"$lt": now - REMINDER_CLAIM_TIMEOUT}}]},
+            {"$set": {"claimed_at": now}},
+            return_document=ReturnDocument.AFTER
+        )
+        if not reminder: return # Already delivered or being delivered
 
         user = self.bot.get_user(reminder["user_id"])
         if not user:
             logger.error(f"Could not find user {reminder['user_id']}.")
-            reminders_collection.delete_one({"_id": reminder["_id"]})
+            await async_reminders_collection.delete_one({"_id": reminder_id})
             return
         
-        for i in range(reminder["repeat"]):
+        for i in range(reminder.get("sent", 0), reminder["repeat"]):
             try:
                 embed = discord.Embed(
                     title="⏰ Reminder!",
@@ -58,14 +127,20 @@ class RemindersCog(commands.Cog, name="Reminders"):
                     color=discord.Color.gold()
                 )
                 embed.set_footer(text=f"This is call {i + 1} of {reminder['repeat']}.")
-                await user.send(f"Hey {user.mention}, you asked me to remind you!", embed=embed)
+                async with self._send_sem:
+                    await user.send(f"Hey {user.mention}, you asked me to remind you!", embed=embed)
+                # Acknowledge each call so a restart mid-repeat resumes instead of re-sending
+                await async_reminders_collection.update_one(
+                    {"_id": reminder_id},
+                    {"$inc": {"sent": 1}, "$set": {"claimed_at": datetime.datetime.now(datetime.timezone.utc)}}
+                )
                 if i < reminder["repeat"] - 1:
                     await asyncio.sleep(30)
             except discord.Forbidden:
                 logger.error(f"Cannot send DM to user {user.name}.")
                 break
 
-        reminders_collection.delete_one({"_id": reminder["_id"]})
+        await async_reminders_collection.delete_one({"_id": reminder_id})
 
     # --- Time Parsing Helper (no changes needed) ---
     def _parse_time(self, time_str: str, user_tz: ZoneInfo) -> datetime.datetime | None:
@@ -114,7 +189,7 @@ class RemindersCog(commands.Cog, name="Reminders"):
 
         user_id = str(interaction.user.id)
         # Update or insert the user's timezone in the database
-        user_timezones_collection.update_one(
+        await async_user_timezones_collection.update_one(
             {"_id": user_id},
             {"$set": {"timezone": timezone}},
             upsert=True
@@ -127,7 +202,7 @@ class RemindersCog(commands.Cog, name="Reminders"):
         user_id = str(interaction.user.id)
         
         # Get the user's timezone from the database
-        user_timezone_data = user_timezones_collection.find_one({"_id": user_id})
+        user_timezone_data = await async_user_timezones_collection.find_one({"_id": user_id})
         if not user_timezone_data:
             await interaction.response.send_message(
                 "️️️⚠️ **Please set your timezone first!** Use the `/settimezone` command before setting a reminder.",
@@ -143,18 +218,23 @@ class RemindersCog(commands.Cog, name="Reminders"):
             await interaction.response.send_message("❌ **Invalid time format!** Please use a format like `10m`, `2h30m`, or `16:30`.", ephemeral=True)
             return
 
+        due_at = remind_time.astimezone(datetime.timezone.utc)
         reminder = {
             "user_id": interaction.user.id,
             "message": message,
             "remind_time_iso": remind_time.isoformat(),
+            "due_at": due_at,
             "repeat": max(1, min(5, repeat)) # Clamped between 1 and 5
         }
 
         # Insert the new reminder into the database
-        result = reminders_collection.insert_one(reminder)
-        # Get the reminder back with its new ID for scheduling
-        new_reminder = reminders_collection.find_one({"_id": result.inserted_id})
-        await self._schedule_reminder(new_reminder)
+        result = await async_reminders_collection.insert_one(reminder)
+        # Inside the loaded window it goes straight into the wheel; later ones are paged in when due
+        # (TimerWheel defines __len__, so an empty wheel is falsy: compare against None)
+        if self.wheel is None:
+            self._early.append((result.inserted_id, due_at))
+        elif self._loaded_until is not None and due_at < self._loaded_until:
+            self._add_to_wheel(result.inserted_id, due_at)
 
         await interaction.response.send_message(
             f"✅ **Reminder set!** I will remind you about `{message}` at {discord.utils.format_dt(remind_time, style='T')} your time.",
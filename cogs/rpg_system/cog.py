@@ -8,9 +8,13 @@ import uuid
 from datetime import datetime
 
 from utils.db import (
-    ai_config_collection, rpg_sessions_collection, rpg_inventory_collection,
-    rpg_world_state_collection, web_actions_collection, rpg_web_tokens_collection, db
+    async_rpg_sessions_collection,
+    async_web_actions_collection, async_rpg_web_tokens_collection,
+    async_rpg_debug_terminal_collection
 )
+from utils.config_cache import get_guild_config
+from utils import world_store
+from utils.event_bus import event_bus
 from utils.limiter import limiter
 from .config import RPG_CLASSES
 from .ui import AdventureSetupView, CloseVoteView
@@ -65,40 +69,55 @@ class RPGAdventureCog(commands.Cog):
         except Exception as e:
             print(f"❌ Failed to load Gemini RPG: {e}")
 
+        # Dashboard writes wake these loops immediately when change streams are available
+        self.web_action_events = event_bus.subscribe(
+            "rpg_web_actions", async_web_actions_collection,
+            {"operationType": "insert", "fullDocument.type": "create_rpg_web"}
+        )
+        self.delete_events = event_bus.subscribe(
+            "rpg_delete_requests", async_rpg_sessions_collection,
+            {"operationType": "update", "updateDescription.updatedFields.delete_requested": True}
+        )
         self.cleanup_tasks.start()
         self.web_poller.start()
 
     def cog_unload(self):
         self.cleanup_tasks.cancel()
         self.web_poller.cancel()
+        self.web_action_events.close()
+        self.delete_events.close()
 
     # --- TASKS ---
 
-    @tasks.loop(seconds=10)
+    @tasks.loop(seconds=0)
     async def cleanup_tasks(self):
         try:
-            for session in rpg_sessions_collection.find({"delete_requested": True}):
+            async for session in async_rpg_sessions_collection.find({"delete_requested": True}, {"thread_id": 1}):
                 tid = session['thread_id']
                 try: 
                     ch = self.bot.get_channel(tid) or await self.bot.fetch_channel(tid)
                     if ch: await ch.delete()
                 except: pass
                 
-                rpg_sessions_collection.delete_one({"thread_id": tid})
-                rpg_world_state_collection.delete_one({"thread_id": tid})
-                db.rpg_debug_terminal.delete_many({"thread_id": str(tid)})
+                await async_rpg_sessions_collection.delete_one({"thread_id": tid})
+                await world_store.delete_thread(tid)
+                await async_rpg_debug_terminal_collection.delete_many({"thread_id": str(tid)})
+                if hasattr(self, 'memory_manager'):
+                    self.memory_manager.vector_store.drop(tid)
+                    await self.memory_manager.snapshots.truncate(tid, 0)
                 
                 if tid in self.engine.active_sessions: 
                     del self.engine.active_sessions[tid]
         except Exception as e: print(f"Cleanup Error: {e}")
+        await self.delete_events.wait(10)
 
-    @tasks.loop(seconds=3)
+    @tasks.loop(seconds=0)
     async def web_poller(self):
         try:
-            actions = list(web_actions_collection.find({"type": "create_rpg_web", "status": "pending"}))
+            actions = await async_web_actions_collection.find({"type": "create_rpg_web", "status": "pending"}).to_list(length=None)
             for action in actions:
                 try:
-                    web_actions_collection.update_one({"_id": action["_id"]}, {"$set": {"status": "processing"}})
+                    await async_web_actions_collection.update_one({"_id": action["_id"]}, {"$set": {"status": "processing"}})
                     guild = self.bot.get_guild(action["guild_id"])
                     user = guild.get_member(action["user_id"]) if guild else None
                     
@@ -117,24 +136,25 @@ class RPGAdventureCog(commands.Cog):
                             scenario_name=data["scenario"], story_mode=data["story_mode"],
                             custom_title=data["title"], manual_guild_id=guild.id, manual_user=user
                         )
-                        web_actions_collection.update_one({"_id": action["_id"]}, {"$set": {"status": "completed"}})
+                        await async_web_actions_collection.update_one({"_id": action["_id"]}, {"$set": {"status": "completed"}})
                     else:
-                        web_actions_collection.update_one({"_id": action["_id"]}, {"$set": {"status": "failed", "reason": "User/Guild not found"}})
+                        await async_web_actions_collection.update_one({"_id": action["_id"]}, {"$set": {"status": "failed", "reason": "User/Guild not found"}})
                 except Exception as e:
-                    web_actions_collection.update_one({"_id": action["_id"]}, {"$set": {"status": "error", "error": str(e)}})
+                    await async_web_actions_collection.update_one({"_id": action["_id"]}, {"$set": {"status": "error", "error": str(e)}})
         except Exception as e: print(f"Poller Error: {e}")
+        await self.web_action_events.wait(3)
 
     # --- CALLBACKS ---
 
     async def reroll_turn_callback(self, interaction, thread_id):
-        session = rpg_sessions_collection.find_one({"thread_id": thread_id})
+        session = await async_rpg_sessions_collection.find_one({"thread_id": thread_id})
         if not session or interaction.user.id != session['owner_id']:
              return await interaction.followup.send("⚠️ Only the Game Master can reroll.", ephemeral=True)
         
         try: await interaction.message.delete()
         except: pass 
 
-        deleted_turn = self.memory_manager.delete_last_turn(thread_id)
+        deleted_turn = await self.memory_manager.delete_last_turn(thread_id)
         RPGLogger.log(thread_id, "info", "Turn Rerolled by User (State Rewound)")
 
         if deleted_turn:
@@ -169,7 +189,7 @@ class RPGAdventureCog(commands.Cog):
     @rpg_group.command(name="start", description="Start a new adventure.")
     async def rpg_start(self, interaction: discord.Interaction):
         await interaction.response.defer(ephemeral=False)
-        config = ai_config_collection.find_one({"_id": str(interaction.guild_id)})
+        config = await get_guild_config(interaction.guild_id)
         if not config or "rpg_channel_id" not in config: 
             return await interaction.followup.send("⚠️ Admin must set channel first using `/config rpg`.", ephemeral=True)
         view = AdventureSetupView(self.bot, interaction.user)
@@ -180,7 +200,7 @@ class RPGAdventureCog(commands.Cog):
         if not isinstance(interaction.channel, discord.Thread): 
             return await interaction.response.send_message("Use this inside an active Adventure Thread.", ephemeral=True)
         
-        world_data = rpg_world_state_collection.find_one({"thread_id": interaction.channel.id})
+        world_data = await world_store.load_world(interaction.channel.id, categories=("quests",))
         if not world_data: return await interaction.response.send_message("No world data found.", ephemeral=True)
         
         await interaction.response.defer(ephemeral=True)
@@ -211,7 +231,7 @@ class RPGAdventureCog(commands.Cog):
         if not isinstance(interaction.channel, discord.Thread): return
         
         await interaction.response.send_message(f"⏳ **Rewinding to Turn {turn_id}...**", ephemeral=True)
-        deleted_turns, rewind_ts = self.memory_manager.trim_history(interaction.channel.id, turn_id)
+        deleted_turns, rewind_ts = await self.memory_manager.trim_history(interaction.channel.id, turn_id)
         
         if rewind_ts:
             await self.memory_manager.purge_memories(interaction.channel.id, rewind_ts, from_turn_id=turn_id)
@@ -259,7 +279,7 @@ class RPGAdventureCog(commands.Cog):
     @rpg_group.command(name="history", description="View turn history.")
     async def rpg_history(self, interaction: discord.Interaction):
         if not isinstance(interaction.channel, discord.Thread): return
-        session = rpg_sessions_collection.find_one({"thread_id": interaction.channel.id})
+        session = await async_rpg_sessions_collection.find_one({"thread_id": interaction.channel.id})
         history = session.get("turn_history", []) if session else []
         desc = ""
         for i in range(max(0, len(history) - 10), len(history)):
@@ -270,7 +290,7 @@ class RPGAdventureCog(commands.Cog):
     @rpg_group.command(name="mode", description="Switch Game Mode.")
     @app_commands.choices(mode=[app_commands.Choice(name="Standard", value="standard"), app_commands.Choice(name="Story", value="story")])
     async def rpg_mode(self, interaction: discord.Interaction, mode: str):
-        rpg_sessions_collection.update_one({"thread_id": interaction.channel.id}, {"$set": {"story_mode": (mode=="story")}})
+        await async_rpg_sessions_collection.update_one({"thread_id": interaction.channel.id}, {"$set": {"story_mode": (mode=="story")}})
         await interaction.response.send_message(f"Mode set to: **{mode.upper()}**")
 
     @rpg_group.command(name="uimode", description="Switch between button-based or text-based UI.")
@@ -282,7 +302,7 @@ class RPGAdventureCog(commands.Cog):
         if not isinstance(interaction.channel, discord.Thread):
             return await interaction.response.send_message("This command can only be used within an adventure thread.", ephemeral=True)
         
-        session = rpg_sessions_collection.find_one({"thread_id": interaction.channel.id})
+        session = await async_rpg_sessions_collection.find_one({"thread_id": interaction.channel.id})
         if not session:
             return await interaction.response.send_message("Could not find an active session for this thread.", ephemeral=True)
 
@@ -290,7 +310,7 @@ class RPGAdventureCog(commands.Cog):
         if interaction.user.id != session.get("owner_id"):
             return await interaction.response.send_message("Only the session owner (the one who started the game) can change the UI mode.", ephemeral=True)
 
-        rpg_sessions_collection.update_one(
+        await async_rpg_sessions_collection.update_one(
             {"thread_id": interaction.channel.id},
             {"$set": {"ui_mode": mode}}
         )
@@ -299,7 +319,7 @@ class RPGAdventureCog(commands.Cog):
     @rpg_group.command(name="web_new", description="Create an adventure via the Web Dashboard.")
     async def rpg_web_new(self, interaction: discord.Interaction):
         token = str(uuid.uuid4())
-        rpg_web_tokens_collection.insert_one({"token": token, "user_id": interaction.user.id, "guild_id": interaction.guild_id, "status": "pending", "created_at": datetime.utcnow()})
+        await async_rpg_web_tokens_collection.insert_one({"token": token, "user_id": interaction.user.id, "guild_id": interaction.guild_id, "status": "pending", "created_at": datetime.utcnow()})
         url = f"{WEB_DASHBOARD_URL}/rpg/setup?token={token}"
         embed = discord.Embed(title="🌐 Web Setup", description=f"[**Click Here**]({url})", color=discord.Color.blue())
         await interaction.response.send_message(embed=embed, ephemeral=True)
@@ -307,7 +327,7 @@ class RPGAdventureCog(commands.Cog):
     @rpg_group.command(name="personas", description="Manage your saved characters.")
     async def rpg_personas(self, interaction: discord.Interaction):
         token = str(uuid.uuid4())
-        rpg_web_tokens_collection.insert_one({"token": token, "user_id": interaction.user.id, "guild_id": interaction.guild_id, "status": "pending", "type": "persona_management", "created_at": datetime.utcnow()})
+        await async_rpg_web_tokens_collection.insert_one({"token": token, "user_id": interaction.user.id, "guild_id": interaction.guild_id, "status": "pending", "type": "persona_management", "created_at": datetime.utcnow()})
         url = f"{WEB_DASHBOARD_URL}/rpg/personas?token={token}"
         embed = discord.Embed(title="🎭 Persona Manager", description=f"[**Click Here**]({url})", color=discord.Color.purple())
         await interaction.response.send_message(embed=embed, ephemeral=True)
@@ -315,11 +335,11 @@ class RPGAdventureCog(commands.Cog):
     @rpg_group.command(name="end", description="End the adventure session.")
     async def rpg_end(self, interaction: discord.Interaction):
         if not isinstance(interaction.channel, discord.Thread): return
-        session = rpg_sessions_collection.find_one({"thread_id": interaction.channel.id})
+        session = await async_rpg_sessions_collection.find_one({"thread_id": interaction.channel.id})
         if not session: return
         
         if interaction.user.id == session.get("owner_id"): 
-            rpg_sessions_collection.update_one({"thread_id": interaction.channel.id}, {"$set": {"active": False}})
+            await async_rpg_sessions_collection.update_one({"thread_id": interaction.channel.id}, {"$set": {"active": False}})
             await interaction.channel.send("📕 **Adventure Archived.**")
             await interaction.channel.edit(locked=True, archived=True)
             await interaction.response.send_message("Session closed.", ephemeral=True)
@@ -331,7 +351,7 @@ class RPGAdventureCog(commands.Cog):
     async def on_message(self, message):
         if message.author.bot or not isinstance(message.channel, discord.Thread): return
         
-        session = rpg_sessions_collection.find_one({"thread_id": message.channel.id})
+        session = await async_rpg_sessions_collection.find_one({"thread_id": message.channel.id})
         if session and message.author.id in session.get("players", []):
             if not session.get("active", True): return
             
@@ -0,0 +1,149 @@
+# cogs/rpg_system/embedding_cache.py
+import asyncio
+import collections
+import hashlib
+import logging
+import time
+from datetime import datetime
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from utils.single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# Hits are collected and written back as last_used (the TTL field) at most this often
+TOUCH_FLUSH_SECONDS = 600
+
+class EmbeddingCache:
+    """
+    Content-addressed embedding cache: an in-process LRU in front of a Mongo tier, both keyed by
+    sha256(model + task type + text). Identical texts (rerolled prompts, chunks re-ingested by
+    sync_session) are embedded once; concurrent requests for the same key share one API call.
+    Entries expire 90 days after they were last used; hits refresh last_used in batches.
+    """
+    def __init__(self, collection, max_entries: int = 4096):
+        self.collection = collection
+        self.max_entries = max_entries
+        self._lru = collections.OrderedDict() # key -> vector (list of floats)
+        self._flights = SingleFlight()
+        self._touched = set() # keys hit since the last last_used flush
+        self._last_flush = time.monotonic()
+        self._flush_task = None
+        self.stats = {"memory_hits": 0, "db_hits": 0, "misses": 0}
+
+    @staticmethod
+    def make_key(model: str, task_type: str, text: str) -> str:
+        h = hashlib.sha256()
+        for part in (model, task_type, text):
+            h.update(part.encode("utf-8"))
+            h.update(b"\x00")
+        return h.hexdigest()
+
+    def _remember(self, key: str, vector: list):
+        self._lru[key] = vector
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+
+    async def get_or_embed(self, model: str, task_type: str, text: str, embed):
+        """
+        Returns the cached vector for (model, task_type, text), or awaits `embed(text)` and caches it.
+        A None result from `embed` (API failure) is passed through and never cached.
+        """
+        key = self.make_key(model, task_type, text)
+        vector = self._lru.get(key)
+        if vector is not None:
+            self._lru.move_to_end(key)
+            self.stats["memory_hits"] += 1
+            self._touch([key])
+            return vector
+        return await self._flights.run(key, lambda: self._fetch(key, model, task_type, text, embed))
+
+    async def _fetch(self, key: str, model: str, task_type: str, text: str, embed):
+        vector = await self._load(key)
+        if vector is not None:
+            self.stats["db_hits"] += 1
+            self._touch([key])
+        else:
+            self.stats["misses"] += 1
+            vector = await embed(text)
+            if vector: await self._save(key, model, task_type, vector)
+        if vector: self._remember(key, vector)
+        return vector
+
+    def _touch(self, keys):
+        """Queues keys for a last_used refresh; the write happens in the background, batched."""
+        self._touched.update(keys)
+        if time.monotonic() - self._last_flush >= TOUCH_FLUSH_SECONDS and (self._flush_task is None or self._flush_task.done()):
+            self._last_flush = time.monotonic()
+            self._flush_task = asyncio.create_task(self.flush_touches())
+
+    async def flush_touches(self):
+        keys, self._touched = list(self._touched), set()
+        now = datetime.utcnow()
+        for start in range(0, len(keys), 500):
+            try:
+                await self.collection.update_many({"_id": {"$in": keys[start:start + 500]}}, {"$set": {"last_used": now}})
+            except Exception as e:
+                logger.warning(f"Embedding cache last_used refresh failed: {e}")
+
+    async def lookup_many(self, model: str, task_type: str, texts: list) -> list:
+        """Batch read path for ingestion: one vector (or None) per text, one Mongo query for all LRU misses."""
+        keys = [self.make_key(model, task_type, t) for t in texts]
+        vectors = [self._lru.get(k) for k in keys]
+        self.stats["memory_hits"] += sum(v is not None for v in vectors)
+        self._touch([k for k, v in zip(keys, vectors) if v is not None])
+
+        missing = list({k for k, v in zip(keys, vectors) if v is None})
+        found = {}
+        for start in range(0, len(missing), 500):
+            try:
+                async for doc in self.collection.find({"_id": {"$in": missing[start:start + 500]}}, {"vector": 1}):
+                    found[doc["_id"]] = doc["vector"]
+            except Exception as e:
+                logger.warning(f"Embedding cache batch read failed: {e}")
+                break
+
+        for i, k in enumerate(keys):
+            if vectors[i] is None and k in found:
+                vectors[i] = found[k]
+                self._remember(k, found[k])
+                self._touch([k])
+                self.stats["db_hits"] += 1
+        self.stats["misses"] += sum(v is None for v in vectors)
+        return vectors
+
+    async def store_many(self, model: str, task_type: str, pairs: list):
+        """pairs: [(text, vector)] freshly embedded by a batch call."""
+        docs, now = {}, datetime.utcnow()
+        for text, vector in pairs:
+            if not vector: continue
+            key = self.make_key(model, task_type, text)
+            self._remember(key, vector)
+            docs[key] = {"_id": key, "model": model, "task_type": task_type, "vector": vector, "created_at": now, "last_used": now}
+        if not docs: return
+        try:
+            await self.collection.insert_many(list(docs.values()), ordered=False)
+        except BulkWriteError:
+            pass # Duplicates from a concurrent writer; everything else was inserted
+        except Exception as e:
+            logger.warning(f"Embedding cache batch write failed: {e}")
+
+    async def _load(self, key: str):
+        try:
+            doc = await self.collection.find_one({"_id": key}, {"vector": 1})
+        except Exception as e:
+            logger.warning(f"Embedding cache read failed: {e}")
+            return None
+        return doc["vector"] if doc else None
+
+    async def _save(self, key: str, model: str, task_type: str, vector: list):
+        try:
+            now = datetime.utcnow()
+            await self.collection.insert_one({
+                "_id": key, "model": model, "task_type": task_type,
+                "vector": vector, "created_at": now, "last_used": now
+            })
+        except DuplicateKeyError:
+            pass # Another process cached the same text first
+        except Exception as e:
+            logger.warning(f"Embedding cache write failed: {e}")
@@ -3,19 +3,26 @@ import discord
 import asyncio
 import random
 import traceback
+import time
+import os
 import re  # <--- NEW IMPORT
 from datetime import datetime, timezone
 import google.generativeai as genai
 from utils.db import (
-    rpg_sessions_collection, rpg_world_state_collection, 
-    ai_config_collection, rpg_vector_memory_collection
+    async_rpg_sessions_collection
 )
+from utils.config_cache import get_guild_config
+from utils import world_store
+from utils.limiter import limiter, PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND
 
 from .config import RPG_CLASSES
 from . import prompts, tools
-from .utils import RPGLogger, StatusManager, sanitize_age
+from .utils import RPGLogger, StatusManager, NarrativeStreamer, sanitize_age
 from .ui import RPGGameView, DynamicActionView
 
+# Show the narrative while it is being generated (set to "0" to wait for the full response)
+RPG_STREAM_NARRATIVE = os.environ.get("RPG_STREAM_NARRATIVE", "1") != "0"
+
 class RPGEngine:
     def __init__(self, bot, model, memory_manager, scribe_model):
         self.bot = bot
@@ -51,7 +58,8 @@ class RPGEngine:
         
         system_prime = prompts.SYSTEM_PRIME.format(memory_block=memory_block)
         try:
-            await chat_session.send_message_async(system_prime)
+            async with limiter.slot(chat_session, PRIORITY_INTERACTIVE):
+                await chat_session.send_message_async(system_prime)
             RPGLogger.log(channel_id, "system", "System Prime Accepted.")
         except Exception as e:
             RPGLogger.log(channel_id, "error", f"System Prime Failed: {e}")
@@ -68,12 +76,13 @@ class RPGEngine:
     async def process_turn(self, channel, prompt, user=None, is_reroll=False, message_id=None):
         if not self.model: return await channel.send("⚠️ RPG System Offline.")
         
-        session_db = rpg_sessions_collection.find_one({"thread_id": channel.id})
+        session_db = await async_rpg_sessions_collection.find_one({"thread_id": channel.id})
         if not session_db: return
 
         # --- 1. INITIALIZE STATUS MANAGER ---
         processing_msg = await channel.send("🧠 **Reading Campaign History...**")
         status = StatusManager(processing_msg)
+        streamer = NarrativeStreamer(channel, "The Dungeon Master", self.bot.user.avatar.url) if RPG_STREAM_NARRATIVE else None
 
         try:
             await RPGLogger.broadcast(channel.id, "START_TURN", "Processing User Input", {"input": prompt})
@@ -93,7 +102,7 @@ class RPGEngine:
             current_turn_id = session_db.get("total_turns", 0) + 1
 
             # --- 2. CONSTRUCT HUD (State Injection) ---
-            world_data = rpg_world_state_collection.find_one({"thread_id": channel.id}) or {}
+            world_data = await world_store.load_world(channel.id, categories=("locations", "quests"))
             
             players = session_db.get("player_stats", {})
             p_data = list(players.values())[0] if players else {}
@@ -167,7 +176,7 @@ class RPGEngine:
             await RPGLogger.broadcast(channel.id, "PROMPTING", "Sending Prompt to Model", {"length": len(full_prompt)})
 
             async with channel.typing():
-                response = await self._safe_generate(chat_session, full_prompt)
+                response = await self._safe_generate(chat_session, full_prompt, streamer)
                 
                 turns = 0
                 text_content = ""
@@ -192,7 +201,7 @@ class RPGEngine:
                         parts=[genai.protos.Part(function_response=genai.protos.FunctionResponse(
                             name=fn.name, response={'result': res_txt}
                         ))]
-                    ))
+                    ), streamer)
 
                 # --- 5. TEXT EXTRACTION ---
                 try:
@@ -201,9 +210,10 @@ class RPGEngine:
                     await status.set("⚠️ Model Error. Retrying...")
                     await RPGLogger.broadcast(channel.id, "WARN", "Model failed to output text. Forcing summary.")
                     try:
-                        fallback_resp = await chat_session.send_message_async(
-                            "SYSTEM: Tool execution finished. You MUST now provide the narrative description. Do not call any more tools."
-                        )
+                        async with limiter.slot(chat_session, PRIORITY_INTERACTIVE):
+                            fallback_resp = await chat_session.send_message_async(
+                                "SYSTEM: Tool execution finished. You MUST now provide the narrative description. Do not call any more tools."
+                            )
                         text_content = fallback_resp.text
                     except Exception as e:
                         text_content = f"**[System]** Critical Error: {str(e)}"
@@ -216,6 +226,7 @@ class RPGEngine:
 
                 # Remove thinking msg
                 await status.delete()
+                if streamer: await streamer.close()
 
                 # Extract proposed actions from the response, if any
                 proposed_actions = []
@@ -226,10 +237,11 @@ class RPGEngine:
 
                 bot_msg_ids = await self._send_narrative(
                     channel, text_content, chat_session, current_turn_id,
-                    proposed_actions=proposed_actions, user=user
+                    proposed_actions=proposed_actions, user=user,
+                    stream_messages=streamer.messages if streamer else None
                 )
 
-                self.memory_manager.save_turn(
+                await self.memory_manager.save_turn(
                     channel.id, user.name if user else "System", prompt, text_content, 
                     user_message_id=message_id, bot_message_id=bot_msg_ids, current_turn_id=current_turn_id
                 )
@@ -245,6 +257,7 @@ class RPGEngine:
 
         except Exception as e:
             await status.delete()
+            if streamer: await streamer.discard()
             RPGLogger.log(channel.id, "error", f"CRITICAL ERROR: {e}", details={"trace": traceback.format_exc()})
             await channel.send(f"⚠️ **Game Error:** {e}")
 
@@ -282,15 +295,30 @@ class RPGEngine:
 
             total_count = len(reconstructed_turns)
             await status_msg.edit(content=f"🔄 **Syncing...** [2/4] 🧩 Reconstructed {total_count} turns. Archiving...")
-            rpg_sessions_collection.update_one({"thread_id": channel.id}, {"$set": {"turn_history": reconstructed_turns, "total_turns": total_count}})
+            await async_rpg_sessions_collection.update_one({"thread_id": channel.id}, {"$set": {"turn_history": reconstructed_turns, "total_turns": total_count}})
             cleaned_history = []
             for t in reconstructed_turns:
                 cleaned_history.append({"author": t['user_name'], "content": t['input'], "timestamp": t['timestamp'], "turn_id": t['turn_id']})
                 cleaned_history.append({"author": "DM", "content": t['output'], "timestamp": t['timestamp'], "turn_id": t['turn_id']})
             await self.memory_manager.clear_thread_vectors(channel.id)
-            await self.memory_manager.batch_ingest_history(channel.id, cleaned_history)
+            # Turn ids were just renumbered; old snapshots no longer line up with them
+            await self.memory_manager.snapshots.truncate(channel.id, 0)
+
+            last_edit = 0.0
+            async def ingest_progress(done, total, rate):
+                nonlocal last_edit
+                # Status edits are rate limited by Discord; one every 2s is plenty
+                if done < total and time.monotonic() - last_edit < 2.0: return
+                last_edit = time.monotonic()
+                try: await status_msg.edit(content=f"🔄 **Syncing...** [2/4] 🗂️ Embedding memories {done}/{total} ({rate:.1f} chunks/sec)...")
+                except discord.HTTPException: pass
+
+            ingest_start = time.monotonic()
+            ingested = await self.memory_manager.batch_ingest_history(channel.id, cleaned_history, on_progress=ingest_progress)
+            ingest_rate = ingested / max(time.monotonic() - ingest_start, 1e-6)
+            RPGLogger.log(channel.id, "info", f"SYNC: Indexed {ingested} memory chunks at {ingest_rate:.1f} chunks/sec.")
             
-            await status_msg.edit(content=f"🔄 **Syncing...** [3/4] 🧠 Populating NPC Memories...")
+            await status_msg.edit(content=f"🔄 **Syncing...** [3/4] 🧠 Populating NPC Memories... (indexed {ingested} memories at {ingest_rate:.1f} chunks/sec)")
             # New Step: Backfill NPC memories using the Scribe
             for turn in reconstructed_turns:
                 # We only need to analyze the bot's narrative output for events
@@ -319,12 +347,23 @@ class RPGEngine:
             RPGLogger.log(channel.id, "error", f"SYNC ERROR: {e}")
             raise e
 
-    async def _safe_generate(self, session, content):
+    async def _safe_generate(self, session, content, streamer=None):
         max_retries = 2
         for attempt in range(max_retries + 1):
             try:
-                if attempt == 0: return await session.send_message_async(content)
-                return await session.send_message_async("SYSTEM: Previous call MALFORMED. Retry.")
+                payload = content if attempt == 0 else "SYSTEM: Previous call MALFORMED. Retry."
+                async with limiter.slot(session, PRIORITY_INTERACTIVE):
+                    if not streamer: return await session.send_message_async(payload)
+                    # Stream so players see the narrative as it is written; the response
+                    # object is complete (parts, function calls) once iteration finishes
+                    streamer.reset()
+                    response = await session.send_message_async(payload, stream=True)
+                    text = ""
+                    async for chunk in response:
+                        try: text += chunk.text
+                        except ValueError: continue # Function-call chunk
+                        streamer.update(text)
+                    return response
             except Exception as e:
                 if "MALFORMED" in str(e) and attempt < max_retries: continue
                 raise e
@@ -370,7 +409,7 @@ class RPGEngine:
         except Exception as e:
             return f"Tool Error: {e}"
 
-    async def _send_narrative(self, channel, text, session, turn_id, proposed_actions=None, user=None):
+    async def _send_narrative(self, channel, text, session, turn_id, proposed_actions=None, user=None, stream_messages=None):
         # --- CLEANUP: REMOVE EXCESSIVE BREAKS ---
         # Replace 3 or more newlines with 2 (Standard Paragraph spacing)
         clean_text = re.sub(r'\n{3,}', '\n\n', text)
@@ -388,7 +427,7 @@ class RPGEngine:
             # Determine which view to use
             view_to_send = None
             if is_last:
-                session_db = rpg_sessions_collection.find_one({"thread_id": channel.id})
+                session_db = await async_rpg_sessions_collection.find_one({"thread_id": channel.id}, {"ui_mode": 1}) or {}
                 ui_mode = session_db.get("ui_mode", "buttons") # Default to buttons if not set
 
                 if ui_mode == "buttons" and proposed_actions and user:
@@ -402,7 +441,12 @@ class RPGEngine:
             if is_last:
                 embed.set_footer(text=footer)
             
-            msg = await channel.send(embed=embed, view=view_to_send)
+            # Messages already showing the streamed text become the final ones
+            if stream_messages and i < len(stream_messages):
+                msg = stream_messages[i]
+                await msg.edit(embed=embed, view=view_to_send)
+            else:
+                msg = await channel.send(embed=embed, view=view_to_send)
             
             # If we sent an action view, we need to give it a reference to the message
             # so it can disable the buttons on timeout.
@@ -410,6 +454,10 @@ class RPGEngine:
                 view_to_send.message = msg
 
             msg_ids.append(msg.id)
+
+        for extra in (stream_messages or [])[len(chunks):]:
+            try: await extra.delete()
+            except: pass
         return msg_ids
 
     async def _run_scribe(self, thread_id, text, active_npcs=None):
@@ -418,8 +466,7 @@ class RPGEngine:
             
         async with self.scribe_locks[thread_id]:
             try:
-                world_data = rpg_world_state_collection.find_one({"thread_id": int(thread_id)}) or {}
-                existing = list(world_data.get("npcs", {}).keys()) + list(world_data.get("locations", {}).keys())
+                existing = await world_store.entity_keys(thread_id, ("npcs", "locations"))
                 known_str = ", ".join(existing) if existing else "None."
                 
                 active_str = ", ".join(active_npcs) if active_npcs else "Unknown (Infer from text)"
@@ -431,7 +478,8 @@ class RPGEngine:
                     active_participants=active_str
                 )
                 
-                response = await scribe_chat.send_message_async(prompt)
+                async with limiter.slot(scribe_chat, PRIORITY_BACKGROUND):
+                    response = await scribe_chat.send_message_async(prompt)
                 
                 if response.parts:
                     for part in response.parts:
@@ -462,7 +510,7 @@ class RPGEngine:
             owner = manual_user
             respond = None
         
-        config = ai_config_collection.find_one({"_id": str(guild_id)})
+        config = await get_guild_config(guild_id)
         if not config:
             if respond: await respond("Configuration not found for this guild.")
             return
@@ -476,7 +524,8 @@ class RPGEngine:
         else:
             try:
                 prompt = prompts.TITLE_GENERATION.format(scenario=scenario_name, lore=lore[:100])
-                resp = await self.model.generate_content_async(prompt)
+                async with limiter.slot(self.model, PRIORITY_INTERACTIVE):
+                    resp = await self.model.generate_content_async(prompt)
                 title = resp.text.strip().replace('"', '')[:50]
             except: title = f"Quest: {owner.name}"
 
@@ -494,7 +543,8 @@ class RPGEngine:
             "delete_requested": False, "story_mode": story_mode,
             "total_turns": 0 
         }
-        rpg_sessions_collection.insert_one(session_data)
+        await async_rpg_sessions_collection.insert_one(session_data)
+        await world_store.enable_for_new_thread(thread.id)
         
         if respond: await respond(f"✅ Adventure **{title}** created! Check {thread.mention}")
         else: await channel.send(f"⚔️ **New Web-Created Adventure:** {owner.mention} begins **{title}**! -> {thread.mention}")
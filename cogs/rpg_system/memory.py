@@ -1,18 +1,28 @@
 # cogs/rpg_system/memory.py
 import discord
 from datetime import datetime, timezone
-import math
 import asyncio
 import re
+import time
 from utils.db import (
-    rpg_sessions_collection, 
-    rpg_vector_memory_collection, 
-    rpg_world_state_collection,
-    rpg_inventory_collection
+    async_rpg_sessions_collection, 
+    async_rpg_vector_memory_collection, 
+    async_rpg_embedding_cache_collection,
+    async_rpg_world_snapshots_collection,
+    async_rpg_world_state_collection,
+    async_rpg_inventory_collection
 )
 from utils.timezone_manager import get_local_time
+from utils import world_store
 import google.generativeai as genai
 from . import prompts
+from .vector_index import VectorMemoryStore
+from .embedding_cache import EmbeddingCache
+from .snapshots import WorldSnapshotStore
+
+# Bulk ingestion (sync_session / batch_ingest_history): texts per embedding request, requests in flight
+EMBED_BATCH_SIZE = 50
+EMBED_CONCURRENCY = 4
 
 class RPGContextManager:
     def __init__(self, model):
@@ -21,19 +31,22 @@ class RPGContextManager:
         self.embed_model = "models/text-embedding-004" 
         # Smart Context Budget (Approx 2000-2500 tokens allowed for history)
         self.HISTORY_TOKEN_BUDGET = 2500
-
-    def _cosine_similarity(self, v1, v2):
-        dot_product = sum(a * b for a, b in zip(v1, v2))
-        magnitude1 = math.sqrt(sum(a * a for a in v1))
-        magnitude2 = math.sqrt(sum(b * b for b in v2))
-        if magnitude1 == 0 or magnitude2 == 0: return 0.0
-        return dot_product / (magnitude1 * magnitude2)
+        # In-memory float32 matrices per thread, kept in step with rpg_vector_memory
+        self.vector_store = VectorMemoryStore(async_rpg_vector_memory_collection)
+        self.embedding_cache = EmbeddingCache(async_rpg_embedding_cache_collection)
+        # Turn-by-turn world history (checkpoints + deltas) used by rerolls and /rpg trim
+        self.snapshots = WorldSnapshotStore(async_rpg_world_snapshots_collection)
 
     async def _get_embedding(self, text):
+        clean_text = str(text)[:9000]
+        return await self.embedding_cache.get_or_embed(
+            self.embed_model, "retrieval_document", clean_text, self._embed_remote
+        )
+
+    async def _embed_remote(self, clean_text):
         max_retries = 3
         for attempt in range(max_retries):
             try:
-                clean_text = str(text)[:9000] 
                 result = await genai.embed_content_async(
                     model=self.embed_model,
                     content=clean_text,
@@ -48,6 +61,58 @@ class RPGContextManager:
                     return None
         return None
 
+    async def _embed_remote_batch(self, clean_texts):
+        """One batched embedding request; transient errors are retried, anything else yields all-None."""
+        for attempt in range(3):
+            try:
+                result = await genai.embed_content_async(
+                    model=self.embed_model,
+                    content=clean_texts,
+                    task_type="retrieval_document"
+                )
+                vectors = result['embedding']
+                if len(vectors) == len(clean_texts): return vectors
+                break
+            except Exception as e:
+                err_str = str(e)
+                if "504" in err_str or "Deadline" in err_str or "503" in err_str or "429" in err_str:
+                    await asyncio.sleep(2 * (attempt + 1))
+                else:
+                    break
+        return [None] * len(clean_texts)
+
+    async def embed_many(self, texts, on_progress=None):
+        """
+        Embeds many texts with batched requests and bounded concurrency. Cached texts are skipped;
+        items that fail inside a batch are retried one by one. Returns a vector (or None) per text.
+        on_progress(done, total) is awaited after each batch.
+        """
+        clean = [str(t)[:9000] for t in texts]
+        vectors = await self.embedding_cache.lookup_many(self.embed_model, "retrieval_document", clean)
+        missing = [i for i, v in enumerate(vectors) if v is None]
+        done = len(clean) - len(missing)
+        if on_progress: await on_progress(done, len(clean))
+
+        semaphore = asyncio.Semaphore(EMBED_CONCURRENCY)
+        async def run_batch(indices):
+            nonlocal done
+            async with semaphore:
+                batch = [clean[i] for i in indices]
+                results = await self._embed_remote_batch(batch)
+                failed = [j for j, v in enumerate(results) if not v]
+                if failed:
+                    retried = await asyncio.gather(*(self._embed_remote(batch[j]) for j in failed))
+                    for j, v in zip(failed, retried): results[j] = v
+                await self.embedding_cache.store_many(self.embed_model, "retrieval_document", list(zip(batch, results)))
+            for i, v in zip(indices, results): vectors[i] = v
+            done += len(indices)
+            if on_progress: await on_progress(done, len(clean))
+
+        await asyncio.gather(*(
+            run_batch(missing[k:k + EMBED_BATCH_SIZE]) for k in range(0, len(missing), EMBED_BATCH_SIZE)
+        ))
+        return vectors
+
     async def store_memory(self, thread_id, text, metadata=None):
         vector = await self._get_embedding(text)
         if not vector: return
@@ -58,10 +123,12 @@ class RPGContextManager:
             "timestamp": datetime.utcnow(),
             "metadata": metadata or {}
         }
-        rpg_vector_memory_collection.insert_one(doc)
+        await async_rpg_vector_memory_collection.insert_one(doc)
+        self.vector_store.add(thread_id, [doc])
 
     async def clear_thread_vectors(self, thread_id):
-        rpg_vector_memory_collection.delete_many({"thread_id": int(thread_id)})
+        await async_rpg_vector_memory_collection.delete_many({"thread_id": int(thread_id)})
+        self.vector_store.drop(thread_id)
 
     async def purge_memories(self, thread_id, cutoff_timestamp, from_turn_id=None):
         query = {"thread_id": int(thread_id)}
@@ -77,15 +144,20 @@ class RPGContextManager:
 
         if conditions:
             query["$or"] = conditions
-            rpg_vector_memory_collection.delete_many(query)
+            await async_rpg_vector_memory_collection.delete_many(query)
+            self.vector_store.purge(thread_id, cutoff_timestamp, from_turn_id)
 
     async def purge_memories_since(self, thread_id, cutoff_timestamp):
         await self.purge_memories(thread_id, cutoff_timestamp)
 
-    async def batch_ingest_history(self, thread_id, messages):
+    async def batch_ingest_history(self, thread_id, messages, on_progress=None):
+        """
+        Embeds the history in 5-message chunks and writes them with one insert_many.
+        on_progress(done, total, chunks_per_sec) is awaited as embedding batches complete.
+        """
         chunk_size = 5
         chunks = [messages[i:i + chunk_size] for i in range(0, len(messages), chunk_size)]
-        count = 0
+        texts, metadatas = [], []
         for chunk in chunks:
             chunk_text = ""
             max_turn = 0
@@ -93,34 +165,38 @@ class RPGContextManager:
                 chunk_text += f"[{msg['author']}]: {msg['content']}\n"
                 if msg.get('turn_id', 0) > max_turn:
                     max_turn = msg.get('turn_id')
-
-            await self.store_memory(
-                thread_id, 
-                chunk_text, 
-                metadata={
-                    "type": "historical_sync", 
-                    "date": str(chunk[0].get('timestamp')), 
-                    "max_turn_id": max_turn
-                }
-            )
-            count += 1
-        return count
+            texts.append(chunk_text)
+            metadatas.append({
+                "type": "historical_sync", 
+                "date": str(chunk[0].get('timestamp')), 
+                "max_turn_id": max_turn
+            })
+
+        started = time.monotonic()
+        async def report(done, total):
+            if on_progress:
+                elapsed = max(time.monotonic() - started, 1e-6)
+                await on_progress(done, total, done / elapsed)
+
+        vectors = await self.embed_many(texts, on_progress=report)
+        now = datetime.utcnow()
+        docs = [
+            {"thread_id": int(thread_id), "text": text, "vector": vector, "timestamp": now, "metadata": metadata}
+            for text, vector, metadata in zip(texts, vectors, metadatas) if vector
+        ]
+        if docs:
+            await async_rpg_vector_memory_collection.insert_many(docs)
+            self.vector_store.add(thread_id, docs)
+        return len(docs)
 
     async def retrieve_relevant_memories(self, thread_id, query_text, limit=5, threshold=0.60):
         query_vector = await self._get_embedding(query_text)
         if not query_vector: return []
 
-        candidates = list(rpg_vector_memory_collection.find({"thread_id": int(thread_id)}))
-        results = []
-        for mem in candidates:
-            score = self._cosine_similarity(query_vector, mem['vector'])
-            if score >= threshold:
-                results.append((score, mem['text']))
-        
-        results.sort(key=lambda x: x[0], reverse=True)
-        return [r[1] for r in results[:limit]]
+        index = await self.vector_store.get(thread_id)
+        return [text for _, text in index.search(query_vector, limit, threshold)]
 
-    def save_turn(self, thread_id, user_name, user_input, ai_output, user_message_id=None, bot_message_id=None, current_turn_id=None):
+    async def save_turn(self, thread_id, user_name, user_input, ai_output, user_message_id=None, bot_message_id=None, current_turn_id=None):
         entry = {
             "timestamp": datetime.utcnow(),
             "user_name": user_name,
@@ -135,48 +211,50 @@ class RPGContextManager:
         if current_turn_id is not None:
              update_op["$set"] = {"total_turns": current_turn_id}
 
-        rpg_sessions_collection.update_one(
+        await async_rpg_sessions_collection.update_one(
             {"thread_id": int(thread_id)},
             update_op
         )
 
     async def snapshot_world_state(self, thread_id, turn_id):
-        world_data = rpg_world_state_collection.find_one({"thread_id": int(thread_id)})
-        snapshot = {k: v for k, v in world_data.items() if k != "_id"} if world_data else {}
+        world_data = await world_store.load_world(thread_id)
+        snapshot = {k: v for k, v in world_data.items() if k not in ("_id", "entity_store")} if world_data else {}
         
-        session = rpg_sessions_collection.find_one({"thread_id": int(thread_id)})
+        session = await async_rpg_sessions_collection.find_one({"thread_id": int(thread_id)}, {"players": 1})
         inventory_snapshot = {}
-        if session:
-            for player_id in session.get("players", []):
-                inv = rpg_inventory_collection.find_one({"user_id": player_id})
-                if inv:
-                    inventory_snapshot[str(player_id)] = inv.get("items", [])
+        if session and session.get("players"):
+            async for inv in async_rpg_inventory_collection.find({"user_id": {"$in": session["players"]}}):
+                inventory_snapshot[str(inv["user_id"])] = inv.get("items", [])
 
         snapshot["_inventory_backup"] = inventory_snapshot
 
-        rpg_sessions_collection.update_one(
-            {"thread_id": int(thread_id), "turn_history.turn_id": turn_id},
-            {"$set": {"turn_history.$.world_snapshot": snapshot}}
-        )
-
-    def restore_world_state(self, thread_id, snapshot):
+        await self.snapshots.record(thread_id, turn_id, snapshot)
+
+    async def _restore_turn_state(self, thread_id, turn):
+        """Rewinds the world to the end of `turn`. Returns False when no snapshot exists for it."""
+        # Sessions from before rpg_world_snapshots embed the snapshot in turn_history
+        if "world_snapshot" in turn:
+            await self.restore_world_state(thread_id, turn["world_snapshot"])
+            return True
+        if turn.get("turn_id") is None: return False
+        state = await self.snapshots.state_at(thread_id, turn["turn_id"])
+        if state is None: return False
+        await self.restore_world_state(thread_id, state)
+        return True
+
+    async def restore_world_state(self, thread_id, snapshot):
         if not snapshot: return
 
         inventory_data = snapshot.pop("_inventory_backup", None)
         if inventory_data:
             for user_id_str, items in inventory_data.items():
-                rpg_inventory_collection.update_one(
+                await async_rpg_inventory_collection.update_one(
                     {"user_id": int(user_id_str)},
                     {"$set": {"items": items}},
                     upsert=True
                 )
 
-        snapshot["thread_id"] = int(thread_id)
-        rpg_world_state_collection.replace_one(
-            {"thread_id": int(thread_id)},
-            snapshot,
-            upsert=True
-        )
+        await world_store.replace_world(thread_id, snapshot)
 
     async def archive_old_turns(self, thread_id, session_data):
         history = session_data.get("turn_history", [])
@@ -198,14 +276,22 @@ class RPGContextManager:
                     "max_turn_id": max_turn
                 }
             )
-            rpg_sessions_collection.update_one(
+            await async_rpg_sessions_collection.update_one(
                 {"thread_id": int(thread_id)},
                 {"$set": {"turn_history": remaining}}
             )
+            if remaining and remaining[0].get('turn_id'):
+                await self.snapshots.prune_before(thread_id, remaining[0]['turn_id'])
 
-    def _format_player_profiles(self, session_data):
+    async def _format_player_profiles(self, session_data):
         profiles = session_data.get("player_stats", {})
         output = []
+        inventories = {}
+        if profiles:
+            user_ids = [int(uid) for uid in profiles.keys()]
+            async for inv in async_rpg_inventory_collection.find({"user_id": {"$in": user_ids}}, {"user_id": 1, "items": 1}):
+                inventories[inv["user_id"]] = inv
+
         for user_id, stats in profiles.items():
             name = stats.get("name", "Unknown Hero")
             p_class = stats.get("class", "Freelancer")
@@ -214,7 +300,7 @@ class RPGContextManager:
             appearance = stats.get("appearance", "Standard adventurer gear.")
             personality = stats.get("personality", "Determined.")
             
-            inv_data = rpg_inventory_collection.find_one({"user_id": int(user_id)})
+            inv_data = inventories.get(int(user_id))
             items = [i['name'] for i in inv_data.get('items', [])] if inv_data else ["Empty"]
             item_str = ", ".join(items[:12]) 
             if len(items) > 12: item_str += f" (+{len(items)-12} more)"
@@ -230,9 +316,15 @@ class RPGContextManager:
             output.append(profile_txt)
         return "\n".join(output)
 
-    def _format_world_sheet(self, thread_id, current_input=""):
-        data = rpg_world_state_collection.find_one({"thread_id": int(thread_id)})
+    async def _format_world_sheet(self, thread_id, current_input=""):
+        data = await async_rpg_world_state_collection.find_one({"thread_id": int(thread_id)})
         if not data: return "**System:** No world data established.", {}
+
+        if data.get("entity_store"):
+            locations, quests, npcs, events = await self._query_sheet_entities(thread_id, current_input)
+        else:
+            locations, quests, npcs = data.get("locations", {}), data.get("quests", {}), data.get("npcs", {})
+            events = data.get("events", {})
         
         debug_snapshot = {"active_quests": [], "active_locs": [], "active_npcs": [], "recalled_npcs": []}
 
@@ -250,7 +342,6 @@ class RPGContextManager:
             log_text = "**📝 PENDING ACTIONS / ORDERS:**\n" + "".join([f"> 📌 {l['note']}\n" for l in active_logs]) + "\n"
 
         # 2. LOCATIONS
-        locations = data.get("locations", {})
         active_loc_objs = [v for v in locations.values() if v.get("status") == "active"]
         active_loc_names = [l['name'].lower().strip() for l in active_loc_objs]
         
@@ -263,13 +354,11 @@ class RPGContextManager:
         debug_snapshot["active_locs"] = [l['name'] for l in active_loc_objs]
 
         # 3. QUESTS
-        quests = data.get("quests", {})
         active_quests = [v for v in quests.values() if v.get("status") == "active"]
         quest_text = "**🛡️ ACTIVE QUESTS:**\n" + "".join([f"> 🔸 **{q['name']}**: {q['details']}\n" for q in active_quests]) if active_quests else ""
         debug_snapshot["active_quests"] = [q['name'] for q in active_quests]
 
         # 4. NPC REGISTRY (OPTIMIZED WITH AUTO-CULL)
-        npcs = data.get("npcs", {})
         visible_npcs = []
         input_lower = current_input.lower()
 
@@ -344,12 +433,35 @@ class RPGContextManager:
         npc_text = "**👥 NPC REGISTRY (NEARBY / ACTIVE):**\n" + "\n".join(npc_list) if npc_list else "**👥 NPC REGISTRY:** No one relevant nearby."
 
         # 5. EVENTS
-        events = data.get("events", {})
         event_list = list(events.values())[-5:] 
         event_text = "**📅 KEY EVENTS (MEMORY):**\n" + "".join([f"> 🔹 {e['name']}: {e['details']}\n" for e in event_list]) if event_list else ""
 
         return f"{env_text}{log_text}{quest_text}\n{loc_text}\n{npc_text}\n{event_text}", debug_snapshot
 
+    async def _query_sheet_entities(self, thread_id, current_input):
+        """
+        Entity-store threads: fetch only what the world sheet can show (active locations/quests,
+        NPCs that are active, companions, present or mentioned, and the last 5 events).
+        """
+        tid = int(thread_id)
+        locations = await world_store.find_entities(tid, "location", {"status": "active"})
+        quests = await world_store.find_entities(tid, "quest", {"status": "active"})
+        active_loc_names = [l['name'].lower().strip() for l in locations]
+
+        input_lower = current_input.lower()
+        names = await world_store.find_entities(tid, "npc", projection={"name": 1})
+        mentioned = [n['name'] for n in names if n.get('name') and n['name'].lower() in input_lower]
+        npcs = await world_store.find_entities(tid, "npc", {"$or": [
+            {"status_key": {"$ne": "dead"}, "$or": [
+                {"status_key": "active"}, {"is_companion": True}, {"loc_key": {"$in": active_loc_names}}
+            ]},
+            {"name": {"$in": mentioned}},
+        ]})
+        events = await world_store.find_entities(tid, "event", sort=[("_id", -1)], limit=5)
+
+        def keyed(entities): return {e['name']: e for e in entities}
+        return keyed(locations), keyed(quests), keyed(npcs), keyed(reversed(events))
+
     async def build_context_block(self, session_data, current_user_input, logger=None):
         thread_id = session_data['thread_id']
         owner_id = session_data.get('owner_id')
@@ -358,8 +470,8 @@ class RPGContextManager:
         if logger: logger(thread_id, "system", "Building Memory Context...")
 
         lore = session_data.get("lore", "Standard Fantasy Setting")
-        player_context = self._format_player_profiles(session_data)
-        world_sheet, world_debug = self._format_world_sheet(thread_id, current_user_input)
+        player_context = await self._format_player_profiles(session_data)
+        world_sheet, world_debug = await self._format_world_sheet(thread_id, current_user_input)
         
         # --- SMART CONTEXT PRUNING (Token Budgeting) ---
         history = session_data.get("turn_history", [])
@@ -424,33 +536,31 @@ class RPGContextManager:
             return f"🧠 Mem: {used:,} ({percent:.1f}%){turn_str}"
         except: return "🧠 Mem: Calc Error"
         
-    def delete_last_turn(self, thread_id):
-        session = rpg_sessions_collection.find_one({"thread_id": int(thread_id)})
+    async def delete_last_turn(self, thread_id):
+        session = await async_rpg_sessions_collection.find_one({"thread_id": int(thread_id)})
         if not session or "turn_history" not in session: return None
         history = session["turn_history"]
         if not history: return None
         
         deleted_turn = history.pop()
         
-        rpg_sessions_collection.update_one({"thread_id": int(thread_id)}, {
+        await async_rpg_sessions_collection.update_one({"thread_id": int(thread_id)}, {
             "$pop": {"turn_history": 1},
             "$inc": {"total_turns": -1}
         })
         
         new_last_turn = history[-1] if history else None
+        await self.snapshots.truncate(thread_id, new_last_turn.get("turn_id", 0) if new_last_turn else 0)
         
-        if new_last_turn and "world_snapshot" in new_last_turn:
-            self.restore_world_state(thread_id, new_last_turn["world_snapshot"])
-        elif not new_last_turn:
-             rpg_world_state_collection.update_one(
-                 {"thread_id": int(thread_id)},
-                 {"$set": {"quests": {}, "npcs": {}, "locations": {}, "events": {}, "environment": {}}}
-             )
+        if new_last_turn:
+            await self._restore_turn_state(thread_id, new_last_turn)
+        else:
+            await world_store.reset_entities(thread_id)
         
         return deleted_turn
 
-    def trim_history(self, thread_id, target_turn_id):
-        session = rpg_sessions_collection.find_one({"thread_id": int(thread_id)})
+    async def trim_history(self, thread_id, target_turn_id):
+        session = await async_rpg_sessions_collection.find_one({"thread_id": int(thread_id)})
         if not session or "turn_history" not in session: return [], None
         full_history = session["turn_history"]
         
@@ -468,17 +578,16 @@ class RPGContextManager:
         
         rewind_timestamp = last_kept_turn["timestamp"] if last_kept_turn else datetime.min
         
-        rpg_sessions_collection.update_one(
+        await async_rpg_sessions_collection.update_one(
             {"thread_id": int(thread_id)}, 
             {"$set": {"turn_history": new_history, "total_turns": target_turn_id}}
         )
 
-        if last_kept_turn and "world_snapshot" in last_kept_turn:
-            self.restore_world_state(thread_id, last_kept_turn["world_snapshot"])
-        elif not last_kept_turn:
-            rpg_world_state_collection.update_one(
-                 {"thread_id": int(thread_id)},
-                 {"$set": {"quests": {}, "npcs": {}, "locations": {}, "events": {}, "environment": {}}}
-             )
+        await self.snapshots.truncate(thread_id, target_turn_id)
+
+        if last_kept_turn:
+            await self._restore_turn_state(thread_id, last_kept_turn)
+        else:
+            await world_store.reset_entities(thread_id)
         
         return deleted_turns, rewind_timestamp
\ No newline at end of file
@@ -0,0 +1,125 @@
+# cogs/rpg_system/snapshots.py
+import collections
+import copy
+from datetime import datetime
+from pymongo import DESCENDING
+
+# Every Nth turn (and any turn whose delta gets this large) stores the whole state instead of a diff
+CHECKPOINT_INTERVAL = 10
+MAX_DELTA_OPS = 200
+
+def diff_state(old: dict, new: dict, path: tuple = ()) -> list:
+    """Field-level delta between two world states. Dicts are walked; lists and scalars are replaced whole."""
+    ops = []
+    for key in old.keys() - new.keys():
+        ops.append({"op": "unset", "path": [*path, key]})
+    for key, value in new.items():
+        if key not in old:
+            ops.append({"op": "set", "path": [*path, key], "value": value})
+        elif isinstance(value, dict) and isinstance(old[key], dict):
+            ops.extend(diff_state(old[key], value, (*path, key)))
+        elif value != old[key]:
+            ops.append({"op": "set", "path": [*path, key], "value": value})
+    return ops
+
+def apply_delta(state: dict, ops: list) -> dict:
+    """Applies diff_state() output to `state` in place and returns it."""
+    for op in ops:
+        *parents, leaf = op["path"]
+        node = state
+        for key in parents:
+            child = node.get(key)
+            if not isinstance(child, dict):
+                child = node[key] = {}
+            node = child
+        if op["op"] == "set":
+            node[leaf] = copy.deepcopy(op["value"])
+        else:
+            node.pop(leaf, None)
+    return state
+
+class WorldSnapshotStore:
+    """
+    Per-turn world-state history kept outside the session document: a full checkpoint every
+    CHECKPOINT_INTERVAL turns and field-level deltas in between, one small document per turn.
+    Any turn is rebuilt by loading its nearest checkpoint and replaying the deltas after it.
+    """
+    def __init__(self, collection, max_cached_threads: int = 64):
+        self.collection = collection
+        self.max_cached_threads = max_cached_threads
+        self._last = collections.OrderedDict() # thread_id -> (turn_id, state) of the newest snapshot written
+
+    def _cache(self, thread_id: int, turn_id: int, state: dict):
+        self._last[thread_id] = (turn_id, copy.deepcopy(state))
+        self._last.move_to_end(thread_id)
+        while len(self._last) > self.max_cached_threads:
+            self._last.popitem(last=False)
+
+    async def _previous(self, thread_id: int, turn_id: int):
+        """(turn_id, state) of the newest snapshot before turn_id, or (None, None)."""
+        prev = await self.collection.find_one(
+            {"thread_id": thread_id, "turn_id": {"$lt": turn_id}}, {"turn_id": 1, "kind": 1},
+            sort=[("turn_id", DESCENDING)]
+        )
+        if not prev: return None, None
+        cached = self._last.get(thread_id)
+        if cached and cached[0] == prev["turn_id"]:
+            return cached[0], copy.deepcopy(cached[1])
+        return prev["turn_id"], await self.state_at(thread_id, prev["turn_id"])
+
+    async def record(self, thread_id, turn_id, state: dict):
+        """Stores the world state as of the end of `turn_id`."""
+        thread_id, turn_id = int(thread_id), int(turn_id)
+        prev_turn, prev_state = await self._previous(thread_id, turn_id)
+
+        doc = {"thread_id": thread_id, "turn_id": turn_id, "created_at": datetime.utcnow()}
+        ops = diff_state(prev_state, state) if prev_state is not None else None
+        if ops is None or turn_id % CHECKPOINT_INTERVAL == 0 or len(ops) > MAX_DELTA_OPS:
+            doc.update({"kind": "full", "state": state})
+        else:
+            doc.update({"kind": "delta", "base_turn_id": prev_turn, "ops": ops})
+
+        await self.collection.replace_one({"thread_id": thread_id, "turn_id": turn_id}, doc, upsert=True)
+        # Later deltas were diffed against a timeline this turn just replaced
+        await self.collection.delete_many({"thread_id": thread_id, "turn_id": {"$gt": turn_id}})
+        self._cache(thread_id, turn_id, state)
+
+    async def state_at(self, thread_id, turn_id):
+        """Rebuilds the world state as of `turn_id`, or None if no snapshot covers it."""
+        thread_id, turn_id = int(thread_id), int(turn_id)
+        cached = self._last.get(thread_id)
+        if cached and cached[0] == turn_id:
+            return copy.deepcopy(cached[1])
+
+        checkpoint = await self.collection.find_one(
+            {"thread_id": thread_id, "kind": "full", "turn_id": {"$lte": turn_id}},
+            sort=[("turn_id", DESCENDING)]
+        )
+        if not checkpoint: return None
+
+        state = checkpoint["state"]
+        cursor = self.collection.find(
+            {"thread_id": thread_id, "kind": "delta", "turn_id": {"$gt": checkpoint["turn_id"], "$lte": turn_id}},
+            {"ops": 1, "turn_id": 1}
+        ).sort("turn_id", 1)
+        async for delta in cursor:
+            apply_delta(state, delta["ops"])
+        return state
+
+    async def truncate(self, thread_id, after_turn_id: int = 0):
+        """Forgets snapshots newer than after_turn_id (rerolls, trims); 0 clears the thread."""
+        thread_id = int(thread_id)
+        await self.collection.delete_many({"thread_id": thread_id, "turn_id": {"$gt": int(after_turn_id or 0)}})
+        cached = self._last.get(thread_id)
+        if cached and cached[0] > int(after_turn_id or 0):
+            self._last.pop(thread_id, None)
+
+    async def prune_before(self, thread_id, oldest_turn_id: int):
+        """Drops history no rewind can reach: everything before the checkpoint covering oldest_turn_id."""
+        thread_id = int(thread_id)
+        checkpoint = await self.collection.find_one(
+            {"thread_id": thread_id, "kind": "full", "turn_id": {"$lte": int(oldest_turn_id)}},
+            {"turn_id": 1}, sort=[("turn_id", DESCENDING)]
+        )
+        if checkpoint:
+            await self.collection.delete_many({"thread_id": thread_id, "turn_id": {"$lt": checkpoint["turn_id"]}})
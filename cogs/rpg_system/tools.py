@@ -3,7 +3,8 @@ import random
 import uuid
 from datetime import datetime
 from google.generativeai.tool import tool
-from utils.db import rpg_sessions_collection, rpg_inventory_collection, rpg_world_state_collection
+from utils.db import rpg_sessions_collection, rpg_inventory_collection, rpg_world_state_collection, rpg_world_entities_collection
+from utils.world_store import entity_key, to_entity_doc, from_entity_doc
 
 @tool
 def grant_item_to_player(user_id: str, item_name: str, description: str):
@@ -48,10 +49,15 @@ def update_world_entity(thread_id: str, category: str, name: str, details: str =
         for key, val in kwargs.items():
             if val is not None: attributes[key] = val
 
-        safe_name = name.strip().replace('.', '_').replace('$', '')
+        safe_name = entity_key(name)
         db_key = f"{category.lower()}s.{safe_name}"
+        entity_filter = {"thread_id": int(thread_id), "category": category.lower(), "key": safe_name}
 
-        existing_data = (rpg_world_state_collection.find_one({"thread_id": int(thread_id)}, {db_key: 1}) or {}).get(category.lower() + "s", {}).get(safe_name, {})
+        world = rpg_world_state_collection.find_one({"thread_id": int(thread_id)}, {db_key: 1, "entity_store": 1}) or {}
+        if world.get("entity_store"):
+            existing_data = from_entity_doc(rpg_world_entities_collection.find_one(entity_filter) or {})
+        else:
+            existing_data = world.get(category.lower() + "s", {}).get(safe_name, {})
         
         final_details = details if details is not None else existing_data.get("details", "")
 
@@ -73,9 +79,14 @@ def update_world_entity(thread_id: str, category: str, name: str, details: str =
             "last_updated": datetime.utcnow(), "attributes": new_attributes 
         }
 
-        rpg_world_state_collection.update_one(
-            {"thread_id": int(thread_id)}, {"$set": {db_key: update_payload}}, upsert=True
-        )
+        if world.get("entity_store"):
+            rpg_world_entities_collection.update_one(
+                entity_filter, {"$set": to_entity_doc(thread_id, category, safe_name, update_payload)}, upsert=True
+            )
+        else:
+            rpg_world_state_collection.update_one(
+                {"thread_id": int(thread_id)}, {"$set": {db_key: update_payload}}, upsert=True
+            )
         return f"System: Updated {category} '{name.strip()}'."
     except Exception as e: return f"System Error: {e}"
 
@@ -64,6 +64,82 @@ class StatusManager:
         except:
             pass
 
+class NarrativeStreamer:
+    """
+    Shows a narrative while the model is still writing it. Text is split into the same 4000-char
+    embed chunks _send_narrative uses, one message per chunk, and edits share StatusManager's
+    1.5s debounce. The engine hands `messages` to _send_narrative, which turns them into the
+    final embeds (footer, action buttons) instead of sending new ones.
+    """
+    CHUNK = 4000
+    INTERVAL = 1.5
+
+    def __init__(self, channel, author_name=None, author_icon=None):
+        self.channel = channel
+        self.author_name = author_name
+        self.author_icon = author_icon
+        self.messages = []
+        self.text = ""
+        self._shown = []   # chunk text currently displayed per message
+        self.last_update = 0
+        self._task = None
+        self._editing = False
+
+    def update(self, text):
+        """Record the latest text. Never waits on Discord; edits happen in a background task."""
+        self.text = text
+        if not self._task or self._task.done():
+            self._task = asyncio.create_task(self._delayed_update())
+
+    def reset(self):
+        """A new model call starts; only its text is the narrative."""
+        self.text = ""
+
+    async def _delayed_update(self):
+        delay = self.INTERVAL - (time.time() - self.last_update)
+        if delay > 0: await asyncio.sleep(delay)
+        await self._do_update()
+
+    async def _do_update(self):
+        text = self.text
+        if not text: return
+        chunks = [text[i:i + self.CHUNK] for i in range(0, len(text), self.CHUNK)]
+        self._editing = True
+        try:
+            for i, chunk in enumerate(chunks):
+                shown = chunk + (" ▌" if i == len(chunks) - 1 else "")
+                if i < len(self._shown) and self._shown[i] == shown: continue
+                embed = discord.Embed(description=shown, color=discord.Color.from_rgb(47, 49, 54))
+                if i == 0 and self.author_name: embed.set_author(name=self.author_name, icon_url=self.author_icon)
+                if i < len(self.messages):
+                    await self.messages[i].edit(embed=embed)
+                    self._shown[i] = shown
+                else:
+                    self.messages.append(await self.channel.send(embed=embed))
+                    self._shown.append(shown)
+            self.last_update = time.time()
+        except (discord.NotFound, discord.Forbidden):
+            pass
+        except Exception as e:
+            print(f"Stream Update Error: {e}")
+        finally:
+            self._editing = False
+
+    async def close(self):
+        """Stops pending edits; the messages stay for _send_narrative to finalize."""
+        if self._task and not self._task.done():
+            # An edit already talking to Discord is allowed to finish so no sent message is lost
+            if not self._editing: self._task.cancel()
+            try: await self._task
+            except asyncio.CancelledError: pass
+
+    async def discard(self):
+        await self.close()
+        for msg in self.messages:
+            try: await msg.delete()
+            except: pass
+        self.messages = []
+
 def sanitize_age(age_input):
     """Sanitizes age input to ensure it's a valid string/int."""
     if not age_input: return "Unknown"
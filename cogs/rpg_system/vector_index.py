@@ -0,0 +1,369 @@
+# cogs/rpg_system/vector_index.py
+import asyncio
+import collections
+import logging
+import os
+from datetime import datetime, timezone
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# "exact" scores every row; "ivf" adds an inverted-file ANN layer once a thread is large enough
+VECTOR_INDEX_MODE = os.environ.get("RPG_VECTOR_INDEX_MODE", "exact").lower()
+# Where trained IVF centroids are kept between restarts (one .npz per thread)
+VECTOR_INDEX_DIR = os.environ.get("RPG_VECTOR_INDEX_DIR", os.path.join("data", "vector_index"))
+# Below this many rows brute force is already sub-millisecond, so no ANN layer is built
+IVF_MIN_VECTORS = int(os.environ.get("RPG_IVF_MIN_VECTORS", "5000"))
+
+def _to_epoch(ts) -> float:
+    """Mongo hands back naive UTC datetimes; normalise everything to epoch seconds."""
+    if not isinstance(ts, datetime): return 0.0
+    if ts.tzinfo is None: ts = ts.replace(tzinfo=timezone.utc)
+    return ts.timestamp()
+
+def _unit_rows(matrix: np.ndarray, norms: np.ndarray) -> np.ndarray:
+    safe = np.where(norms == 0, 1.0, norms).astype(np.float32)
+    return matrix / safe[:, None]
+
+class IVFQuantizer:
+    """
+    Coarse quantiser for inverted-file search: spherical k-means centroids over the unit
+    vectors of a thread. Each row lives in the list of its nearest centroid and a query only
+    scores the rows of its `nprobe` nearest lists.
+    """
+    def __init__(self, centroids: np.ndarray, trained_size: int):
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.trained_size = trained_size
+
+    @property
+    def nlist(self) -> int:
+        return self.centroids.shape[0]
+
+    @staticmethod
+    def default_nlist(n: int) -> int:
+        return max(8, int(np.sqrt(n)))
+
+    @classmethod
+    def train(cls, unit_rows: np.ndarray, nlist: int | None = None, iters: int = 8, sample_per_list: int = 32, seed: int = 0):
+        """CPU-heavy (seconds at 100k rows): run it in a worker thread, never on the event loop."""
+        n = unit_rows.shape[0]
+        nlist = min(nlist or cls.default_nlist(n), n)
+        rng = np.random.default_rng(seed)
+        if n > nlist * sample_per_list:
+            sample = unit_rows[rng.choice(n, nlist * sample_per_list, replace=False)]
+        else:
+            sample = unit_rows
+
+        centroids = sample[rng.choice(sample.shape[0], nlist, replace=False)].copy()
+        for _ in range(iters):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, sample)
+            counts = np.bincount(assign, minlength=nlist)
+            empty = counts == 0
+            if empty.any(): # Re-seed dead centroids on random sample rows
+                sums[empty] = sample[rng.choice(sample.shape[0], int(empty.sum()), replace=False)]
+            lengths = np.linalg.norm(sums, axis=1)
+            lengths[lengths == 0] = 1.0
+            centroids = (sums / lengths[:, None]).astype(np.float32)
+        return cls(centroids, n)
+
+    def assign(self, unit_rows: np.ndarray, chunk: int = 8192) -> np.ndarray:
+        out = np.empty(unit_rows.shape[0], dtype=np.int32)
+        for start in range(0, unit_rows.shape[0], chunk):
+            out[start:start + chunk] = np.argmax(unit_rows[start:start + chunk] @ self.centroids.T, axis=1)
+        return out
+
+    def probe(self, unit_query: np.ndarray, nprobe: int) -> np.ndarray:
+        nprobe = min(nprobe, self.nlist)
+        sims = self.centroids @ unit_query
+        return np.argpartition(-sims, nprobe - 1)[:nprobe]
+
+    # --- PERSISTENCE ---
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, centroids=self.centroids, trained_size=np.int64(self.trained_size))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str, dim: int):
+        try:
+            with np.load(path) as data:
+                centroids = data["centroids"]
+                trained_size = int(data["trained_size"])
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable IVF file {path}: {e}")
+            return None
+        if centroids.ndim != 2 or centroids.shape[1] != dim: return None
+        return cls(centroids, trained_size)
+
+class ThreadVectorIndex:
+    """
+    All embeddings of one RPG thread as a contiguous float32 matrix with precomputed norms.
+    Rows are appended in place (amortised doubling) and removed with a boolean mask, so
+    retrieval is one matrix-vector product plus an argpartition top-k.
+    With an IVFQuantizer attached, only the rows in the query's nearest lists are scored.
+    """
+    def __init__(self, dim: int | None = None):
+        self.dim = dim
+        self.size = 0
+        self._matrix = None      # (capacity, dim) float32, rows [0:size] are live
+        self._norms = None       # (capacity,) float32
+        self._timestamps = None  # (capacity,) float64 epoch seconds
+        self._max_turns = None   # (capacity,) int64, -1 when the chunk has no turn id
+        self._lists = None       # (capacity,) int32 IVF list of each row, valid while ivf is set
+        self.texts = []
+        self.ids = []
+        self.ivf = None
+        self.nprobe = None
+        self.generation = 0      # Bumped whenever rows move, so stale background work can be discarded
+
+    def _ensure_capacity(self, extra: int):
+        needed = self.size + extra
+        cap = 0 if self._matrix is None else self._matrix.shape[0]
+        if needed <= cap: return
+        new_cap = max(needed, cap * 2, 64)
+        matrix = np.empty((new_cap, self.dim), dtype=np.float32)
+        norms = np.empty(new_cap, dtype=np.float32)
+        stamps = np.empty(new_cap, dtype=np.float64)
+        turns = np.empty(new_cap, dtype=np.int64)
+        lists = np.zeros(new_cap, dtype=np.int32)
+        if self.size:
+            matrix[:self.size] = self._matrix[:self.size]
+            norms[:self.size] = self._norms[:self.size]
+            stamps[:self.size] = self._timestamps[:self.size]
+            turns[:self.size] = self._max_turns[:self.size]
+            lists[:self.size] = self._lists[:self.size]
+        self._matrix, self._norms, self._timestamps, self._max_turns, self._lists = matrix, norms, stamps, turns, lists
+
+    def add_many(self, docs: list):
+        """docs: dicts with _id, text, vector, timestamp and optional metadata.max_turn_id."""
+        if not docs: return
+        if self.dim is None: self.dim = len(docs[0]["vector"])
+        docs = [d for d in docs if d.get("vector") is not None and len(d["vector"]) == self.dim]
+        if not docs: return
+
+        block = np.asarray([d["vector"] for d in docs], dtype=np.float32)
+        self._ensure_capacity(len(docs))
+        start, end = self.size, self.size + len(docs)
+        self._matrix[start:end] = block
+        self._norms[start:end] = np.linalg.norm(block, axis=1)
+        self._timestamps[start:end] = [_to_epoch(d.get("timestamp")) for d in docs]
+        self._max_turns[start:end] = [int((d.get("metadata") or {}).get("max_turn_id") or -1) for d in docs]
+        if self.ivf is not None:
+            self._lists[start:end] = self.ivf.assign(_unit_rows(block, self._norms[start:end]))
+        self.texts.extend(d["text"] for d in docs)
+        self.ids.extend(d.get("_id") for d in docs)
+        self.size = end
+
+    def remove_where(self, keep_mask: np.ndarray) -> int:
+        removed = int(self.size - keep_mask.sum())
+        if not removed: return 0
+        idx = np.nonzero(keep_mask)[0]
+        n = len(idx)
+        self._matrix[:n] = self._matrix[idx]
+        self._norms[:n] = self._norms[idx]
+        self._timestamps[:n] = self._timestamps[idx]
+        self._max_turns[:n] = self._max_turns[idx]
+        self._lists[:n] = self._lists[idx]
+        self.texts = [self.texts[i] for i in idx]
+        self.ids = [self.ids[i] for i in idx]
+        self.size = n
+        self.generation += 1
+        return removed
+
+    def purge(self, cutoff_timestamp=None, from_turn_id=None) -> int:
+        """Mirror of the Mongo purge: drop rows newer than the cutoff OR past the turn id."""
+        if not self.size: return 0
+        drop = np.zeros(self.size, dtype=bool)
+        if cutoff_timestamp is not None:
+            drop |= self._timestamps[:self.size] > _to_epoch(cutoff_timestamp)
+        if from_turn_id:
+            drop |= self._max_turns[:self.size] > int(from_turn_id)
+        return self.remove_where(~drop)
+
+    # --- IVF LAYER ---
+
+    def unit_snapshot(self) -> tuple:
+        """(unit rows copy, size, generation) for training or assigning off the event loop."""
+        return _unit_rows(self._matrix[:self.size], self._norms[:self.size]), self.size, self.generation
+
+    def attach_ivf(self, ivf: IVFQuantizer, lists: np.ndarray, snapshot_size: int, generation: int) -> bool:
+        """Installs a quantiser built from unit_snapshot(); rows added since are assigned here."""
+        if generation != self.generation or snapshot_size > self.size: return False
+        self._lists[:snapshot_size] = lists
+        if self.size > snapshot_size:
+            tail = _unit_rows(self._matrix[snapshot_size:self.size], self._norms[snapshot_size:self.size])
+            self._lists[snapshot_size:self.size] = ivf.assign(tail)
+        self.ivf = ivf
+        self.nprobe = max(4, ivf.nlist // 10)
+        return True
+
+    def detach_ivf(self):
+        self.ivf = None
+        self.nprobe = None
+
+    # --- SEARCH ---
+
+    def search(self, query_vector, limit: int = 5, threshold: float = 0.60, exact: bool = False) -> list:
+        """Returns [(score, text)] best first, cosine similarity >= threshold."""
+        if not self.size or query_vector is None: return []
+        q = np.asarray(query_vector, dtype=np.float32)
+        if q.shape[0] != self.dim: return []
+        q_norm = float(np.linalg.norm(q))
+        if q_norm == 0.0: return []
+
+        if self.ivf is not None and not exact:
+            probed = np.zeros(self.ivf.nlist, dtype=bool)
+            probed[self.ivf.probe(q / q_norm, self.nprobe)] = True
+            rows = np.nonzero(probed[self._lists[:self.size]])[0]
+            if not len(rows): return []
+            matrix, norms = self._matrix[rows], self._norms[rows]
+        else:
+            rows = None
+            matrix, norms = self._matrix[:self.size], self._norms[:self.size]
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            scores = (matrix @ q) / (norms * q_norm)
+        scores = np.nan_to_num(scores, nan=0.0, posinf=0.0, neginf=0.0)
+
+        k = min(limit, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        if rows is not None: top_rows = rows[top]
+        else: top_rows = top
+        return [(float(scores[i]), self.texts[r]) for i, r in zip(top, top_rows) if scores[i] >= threshold]
+
+class VectorMemoryStore:
+    """
+    Process-wide cache of ThreadVectorIndex objects, loaded from Mongo once per thread and
+    kept in sync by RPGContextManager (store / purge / clear) instead of re-read every turn.
+    In "ivf" mode large threads also get an IVF layer, trained in a worker thread, retrained
+    after the thread doubles in size, and persisted under VECTOR_INDEX_DIR.
+    """
+    def __init__(self, collection, max_threads: int = 64, mode: str = VECTOR_INDEX_MODE, index_dir: str = VECTOR_INDEX_DIR):
+        self.collection = collection
+        self.max_threads = max_threads
+        self.mode = mode
+        self.index_dir = index_dir
+        self._indexes = collections.OrderedDict() # thread_id -> ThreadVectorIndex (LRU)
+        self._locks = {}
+        self._pending = {} # thread_id -> docs stored while that thread's index was loading
+        self._training = {} # thread_id -> background IVF training task
+
+    def _ivf_path(self, thread_id: int) -> str:
+        return os.path.join(self.index_dir, f"{int(thread_id)}.npz")
+
+    async def get(self, thread_id: int) -> ThreadVectorIndex:
+        thread_id = int(thread_id)
+        index = self._indexes.get(thread_id)
+        if index is not None:
+            self._indexes.move_to_end(thread_id)
+            return index
+
+        lock = self._locks.setdefault(thread_id, asyncio.Lock())
+        async with lock:
+            index = self._indexes.get(thread_id)
+            if index is not None: return index
+
+            index = ThreadVectorIndex()
+            self._pending[thread_id] = []
+            try:
+                cursor = self.collection.find(
+                    {"thread_id": thread_id},
+                    {"text": 1, "vector": 1, "timestamp": 1, "metadata.max_turn_id": 1}
+                )
+                batch = []
+                async for doc in cursor:
+                    batch.append(doc)
+                    if len(batch) >= 1000:
+                        index.add_many(batch)
+                        batch = []
+                index.add_many(batch)
+                if self.mode == "ivf" and index.size >= IVF_MIN_VECTORS:
+                    await self._restore_ivf(thread_id, index)
+            finally:
+                pending = self._pending.pop(thread_id, None)
+
+            # A purge/clear landed mid-load: serve this result once, reload on next use
+            if pending is None: return index
+
+            # Inserts that raced the cursor may or may not have been read by it
+            seen = set(index.ids)
+            index.add_many([d for d in pending if d.get("_id") not in seen])
+
+            self._indexes[thread_id] = index
+            while len(self._indexes) > self.max_threads:
+                old_id, _ = self._indexes.popitem(last=False)
+                self._locks.pop(old_id, None)
+            logger.info(f"Vector index loaded for thread {thread_id}: {index.size} memories.")
+            self._maybe_train(thread_id, index)
+            return index
+
+    def loaded(self, thread_id: int) -> ThreadVectorIndex | None:
+        return self._indexes.get(int(thread_id))
+
+    def add(self, thread_id: int, docs: list):
+        # Only update threads that are already resident; others load fresh from Mongo on first use
+        index = self.loaded(thread_id)
+        if index is not None:
+            index.add_many(docs)
+            self._maybe_train(int(thread_id), index)
+        elif int(thread_id) in self._pending: self._pending[int(thread_id)].extend(docs)
+
+    def purge(self, thread_id: int, cutoff_timestamp=None, from_turn_id=None):
+        index = self.loaded(thread_id)
+        if index is not None:
+            index.purge(cutoff_timestamp, from_turn_id)
+            # Rerolls purge a handful of rows; only a large shrink makes the centroids worth dropping
+            if index.ivf is not None and index.size < IVF_MIN_VECTORS: index.detach_ivf()
+        self._pending.pop(int(thread_id), None)
+
+    def drop(self, thread_id: int):
+        thread_id = int(thread_id)
+        self._indexes.pop(thread_id, None)
+        self._locks.pop(thread_id, None)
+        self._pending.pop(thread_id, None)
+        task = self._training.pop(thread_id, None)
+        if task: task.cancel()
+        try: os.remove(self._ivf_path(thread_id))
+        except OSError: pass
+
+    # --- IVF MAINTENANCE ---
+
+    async def _restore_ivf(self, thread_id: int, index: ThreadVectorIndex):
+        """Re-uses persisted centroids so a restart only pays for assignment, not k-means."""
+        ivf = await asyncio.to_thread(IVFQuantizer.load, self._ivf_path(thread_id), index.dim)
+        if ivf is None: return
+        rows, size, generation = index.unit_snapshot()
+        lists = await asyncio.to_thread(ivf.assign, rows)
+        index.attach_ivf(ivf, lists, size, generation)
+
+    def _maybe_train(self, thread_id: int, index: ThreadVectorIndex):
+        if self.mode != "ivf" or index.size < IVF_MIN_VECTORS: return
+        if index.ivf is not None and index.size < 2 * index.ivf.trained_size: return
+        if thread_id in self._training: return
+        self._training[thread_id] = asyncio.create_task(self._train(thread_id, index))
+
+    async def _train(self, thread_id: int, index: ThreadVectorIndex):
+        try:
+            rows, size, generation = index.unit_snapshot()
+            ivf = await asyncio.to_thread(IVFQuantizer.train, rows)
+            lists = await asyncio.to_thread(ivf.assign, rows)
+            if self._indexes.get(thread_id) is not index: return # Dropped or evicted meanwhile
+            if not index.attach_ivf(ivf, lists, size, generation):
+                return # Rows were purged during training; the next store retries
+            await asyncio.to_thread(ivf.save, self._ivf_path(thread_id))
+            logger.info(f"IVF index built for thread {thread_id}: {size} rows, {ivf.nlist} lists.")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"IVF training failed for thread {thread_id}: {e}")
+        finally:
+            if self._training.get(thread_id) is asyncio.current_task():
+                self._training.pop(thread_id, None)
@@ -1,38 +1,136 @@
 # cogs/stats_cog.py
+import os
+import collections
 import discord
 from discord.ext import commands, tasks
 from datetime import datetime
-import functools
-import asyncio
-from utils.db import db, stats_collection, live_activity_collection # Fixed imports
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from utils.db import async_stats_collection, async_live_activity_collection
+
+# Seconds between write-behind flushes of buffered counters
+STATS_FLUSH_SECONDS = float(os.environ.get("STATS_FLUSH_SECONDS", "5"))
+# The dashboard only ever shows the newest live_activity rows; update_stats_loop trims to this many
+LIVE_ACTIVITY_KEEP = 50
+
+class StatsBuffer:
+    """
+    Coalesces bot_stats increments per document and live_activity rows in memory, then
+    writes them with one bulk_write + one insert_many per flush instead of 4 writes per message.
+    """
+    def __init__(self):
+        self._incs = collections.defaultdict(collections.Counter) # _id -> {field: amount}
+        self._sets = collections.defaultdict(dict)                # _id -> {field: latest value}
+        self._activity = collections.deque(maxlen=LIVE_ACTIVITY_KEEP)
+        self.logical_writes = 0  # Writes the unbuffered code would have issued
+        self.issued_writes = 0   # Operations actually sent to Mongo
+        self.flushes = 0
+
+    @property
+    def writes_saved(self) -> int:
+        return self.logical_writes - self.issued_writes
+
+    def inc(self, doc_id: str, fields: dict, set_fields: dict = None):
+        self._incs[doc_id].update(fields)
+        if set_fields: self._sets[doc_id].update(set_fields)
+        self.logical_writes += 1
+
+    def activity(self, doc: dict):
+        self._activity.append(doc)
+        self.logical_writes += 1
+
+    async def flush(self):
+        if not self._incs and not self._sets and not self._activity: return
+        incs, sets, activity = self._incs, self._sets, list(self._activity)
+        self._incs = collections.defaultdict(collections.Counter)
+        self._sets = collections.defaultdict(dict)
+        self._activity.clear()
+
+        doc_ids = list(incs.keys() | sets.keys())
+        ops = []
+        for doc_id in doc_ids:
+            update = {}
+            if incs.get(doc_id): update["$inc"] = dict(incs[doc_id])
+            if sets.get(doc_id): update["$set"] = sets[doc_id]
+            ops.append(UpdateOne({"_id": doc_id}, update, upsert=True))
+
+        error = None
+        try:
+            if ops:
+                try:
+                    await async_stats_collection.bulk_write(ops, ordered=False)
+                    failed = set()
+                except BulkWriteError as e:
+                    # Unordered: every op not listed in writeErrors was applied
+                    failed = {doc_ids[err["index"]] for err in e.details.get("writeErrors", [])}
+                    error = e
+                self.issued_writes += len(ops) - len(failed)
+                incs = {k: v for k, v in incs.items() if k in failed}
+                sets = {k: v for k, v in sets.items() if k in failed}
+            if activity:
+                try:
+                    # Copies: insert_many adds an _id to each document it is given
+                    await async_live_activity_collection.insert_many([dict(doc) for doc in activity], ordered=False)
+                    failed = []
+                except BulkWriteError as e:
+                    # A duplicate key means that row is already stored
+                    failed = [err["index"] for err in e.details.get("writeErrors", []) if err.get("code") != 11000]
+                    error = error or e
+                self.issued_writes += len(activity) - len(failed)
+                activity = [activity[i] for i in failed]
+            if error: raise error
+            self.flushes += 1
+        finally:
+            # Anything not written goes back in front of newer data for the next flush
+            for doc_id, fields in incs.items():
+                self._incs[doc_id].update(fields)
+            for doc_id, fields in sets.items():
+                self._sets[doc_id] = {**fields, **self._sets[doc_id]}
+            if activity:
+                newer = list(self._activity)
+                self._activity.clear()
+                self._activity.extend(activity + newer)
 
 class StatsCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.buffer = StatsBuffer()
         self.update_stats_loop.start()
+        self.flush_loop.change_interval(seconds=STATS_FLUSH_SECONDS)
+        self.flush_loop.start()
 
-    def cog_unload(self):
+    async def cog_unload(self):
         self.update_stats_loop.cancel()
+        self.flush_loop.cancel()
+        try:
+            await self.buffer.flush() # Don't lose the last few seconds of counts on shutdown/reload
+        except Exception as e:
+            print(f"Stats Flush Error: {e}")
 
-    async def run_db(self, func, *args, **kwargs):
-        """Helper to run synchronous DB calls in a separate thread to avoid blocking."""
-        partial_func = functools.partial(func, *args, **kwargs)
-        return await self.bot.loop.run_in_executor(None, partial_func)
+    @tasks.loop(seconds=5)
+    async def flush_loop(self):
+        try:
+            await self.buffer.flush()
+        except Exception as e:
+            print(f"Stats Flush Error: {e}")
 
     @tasks.loop(seconds=60)
     async def update_stats_loop(self):
         try:
             total_guilds = len(self.bot.guilds)
             total_users = sum(g.member_count for g in self.bot.guilds)
-            
-            await self.run_db(stats_collection.update_one, {"_id": "global"}, {"$set": {"total_guilds": total_guilds, "total_users": total_users}}, upsert=True)
-            
-            count = await self.run_db(live_activity_collection.count_documents, {})
-            if count > 50:
-                oldest = await self.run_db(lambda: list(live_activity_collection.find().sort("timestamp", 1).limit(count - 50)))
+
+            await async_stats_collection.update_one({"_id": "global"}, {"$set": {
+                "total_guilds": total_guilds, "total_users": total_users,
+                "stats_writes_saved": self.buffer.writes_saved, "stats_flushes": self.buffer.flushes
+            }}, upsert=True)
+
+            count = await async_live_activity_collection.count_documents({})
+            if count > LIVE_ACTIVITY_KEEP:
+                oldest = await async_live_activity_collection.find({}, {"_id": 1}).sort("timestamp", 1).limit(count - LIVE_ACTIVITY_KEEP).to_list(length=None)
                 if oldest:
                     ids = [x["_id"] for x in oldest]
-                    await self.run_db(live_activity_collection.delete_many, {"_id": {"$in": ids}})
+                    await async_live_activity_collection.delete_many({"_id": {"$in": ids}})
         except Exception as e:
             print(f"Stats Loop Error: {e}")
 
@@ -45,21 +143,21 @@ class StatsCog(commands.Cog):
         if message.author.bot: return
         timestamp = datetime.utcnow()
 
-        await self.run_db(stats_collection.update_one, {"_id": "global"}, {"$inc": {"total_messages": 1}}, upsert=True)
+        self.buffer.inc("global", {"total_messages": 1})
 
         if message.guild:
-            await self.run_db(stats_collection.update_one, {"_id": f"guild_{message.guild.id}"}, {"$inc": {"messages": 1}, "$set": {"name": message.guild.name, "last_active": timestamp}}, upsert=True)
+            self.buffer.inc(f"guild_{message.guild.id}", {"messages": 1}, {"name": message.guild.name, "last_active": timestamp})
 
-        await self.run_db(stats_collection.update_one, {"_id": f"user_{message.author.id}"}, {"$inc": {"messages": 1}, "$set": {"name": message.author.name, "display_name": message.author.display_name, "last_active": timestamp}}, upsert=True)
+        self.buffer.inc(f"user_{message.author.id}", {"messages": 1}, {"name": message.author.name, "display_name": message.author.display_name, "last_active": timestamp})
 
-        await self.run_db(live_activity_collection.insert_one, {"user": message.author.name, "guild": message.guild.name if message.guild else "DM", "action": "Sent a message", "timestamp": timestamp})
+        self.buffer.activity({"user": message.author.name, "guild": message.guild.name if message.guild else "DM", "action": "Sent a message", "timestamp": timestamp})
 
     @commands.Cog.listener()
     async def on_app_command_completion(self, interaction, command):
         timestamp = datetime.utcnow()
-        await self.run_db(stats_collection.update_one, {"_id": f"cmd_{command.name}"}, {"$inc": {"usage_count": 1}, "$set": {"name": command.name, "last_used": timestamp}}, upsert=True)
-        await self.run_db(stats_collection.update_one, {"_id": "global"}, {"$inc": {"total_commands": 1}}, upsert=True)
-        await self.run_db(live_activity_collection.insert_one, {"user": interaction.user.name, "guild": interaction.guild.name if interaction.guild else "DM", "action": f"Used /{command.name}", "timestamp": timestamp})
+        self.buffer.inc(f"cmd_{command.name}", {"usage_count": 1}, {"name": command.name, "last_used": timestamp})
+        self.buffer.inc("global", {"total_commands": 1})
+        self.buffer.activity({"user": interaction.user.name, "guild": interaction.guild.name if interaction.guild else "DM", "action": f"Used /{command.name}", "timestamp": timestamp})
 
 async def setup(bot):
-    await bot.add_cog(StatsCog(bot))
\ No newline at end of file
+    await bot.add_cog(StatsCog(bot))
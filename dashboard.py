@@ -8,32 +8,31 @@ import asyncio
 import json
 import sys
 import os
-import functools
 import uuid
 import random
 from datetime import datetime
 from utils.db import (
-    stats_collection, 
-    live_activity_collection, 
-    rpg_sessions_collection, 
-    logs_collection,
-    ai_config_collection,
-    user_personas_collection,
-    rpg_web_tokens_collection,
-    web_actions_collection,
-    rpg_world_state_collection,
-    rpg_vector_memory_collection,
-    db 
+    async_stats_collection as stats_collection, 
+    async_live_activity_collection as live_activity_collection, 
+    async_rpg_sessions_collection as rpg_sessions_collection, 
+    async_logs_collection as logs_collection,
+    async_ai_config_collection as ai_config_collection,
+    async_user_personas_collection as user_personas_collection,
+    async_rpg_web_tokens_collection as rpg_web_tokens_collection,
+    async_web_actions_collection as web_actions_collection,
+    async_rpg_world_state_collection as rpg_world_state_collection,
+    async_rpg_vector_memory_collection as rpg_vector_memory_collection,
+    async_rpg_debug_terminal_collection as rpg_debug_terminal_collection
 )
+from utils import world_store, log_store
+from utils.event_bus import event_bus
 from cogs.rpg_system.config import SCENARIOS, PREMADE_CHARACTERS
 
 app = FastAPI()
 templates = Jinja2Templates(directory="templates")
 
-# --- ASYNC DATABASE HELPER ---
-async def run_sync_db(func, *args, **kwargs):
-    loop = asyncio.get_running_loop()
-    return await loop.run_in_executor(None, functools.partial(func, *args, **kwargs))
+# All collections above are Motor (async) handles: every fetch helper is a coroutine
+# and runs directly on the worker's event loop, no thread pool hop.
 
 # --- DATA MODELS ---
 
@@ -104,9 +103,9 @@ def serialize_world_entity(entity):
     if "attributes" not in entity: entity["attributes"] = {}
     return entity
 
-def fetch_rpg_debug_logs(thread_id: str):
+async def fetch_rpg_debug_logs(thread_id: str):
     """Fetches specific debug logs for the command prompt UI."""
-    logs = list(db.rpg_debug_terminal.find({"thread_id": str(thread_id)}).sort("timestamp", -1).limit(50))
+    logs = await rpg_debug_terminal_collection.find({"thread_id": str(thread_id)}).sort("timestamp", -1).limit(50).to_list(length=50)
     logs.reverse()
     return [{
         "time": l["timestamp"].strftime("%H:%M:%S"),
@@ -115,13 +114,15 @@ def fetch_rpg_debug_logs(thread_id: str):
         "details": l.get("details", {})
     } for l in logs]
 
-def fetch_rpg_full_memory(thread_id: str):
+async def fetch_rpg_full_memory(thread_id: str):
     tid = int(thread_id)
-    session = rpg_sessions_collection.find_one({"thread_id": tid})
+    session = await rpg_sessions_collection.find_one({"thread_id": tid})
     if not session: return None
 
-    world_state = rpg_world_state_collection.find_one({"thread_id": tid}) or {}
-    vectors = list(rpg_vector_memory_collection.find({"thread_id": tid}).sort("timestamp", -1).limit(50))
+    world_state = await world_store.load_world(tid)
+    vectors = await rpg_vector_memory_collection.find(
+        {"thread_id": tid}, {"text": 1, "timestamp": 1}
+    ).sort("timestamp", -1).limit(50).to_list(length=50)
     
     clean_vectors = []
     for v in vectors:
@@ -167,12 +168,12 @@ def fetch_rpg_full_memory(thread_id: str):
         "memories": clean_vectors
     }
 
-def generate_campaign_document(thread_id: str):
+async def generate_campaign_document(thread_id: str):
     tid = int(thread_id)
-    session = rpg_sessions_collection.find_one({"thread_id": tid})
+    session = await rpg_sessions_collection.find_one({"thread_id": tid})
     if not session: return None
 
-    world = rpg_world_state_collection.find_one({"thread_id": tid}) or {}
+    world = await world_store.load_world(tid)
 
     doc = []
     separator = "=" * 60
@@ -264,10 +265,10 @@ def generate_campaign_document(thread_id: str):
     doc.append(separator)
     doc.append("Note: Reconstructed from active turns and archived memory banks.\n")
 
-    archives = list(rpg_vector_memory_collection.find({
+    archives = await rpg_vector_memory_collection.find({
         "thread_id": tid, 
         "metadata.type": {"$in": ["archived_history", "historical_sync"]}
-    }).sort("timestamp", 1))
+    }, {"text": 1}).sort("timestamp", 1).to_list(length=None)
 
     for arc in archives:
         text = arc.get("text", "")
@@ -290,9 +291,9 @@ def generate_campaign_document(thread_id: str):
 
 # --- FETCH FUNCTIONS ---
 
-def fetch_overview():
-    global_stats = stats_collection.find_one({"_id": "global"}) or {}
-    active_rpgs = rpg_sessions_collection.count_documents({"active": {"$ne": False}})
+async def fetch_overview():
+    global_stats = await stats_collection.find_one({"_id": "global"}) or {}
+    active_rpgs = await rpg_sessions_collection.count_documents({"active": {"$ne": False}})
     return {
         "messages": global_stats.get("total_messages", 0),
         "commands": global_stats.get("total_commands", 0),
@@ -301,19 +302,21 @@ def fetch_overview():
         "active_rpgs": active_rpgs
     }
 
-def fetch_details(data_type: str):
+async def fetch_details(data_type: str):
     data = []
     if data_type == "users":
         cursor = stats_collection.find({"_id": {"$regex": "^user_"}}).sort("messages", -1).limit(50)
-        for doc in cursor: 
+        async for doc in cursor: 
             data.append({"id": doc["_id"], "name": doc.get("name", "Unknown"), "messages": doc.get("messages", 0)})
     elif data_type == "guilds":
         cursor = stats_collection.find({"_id": {"$regex": "^guild_"}}).sort("messages", -1).limit(50)
-        for doc in cursor: 
+        async for doc in cursor: 
             data.append({"id": doc["_id"], "name": doc.get("name", "Unknown"), "messages": doc.get("messages", 0)})
     elif data_type == "rpgs":
-        cursor = rpg_sessions_collection.find().sort([("active", -1), ("last_active", -1)])
-        for doc in cursor:
+        cursor = rpg_sessions_collection.find(
+            {}, {"thread_id": 1, "title": 1, "owner_name": 1, "scenario_type": 1, "active": 1, "last_active": 1, "delete_requested": 1}
+        ).sort([("active", -1), ("last_active", -1)])
+        async for doc in cursor:
             if doc.get("delete_requested"): continue
             data.append({
                 "thread_id": str(doc.get("thread_id")),
@@ -324,42 +327,37 @@ def fetch_details(data_type: str):
                 "last_active": doc.get("last_active", datetime.utcnow()).strftime("%Y-%m-%d %H:%M")
             })
     elif data_type == "commands":
-        global_stats = stats_collection.find_one({"_id": "global"}) or {}
+        global_stats = await stats_collection.find_one({"_id": "global"}) or {}
         cmd_usage = global_stats.get("command_usage", {})
         for cmd, count in cmd_usage.items():
             data.append({"command": cmd, "uses": count})
         data.sort(key=lambda x: x['uses'], reverse=True)
     return data
 
-def fetch_live_feed():
+async def fetch_live_feed():
     cursor = live_activity_collection.find().sort("timestamp", -1).limit(10)
     return [{
         "user": d.get("user"), "guild": d.get("guild"), "action": d.get("action"), 
         "timestamp": d.get("timestamp").strftime("%H:%M:%S") if d.get("timestamp") else ""
-    } for d in cursor]
+    } async for d in cursor]
 
-def fetch_recent_logs():
-    cursor = logs_collection.find().sort("created_at", -1).limit(2)
-    logs = []
-    for bucket in cursor: logs.extend(bucket.get("logs", []))
-    logs.sort(key=lambda x: x["timestamp"]) 
+async def fetch_recent_logs(limit: int = 50):
+    logs = await log_store.tail(limit)
     return [{
         "time": l["timestamp"].strftime("%H:%M:%S"), "level": l["level"], 
         "logger": l["logger"], "message": l["message"]
-    } for l in logs[-50:]]
+    } for l in logs]
 
-def fetch_log_history_dates():
+async def fetch_log_history_dates():
+    # Compressed buckets have no `logs` array; `count` is kept on every rollover-era document
     pipeline = [
-        {"$group": {"_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$created_at"}}, "count": {"$sum": {"$size": "$logs"}}}},
+        {"$group": {"_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$created_at"}}, "count": {"$sum": {"$ifNull": ["$count", {"$size": {"$ifNull": ["$logs", []]}}]}}}},
         {"$sort": {"_id": -1}}
     ]
-    return [{"date": r["_id"], "count": r["count"]} for r in logs_collection.aggregate(pipeline)]
+    return [{"date": r["_id"], "count": r["count"]} async for r in logs_collection.aggregate(pipeline)]
 
-def fetch_logs_by_date(date_str: str):
-    cursor = logs_collection.find({"_id": {"$regex": f"^{date_str}"}})
-    logs = []
-    for doc in cursor: logs.extend(doc.get("logs", []))
-    logs.sort(key=lambda x: x["timestamp"])
+async def fetch_logs_by_date(date_str: str, limit: int = None):
+    logs = await (log_store.tail(limit, date_str) if limit else log_store.entries_for_date(date_str))
     return [{"time": l["timestamp"].strftime("%H:%M:%S"), "level": l["level"], "logger": l["logger"], "message": l["message"]} for l in logs]
 
 # --- API ROUTES ---
@@ -370,17 +368,17 @@ async def get_home(request: Request):
 
 @app.get("/api/details/{data_type}")
 async def get_details_api(data_type: str):
-    data = await run_sync_db(fetch_details, data_type)
+    data = await fetch_details(data_type)
     return JSONResponse(data)
 
 @app.get("/api/history/dates")
 async def get_history_dates():
-    data = await run_sync_db(fetch_log_history_dates)
+    data = await fetch_log_history_dates()
     return JSONResponse(data)
 
 @app.get("/api/history/view/{date_str}")
-async def get_history_logs(date_str: str):
-    data = await run_sync_db(fetch_logs_by_date, date_str)
+async def get_history_logs(date_str: str, limit: int = None):
+    data = await fetch_logs_by_date(date_str, limit)
     return JSONResponse(data)
 
 @app.post("/api/action/restart")
@@ -394,7 +392,7 @@ async def action_restart():
 @app.post("/api/rpg/delete/{thread_id}")
 async def delete_rpg_session(thread_id: str):
     try:
-        rpg_sessions_collection.update_one({"thread_id": int(thread_id)}, {"$set": {"delete_requested": True}})
+        await rpg_sessions_collection.update_one({"thread_id": int(thread_id)}, {"$set": {"delete_requested": True}})
         return JSONResponse({"status": "Marked for deletion"})
     except Exception as e:
         return JSONResponse({"error": str(e)}, status_code=500)
@@ -402,7 +400,7 @@ async def delete_rpg_session(thread_id: str):
 @app.get("/api/rpg/export/{thread_id}")
 async def export_rpg_session(thread_id: str):
     try:
-        content = await run_sync_db(generate_campaign_document, thread_id)
+        content = await generate_campaign_document(thread_id)
         if not content: return JSONResponse({"error": "Session not found"}, status_code=404)
         
         filename = f"Campaign_Export_{thread_id}.txt"
@@ -413,7 +411,7 @@ async def export_rpg_session(thread_id: str):
 @app.get("/api/rpg/memory/{thread_id}")
 async def get_rpg_memory(thread_id: str):
     try:
-        data = await run_sync_db(fetch_rpg_full_memory, thread_id)
+        data = await fetch_rpg_full_memory(thread_id)
         if not data: return JSONResponse({"error": "Session not found"}, status_code=404)
         return JSONResponse(data)
     except Exception as e:
@@ -422,7 +420,7 @@ async def get_rpg_memory(thread_id: str):
 @app.get("/api/rpg/debug/{thread_id}")
 async def get_rpg_debug(thread_id: str):
     try:
-        data = await run_sync_db(fetch_rpg_debug_logs, thread_id)
+        data = await fetch_rpg_debug_logs(thread_id)
         return JSONResponse(data)
     except Exception as e:
         return JSONResponse({"error": str(e)}, status_code=500)
@@ -441,30 +439,17 @@ async def manage_entity(req: ManageEntityRequest):
         
         if req.category not in category_map:
             return JSONResponse({"error": "Invalid category"}, status_code=400)
-            
-        collection_key = category_map[req.category]
 
         if req.action == "delete":
             if not req.original_name: return JSONResponse({"error": "Missing name"}, status_code=400)
-            key_name = req.original_name.strip().replace('.', '_').replace('$', '')
-            await run_sync_db(lambda: rpg_world_state_collection.update_one(
-                {"thread_id": tid},
-                {"$unset": {f"{collection_key}.{key_name}": ""}}
-            ))
+            await world_store.delete_entity(tid, req.category, req.original_name)
             return JSONResponse({"status": "deleted"})
 
         elif req.action in ["add", "edit"]:
             if not req.data or "name" not in req.data: return JSONResponse({"error": "Missing data"}, status_code=400)
             
             name = req.data["name"].strip()
-            safe_name = name.replace('.', '_').replace('$', '')
-            key = f"{collection_key}.{safe_name}"
-
-            if req.action == "edit" and req.original_name and req.original_name != name:
-                old_key = req.original_name.strip().replace('.', '_').replace('$', '')
-                await run_sync_db(lambda: rpg_world_state_collection.update_one(
-                    {"thread_id": tid}, {"$unset": {f"{collection_key}.{old_key}": ""}}
-                ))
+            old_name = req.original_name if req.action == "edit" and req.original_name and req.original_name != name else None
 
             # Default structure for any entity
             update_payload = {
@@ -475,11 +460,7 @@ async def manage_entity(req: ManageEntityRequest):
                 "attributes": req.data.get("attributes", {})
             }
 
-            await run_sync_db(lambda: rpg_world_state_collection.update_one(
-                {"thread_id": tid},
-                {"$set": {key: update_payload}},
-                upsert=True
-            ))
+            await world_store.set_entity(tid, req.category, name, update_payload, old_name=old_name)
             return JSONResponse({"status": "updated", "name": name})
             
     except Exception as e:
@@ -498,25 +479,25 @@ async def manage_log(req: ManageLogRequest):
                 "status": req.status or "pending",
                 "timestamp": datetime.utcnow()
             }
-            await run_sync_db(lambda: rpg_world_state_collection.update_one(
+            await rpg_world_state_collection.update_one(
                 {"thread_id": tid}, {"$push": {"story_log": entry}}, upsert=True
-            ))
+            )
             return JSONResponse({"status": "added"})
 
         elif req.action == "edit":
             if not req.log_id: return JSONResponse({"error": "Missing ID"}, status_code=400)
-            await run_sync_db(lambda: rpg_world_state_collection.update_one(
+            await rpg_world_state_collection.update_one(
                 {"thread_id": tid, "story_log.id": req.log_id},
                 {"$set": {"story_log.$.note": req.note, "story_log.$.status": req.status}}
-            ))
+            )
             return JSONResponse({"status": "updated"})
 
         elif req.action == "delete":
             if not req.log_id: return JSONResponse({"error": "Missing ID"}, status_code=400)
-            await run_sync_db(lambda: rpg_world_state_collection.update_one(
+            await rpg_world_state_collection.update_one(
                 {"thread_id": tid},
                 {"$pull": {"story_log": {"id": req.log_id}}}
-            ))
+            )
             return JSONResponse({"status": "deleted"})
             
     except Exception as e:
@@ -533,31 +514,39 @@ async def log_stream_generator(thread_id: str):
     """Yields new logs as they appear in the database."""
     last_check = datetime.utcnow()
     # Initial buffer (send last 10 logs so terminal isn't empty)
-    initial_logs = await run_sync_db(fetch_rpg_debug_logs, thread_id)
+    initial_logs = await fetch_rpg_debug_logs(thread_id)
     # fetch_rpg_debug_logs returns formatted logs in chrono order (oldest -> newest)
     for log in initial_logs[-10:]:
         yield f"data: {json.dumps(log)}\n\n"
-    
-    while True:
-        # Check for logs newer than last_check
-        new_logs = await run_sync_db(lambda: list(db.rpg_debug_terminal.find({
-            "thread_id": str(thread_id),
-            "timestamp": {"$gt": last_check}
-        }).sort("timestamp", 1)))
-        
-        if new_logs:
-            last_check = new_logs[-1]["timestamp"]
-            for log in new_logs:
-                # Format for frontend
-                formatted = {
-                    "time": log["timestamp"].strftime("%H:%M:%S"),
-                    "level": log.get("level", "info"),
-                    "message": log.get("message", ""),
-                    "details": log.get("details", {})
-                }
-                yield f"data: {json.dumps(formatted)}\n\n"
-        
-        await asyncio.sleep(1) # Polling interval to reduce DB load
+
+    # All viewers in this worker share one change stream; each is only woken for its own thread
+    events = event_bus.subscribe(
+        "rpg_debug_inserts", rpg_debug_terminal_collection, {"operationType": "insert"},
+        predicate=lambda doc: doc.get("thread_id") == str(thread_id)
+    )
+    try:
+        while True:
+            # Check for logs newer than last_check
+            new_logs = await rpg_debug_terminal_collection.find({
+                "thread_id": str(thread_id),
+                "timestamp": {"$gt": last_check}
+            }).sort("timestamp", 1).to_list(length=None)
+            
+            if new_logs:
+                last_check = new_logs[-1]["timestamp"]
+                for log in new_logs:
+                    # Format for frontend
+                    formatted = {
+                        "time": log["timestamp"].strftime("%H:%M:%S"),
+                        "level": log.get("level", "info"),
+                        "message": log.get("message", ""),
+                        "details": log.get("details", {})
+                    }
+                    yield f"data: {json.dumps(formatted)}\n\n"
+            
+            await events.wait(1) # Polling interval when change streams are unavailable
+    finally:
+        events.close()
 
 @app.get("/rpg/inspect/{thread_id}/stream")
 async def stream_rpg_logs(thread_id: str):
@@ -567,11 +556,11 @@ async def stream_rpg_logs(thread_id: str):
 
 @app.get("/rpg/setup", response_class=HTMLResponse)
 async def rpg_setup_page(request: Request, token: str):
-    token_doc = await run_sync_db(lambda: rpg_web_tokens_collection.find_one({"token": token, "status": "pending"}))
+    token_doc = await rpg_web_tokens_collection.find_one({"token": token, "status": "pending"})
     if not token_doc:
         return HTMLResponse("<h1>Invalid or Expired Link</h1>", status_code=404)
     user_id = token_doc["user_id"]
-    personas = await run_sync_db(lambda: list(user_personas_collection.find({"user_id": user_id}, {"_id": 0})))
+    personas = await user_personas_collection.find({"user_id": user_id}, {"_id": 0}).to_list(length=None)
     personas = [serialize_persona(p) for p in personas]
     return templates.TemplateResponse("rpg_setup.html", {
         "request": request, "token": token, "scenarios": SCENARIOS, "premades": PREMADE_CHARACTERS, "personas": personas
@@ -579,17 +568,17 @@ async def rpg_setup_page(request: Request, token: str):
 
 @app.get("/rpg/personas", response_class=HTMLResponse)
 async def rpg_personas_page(request: Request, token: str):
-    token_doc = await run_sync_db(lambda: rpg_web_tokens_collection.find_one({"token": token, "status": "pending"}))
+    token_doc = await rpg_web_tokens_collection.find_one({"token": token, "status": "pending"})
     if not token_doc:
         return HTMLResponse("<h1>Invalid Link</h1>", status_code=404)
     user_id = token_doc["user_id"]
-    personas = await run_sync_db(lambda: list(user_personas_collection.find({"user_id": user_id}, {"_id": 0})))
+    personas = await user_personas_collection.find({"user_id": user_id}, {"_id": 0}).to_list(length=None)
     personas = [serialize_persona(p) for p in personas]
     return templates.TemplateResponse("personas.html", {"request": request, "token": token, "personas": personas})
 
 @app.post("/api/rpg/persona/save")
 async def save_persona(data: PersonaModel):
-    token_doc = await run_sync_db(lambda: rpg_web_tokens_collection.find_one({"token": data.token}))
+    token_doc = await rpg_web_tokens_collection.find_one({"token": data.token})
     if not token_doc: raise HTTPException(403, "Invalid Token")
     user_id = token_doc["user_id"]
     if data.id:
@@ -598,7 +587,7 @@ async def save_persona(data: PersonaModel):
             "appearance": data.appearance, "personality": data.personality, "hobbies": data.hobbies,
             "backstory": data.backstory, "alignment": data.alignment, "stats": data.stats, "updated_at": datetime.utcnow()
         }
-        await run_sync_db(lambda: user_personas_collection.update_one({"id": data.id, "user_id": user_id}, {"$set": update_data}))
+        await user_personas_collection.update_one({"id": data.id, "user_id": user_id}, {"$set": update_data})
         return JSONResponse({"status": "updated", "id": data.id})
     else:
         new_id = str(uuid.uuid4())
@@ -608,22 +597,22 @@ async def save_persona(data: PersonaModel):
             "personality": data.personality, "hobbies": data.hobbies, "backstory": data.backstory,
             "alignment": data.alignment, "stats": data.stats, "created_at": datetime.utcnow()
         }
-        await run_sync_db(lambda: user_personas_collection.insert_one(persona_doc))
+        await user_personas_collection.insert_one(persona_doc)
         return JSONResponse({"status": "created", "id": new_id})
 
 @app.delete("/api/rpg/persona/delete/{persona_id}")
 async def delete_persona(persona_id: str, token: str):
-    token_doc = await run_sync_db(lambda: rpg_web_tokens_collection.find_one({"token": token}))
+    token_doc = await rpg_web_tokens_collection.find_one({"token": token})
     if not token_doc: raise HTTPException(403, "Invalid Token")
-    res = await run_sync_db(lambda: user_personas_collection.delete_one({"id": persona_id, "user_id": token_doc["user_id"]}))
+    res = await user_personas_collection.delete_one({"id": persona_id, "user_id": token_doc["user_id"]})
     if res.deleted_count == 0: return JSONResponse({"error": "Persona not found"}, status_code=404)
     return JSONResponse({"status": "deleted"})
 
 @app.post("/api/rpg/submit")
 async def submit_rpg_setup(data: RPGSetupData):
-    token_doc = await run_sync_db(lambda: rpg_web_tokens_collection.find_one_and_update(
+    token_doc = await rpg_web_tokens_collection.find_one_and_update(
         {"token": data.token, "status": "pending"}, {"$set": {"status": "submitted"}}
-    ))
+    )
     if not token_doc: raise HTTPException(status_code=400, detail="Invalid token.")
     if data.character.get("save_as_persona"):
         persona_doc = {
@@ -633,7 +622,7 @@ async def submit_rpg_setup(data: RPGSetupData):
             "hobbies": data.character.get("hobbies", ""), "backstory": data.character["backstory"],
             "alignment": data.character["alignment"], "stats": data.character["stats"], "created_at": datetime.utcnow()
         }
-        await run_sync_db(lambda: user_personas_collection.insert_one(persona_doc))
+        await user_personas_collection.insert_one(persona_doc)
     action_doc = {
         "type": "create_rpg_web", "guild_id": token_doc["guild_id"], "user_id": token_doc["user_id"],
         "status": "pending", "timestamp": datetime.utcnow(),
@@ -642,7 +631,7 @@ async def submit_rpg_setup(data: RPGSetupData):
             "story_mode": data.story_mode, "character": data.character
         }
     }
-    await run_sync_db(lambda: web_actions_collection.insert_one(action_doc))
+    await web_actions_collection.insert_one(action_doc)
     return JSONResponse({"status": "success", "message": "Adventure queued."})
 
 # --- CONTROL ROUTES ---
@@ -660,8 +649,13 @@ async def update_bot_config(data: ConfigRequest):
         if data.group_chat: update_fields["group_chat_enabled"] = (data.group_chat == "allow")
         if data.rpg_channel_id: update_fields["rpg_channel_id"] = int(data.rpg_channel_id)
         if not update_fields: return JSONResponse({"error": "No valid fields"}, status_code=400)
-        ai_config_collection.update_one({"_id": str(data.guild_id)}, {"$set": update_fields}, upsert=True)
-        live_activity_collection.insert_one({
+        await ai_config_collection.update_one({"_id": str(data.guild_id)}, {"$set": update_fields}, upsert=True)
+        # The bot caches guild configs in its own process; tell it to drop this one
+        await web_actions_collection.insert_one({
+            "type": "invalidate_config", "guild_id": str(data.guild_id), "status": "pending",
+            "created_at": datetime.utcnow(), "source": "dashboard"
+        })
+        await live_activity_collection.insert_one({
             "user": "Dashboard Admin", "guild": f"ID: {data.guild_id}", "action": "Updated Config", "timestamp": datetime.utcnow()
         })
         return JSONResponse({"status": "Configuration updated"})
@@ -674,8 +668,8 @@ async def reload_chat_module():
             "type": "reload_chat", "guild_id": "global", "status": "pending", 
             "created_at": datetime.utcnow(), "source": "dashboard"
         }
-        web_actions_collection.insert_one(action_doc)
-        live_activity_collection.insert_one({
+        await web_actions_collection.insert_one(action_doc)
+        await live_activity_collection.insert_one({
             "user": "Dashboard Admin", "guild": "Global", "action": "Triggered Reload", "timestamp": datetime.utcnow()
         })
         return JSONResponse({"status": "Reload signal sent."})
@@ -689,25 +683,81 @@ async def queue_admin_action(data: ActionRequest):
             "reason": data.reason, "setting_value": data.setting_value,
             "status": "pending", "created_at": datetime.utcnow(), "source": "dashboard"
         }
-        web_actions_collection.insert_one(action_doc)
-        live_activity_collection.insert_one({
+        await web_actions_collection.insert_one(action_doc)
+        await live_activity_collection.insert_one({
             "user": "Dashboard Admin", "guild": f"ID: {data.guild_id}", "action": f"Queued {data.action_type.upper()}", "timestamp": datetime.utcnow()
         })
         return JSONResponse({"status": f"Action '{data.action_type}' queued."})
     except Exception as e: return JSONResponse({"error": str(e)}, status_code=500)
 
+class DashboardBroadcaster:
+    """
+    One producer per worker for the /ws feed. Each tick runs the three dashboard queries once
+    and fans the result out to every connected client. Only sections whose content changed are
+    sent (the page updates overview / activities / logs independently), nothing is sent when
+    nothing changed, and the producer stops entirely while no client is connected.
+    """
+    def __init__(self, interval: float = 2.0):
+        self.interval = interval
+        self.clients = set()
+        self._sections = {}  # section -> encoded JSON last sent
+        self._task = None
+
+    async def subscribe(self, websocket: WebSocket):
+        self.clients.add(websocket)
+        if self._task is None or self._task.done():
+            # Cached sections are stale after an idle period; the first tick sends everything
+            self._sections = {}
+            self._task = asyncio.create_task(self._run())
+        elif self._sections:
+            await websocket.send_text(self._message(self._sections))
+
+    def unsubscribe(self, websocket: WebSocket):
+        self.clients.discard(websocket)
+
+    @staticmethod
+    def _message(sections: dict) -> str:
+        # Sections are already JSON-encoded; stitch them into one object without re-encoding
+        return "{" + ", ".join(f'"{k}": {v}' for k, v in sections.items()) + "}"
+
+    async def _send(self, websocket: WebSocket, message: str):
+        try:
+            await asyncio.wait_for(websocket.send_text(message), timeout=self.interval)
+        except Exception:
+            self.clients.discard(websocket)
+
+    async def _run(self):
+        while self.clients:
+            try:
+                overview, feed, logs = await asyncio.gather(
+                    fetch_overview(), fetch_live_feed(), fetch_recent_logs()
+                )
+                payload = {"overview": overview, "activities": feed, "logs": logs}
+                changed = {}
+                for key, value in payload.items():
+                    encoded = json.dumps(value, default=str)
+                    if self._sections.get(key) != encoded:
+                        changed[key] = encoded
+                if changed:
+                    self._sections.update(changed)
+                    message = self._message(changed)
+                    await asyncio.gather(*(self._send(ws, message) for ws in list(self.clients)))
+            except Exception as e:
+                print(f"Dashboard Broadcast Error: {e}")
+            await asyncio.sleep(self.interval)
+
+broadcaster = DashboardBroadcaster()
+
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
     try:
-        while True:
-            overview, feed, logs = await asyncio.gather(
-                run_sync_db(fetch_overview), run_sync_db(fetch_live_feed), run_sync_db(fetch_recent_logs)
-            )
-            payload = {"overview": overview, "activities": feed, "logs": logs}
-            await websocket.send_text(json.dumps(payload, default=str))
-            await asyncio.sleep(2)
+        await broadcaster.subscribe(websocket)
+        # The page never sends anything; this just waits for the disconnect
+        while True: await websocket.receive_text()
     except Exception: pass
+    finally:
+        broadcaster.unsubscribe(websocket)
 
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 8000))
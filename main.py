@@ -6,6 +6,7 @@ import asyncio
 import logging
 from dotenv import load_dotenv
 from utils.db import init_db
+from utils.http_client import http_clients
 import subprocess
 import sys
 
@@ -55,6 +56,10 @@ class AnTiMaBot(commands.Bot):
         except Exception as e:
             logger.error(f"Failed to sync slash commands: {e}")
 
+    async def close(self):
+        await super().close()
+        await http_clients.close()
+
     async def on_ready(self):
         logger.info(f'Logged in as {self.user} (ID: {self.user.id})')
         logger.info('------')
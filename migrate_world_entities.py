@@ -0,0 +1,29 @@
+# migrate_world_entities.py
+# Moves RPG world state from the nested rpg_world_state maps to one rpg_world_entities document
+# per NPC/location/quest/event. Safe to re-run; threads already migrated are skipped.
+# Usage: python migrate_world_entities.py [thread_id ...]
+import asyncio
+import sys
+from utils.db import init_db, async_rpg_world_state_collection
+from utils import world_store
+
+async def main(thread_ids):
+    if not thread_ids:
+        cursor = async_rpg_world_state_collection.find({"entity_store": {"$ne": True}}, {"thread_id": 1})
+        thread_ids = [doc["thread_id"] async for doc in cursor]
+
+    print(f"--- Migrating {len(thread_ids)} thread(s) ---")
+    total, failed = 0, 0
+    for tid in thread_ids:
+        try:
+            moved = await world_store.migrate_thread(tid)
+            total += moved
+            print(f"✅ {tid}: {moved} entities")
+        except Exception as e:
+            failed += 1
+            print(f"❌ {tid}: {e}")
+    print(f"\nDone. {total} entities moved, {failed} thread(s) failed.")
+
+if __name__ == "__main__":
+    init_db() # Ensures the rpg_world_entities indexes exist before writing
+    asyncio.run(main([int(a) for a in sys.argv[1:]]))
@@ -0,0 +1,138 @@
+# utils/card_pool.py
+import asyncio
+import collections
+import logging
+import os
+from datetime import datetime
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+# Refill a tag's pool when it drops below LOW, up to HIGH ready cards
+CARD_POOL_LOW = int(os.environ.get("CARD_POOL_LOW", "5"))
+CARD_POOL_HIGH = int(os.environ.get("CARD_POOL_HIGH", "20"))
+# Served image ids remembered in memory per tag (Mongo keeps them until served_at expires)
+CARD_POOL_RECENT = 1000
+# Consecutive failed/duplicate fetches before a refill gives up until the next pull
+CARD_POOL_MAX_MISSES = 5
+
+class CardPool:
+    """
+    Ready-to-serve gacha cards per gender tag, so a pull is a pop from memory instead of three
+    Safebooru round trips. `fetch(tag, exclude=ids)` produces a fully parsed card, avoiding the
+    given image ids where it can (get_random_danbooru_image); a background task per tag keeps the
+    pool between the low and high watermarks.
+
+    Every pooled card is also a document in `collection`, unique on (tag, image_id). Serving a
+    card stamps served_at, and a TTL index on served_at drops it after a while. This means:
+    - pooled cards survive restarts;
+    - a recently served image is refused as a duplicate when a refill fetches it again.
+    """
+    def __init__(self, collection, fetch, tags=("1girl", "1boy"), low: int = CARD_POOL_LOW, high: int = CARD_POOL_HIGH):
+        self.collection = collection
+        self.fetch = fetch
+        self.low = low
+        self.high = max(high, low)
+        self._cards = {tag: collections.deque() for tag in tags}
+        self._seen = {tag: set() for tag in tags}   # image ids pooled or recently served
+        self._recent = {tag: collections.deque() for tag in tags} # served ids, oldest first
+        self._fillers = {}
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._start())
+
+    def stop(self):
+        if self._task: self._task.cancel()
+        for task in list(self._fillers.values()): task.cancel()
+
+    async def _start(self):
+        try:
+            await self.load()
+        except Exception as e:
+            logger.error(f"Card pool load failed: {e}")
+        for tag in self._cards: self._maybe_refill(tag)
+
+    async def load(self):
+        """Restores pooled cards and recently served ids saved by a previous run."""
+        tags = list(self._cards)
+        async for doc in self.collection.find({"tag": {"$in": tags}}).sort("created_at", 1):
+            tag, image_id = doc["tag"], doc["image_id"]
+            if doc.get("served_at"): self._remember_served(tag, image_id)
+            else:
+                self._cards[tag].append(doc["card"])
+                self._seen[tag].add(image_id)
+        logger.info("Card pool loaded: " + ", ".join(f"{t}={len(c)}" for t, c in self._cards.items()))
+
+    def _remember_served(self, tag: str, image_id):
+        recent, seen = self._recent[tag], self._seen[tag]
+        recent.append(image_id)
+        seen.add(image_id)
+        while len(recent) > CARD_POOL_RECENT:
+            seen.discard(recent.popleft())
+
+    # --- SERVING ---
+
+    async def take(self, tag: str):
+        """A card for `tag`: popped from the pool, or fetched live if the pool is empty."""
+        cards = self._cards.get(tag)
+        if cards is None: return await self.fetch(tag)
+        card = cards.popleft() if cards else None
+        self._maybe_refill(tag)
+        if card is None: return await self._take_live(tag)
+
+        self._remember_served(tag, card.get("id"))
+        try:
+            await self.collection.update_one({"tag": tag, "image_id": card.get("id")}, {"$set": {"served_at": datetime.utcnow()}})
+        except Exception as e:
+            logger.warning(f"Card pool could not mark {card.get('id')} served: {e}")
+        return card
+
+    async def _take_live(self, tag: str):
+        """Empty pool: fetch while the user waits, still skipping recently served images."""
+        card = None
+        for _ in range(3):
+            card = await self.fetch(tag, exclude=self._seen[tag])
+            if not card or not card.get("image_url"): return card
+            if card.get("id") not in self._seen[tag]: break
+        self._remember_served(tag, card.get("id"))
+        try:
+            now = datetime.utcnow()
+            await self.collection.insert_one({"tag": tag, "image_id": card.get("id"), "card": card, "created_at": now, "served_at": now})
+        except Exception:
+            pass # Already recorded as served (or Mongo is down); the in-memory set still has it
+        return card
+
+    # --- REFILL ---
+
+    def _maybe_refill(self, tag: str):
+        task = self._fillers.get(tag)
+        if len(self._cards[tag]) < self.low and (task is None or task.done()):
+            self._fillers[tag] = asyncio.create_task(self._fill(tag))
+
+    async def _fill(self, tag: str):
+        cards, seen, misses = self._cards[tag], self._seen[tag], 0
+        while len(cards) < self.high and misses < CARD_POOL_MAX_MISSES:
+            try:
+                card = await self.fetch(tag, exclude=seen)
+            except Exception as e:
+                logger.warning(f"Card pool fetch for {tag} failed: {e}")
+                card = None
+            if not card or not card.get("image_url") or card.get("id") in seen:
+                misses += 1
+                continue
+            try:
+                await self.collection.insert_one({"tag": tag, "image_id": card["id"], "card": card, "created_at": datetime.utcnow()})
+            except DuplicateKeyError:
+                # Served within the TTL window (or pooled by another run)
+                seen.add(card["id"])
+                misses += 1
+                continue
+            except Exception as e:
+                logger.warning(f"Card pool could not persist {card['id']}: {e}")
+            seen.add(card["id"])
+            cards.append(card)
+            misses = 0
+        if misses >= CARD_POOL_MAX_MISSES:
+            logger.info(f"Card pool refill for {tag} paused at {len(cards)} cards after {misses} misses.")
@@ -0,0 +1,67 @@
+# utils/config_cache.py
+import time
+import logging
+from utils.db import async_ai_config_collection
+from utils.single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# How long a guild's ai_config document is trusted before it is re-read from Mongo.
+CONFIG_TTL_SECONDS = 60
+
+# guild_id (str) -> (expires_at, config dict)
+_cache = {}
+# A burst of messages on a cold guild triggers only one read
+_reads = SingleFlight()
+# guild_id (str) -> invalidation count; a read that straddles an invalidation is not cached
+_generations = {}
+_global_generation = 0
+# Callables notified with the guild_id (or None for "everything") whenever a config is invalidated
+_listeners = []
+
+async def get_guild_config(guild_id) -> dict:
+    """
+    Returns the ai_config document for a guild ({} if none), served from memory for up to CONFIG_TTL_SECONDS.
+    The returned dict is shared between callers: treat it as read-only.
+    """
+    key = str(guild_id)
+    entry = _cache.get(key)
+    if entry and entry[0] > time.monotonic():
+        return entry[1]
+
+    return await _reads.run(key, lambda: _read(key))
+
+async def _read(key: str) -> dict:
+    generation = (_global_generation, _generations.get(key, 0))
+    config = await async_ai_config_collection.find_one({"_id": key}) or {}
+    if generation == (_global_generation, _generations.get(key, 0)):
+        _cache[key] = (time.monotonic() + CONFIG_TTL_SECONDS, config)
+    return config
+
+def invalidate_guild_config(guild_id=None):
+    """Drops one guild's cached config, or the whole cache when guild_id is None."""
+    global _global_generation
+    if guild_id is None:
+        _global_generation += 1
+        _cache.clear()
+        _reads.forget()
+    else:
+        key = str(guild_id)
+        _generations[key] = _generations.get(key, 0) + 1
+        _cache.pop(key, None)
+        _reads.forget(key)
+    for listener in list(_listeners):
+        try: listener(guild_id)
+        except Exception as e: logger.error(f"Config listener failed: {e}")
+
+def add_invalidation_listener(listener):
+    _listeners.append(listener)
+
+def remove_invalidation_listener(listener):
+    if listener in _listeners: _listeners.remove(listener)
+
+async def update_guild_config(guild_id, fields: dict, upsert: bool = True):
+    """$set fields on a guild's config and invalidate the cached copy."""
+    result = await async_ai_config_collection.update_one({"_id": str(guild_id)}, {"$set": fields}, upsert=upsert)
+    invalidate_guild_config(guild_id)
+    return result
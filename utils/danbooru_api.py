@@ -1,10 +1,18 @@
 # utils/danbooru_api.py
 import aiohttp
+import asyncio
+import collections
+import html as html_lib
+import json
 import logging
+import os
 import random
-import socket
+import re
+import time
 import xml.etree.ElementTree as ET
 from bs4 import BeautifulSoup
+from utils.http_client import http_clients
+from utils.tag_index import tag_index
 
 logger = logging.getLogger(__name__)
 
@@ -23,70 +31,129 @@ SUGGESTED_TAGS = [
     "touhou", "genshin_impact", "hololive", "azur_lane", "arknights"
 ]
 
+# Local tag index: downloaded in the background, most-used tags first, until counts fall below the floor
+TAG_INDEX_REFRESH_HOURS = float(os.environ.get("TAG_INDEX_REFRESH_HOURS", "24"))
+TAG_INDEX_MIN_COUNT = int(os.environ.get("TAG_INDEX_MIN_COUNT", "20"))
+TAG_INDEX_MAX_PAGES = int(os.environ.get("TAG_INDEX_MAX_PAGES", "200"))
+TAG_PAGE_SIZE = 1000
+
+_index_task = None
+
+# Random pulls pick a page of POST_PAGE_SIZE posts across the tag's real post count (re-read every
+# few hours); the API refuses offsets past MAX_POST_OFFSET
+POST_PAGE_SIZE = 100
+MAX_POST_OFFSET = 200000
+POST_COUNT_TTL_SECONDS = 6 * 3600
+_post_counts = {} # tags -> (count, fetched_at)
+
 async def danbooru_tag_autocomplete(current: str) -> list:
     """
-    Robust autocomplete using 'tags.json' with proper parameter handling.
+    Autocomplete served from the local tag index (no network on the keystroke path).
+    Until the first download finishes, only the suggested tags are offered.
     """
     if not current:
         return [{"name": tag, "value": tag} for tag in SUGGESTED_TAGS]
 
-    url = DANBOORU_URL
-    
-    # Safebooru Autocomplete
-    params = {
-        "page": "dapi",
-        "s": "tag",
-        "q": "index",
-        "json": "1",
-        "name_pattern": f"{current}%",
-        "limit": "10",
-        "order": "count" 
-    }
-    
-    connector = aiohttp.TCPConnector(ssl=False, family=socket.AF_INET)
-    
+    if not len(tag_index) or tag_index.age() > TAG_INDEX_REFRESH_HOURS * 3600:
+        ensure_tag_index()
+    if not len(tag_index):
+        prefix = current.strip().lower().replace(" ", "_")
+        return [{"name": tag, "value": tag} for tag in SUGGESTED_TAGS if tag.startswith(prefix)]
+    return [{"name": tag, "value": tag} for tag in tag_index.search(current)]
+
+def ensure_tag_index():
+    """Starts a background load/refresh of the tag index unless one is already running."""
+    global _index_task
+    if _index_task is None or _index_task.done():
+        _index_task = asyncio.create_task(update_tag_index())
+    return _index_task
+
+async def update_tag_index(force: bool = False):
+    """Loads the saved index once, then re-downloads it when it is older than TAG_INDEX_REFRESH_HOURS."""
     try:
-        async with aiohttp.ClientSession(connector=connector) as session:
-            async with session.get(url, params=params, headers=HEADERS, timeout=10) as response:
-                if response.status != 200:
-                    return []
-                # Safebooru sends text/xml header for JSON sometimes, force parse
-                text = await response.text()
-                try:
-                    data = await response.json(content_type=None)
-                    return [{"name": tag["name"], "value": tag["name"]} for tag in data]
-                except:
-                    # Fallback to XML parsing
-                    try:
-                        root = ET.fromstring(text)
-                        tags = []
-                        for tag_elem in root.findall("tag"):
-                             name = tag_elem.get("name")
-                             if name:
-                                 tags.append({"name": name, "value": name})
-                        return tags
-                    except Exception as e:
-                        logger.error(f"Autocomplete XML parse failed: {e}")
-                        return []
+        if not len(tag_index): await asyncio.to_thread(tag_index.load)
+        if not force and tag_index.age() < TAG_INDEX_REFRESH_HOURS * 3600: return
+        pairs = await download_tags()
+        if not pairs: return
+        await asyncio.to_thread(tag_index.replace, pairs)
+        await asyncio.to_thread(tag_index.save)
+        logger.info(f"Tag index refreshed: {len(tag_index)} tags.")
     except Exception as e:
-        logger.error(f"[Autocomplete Error] {e}")
+        logger.error(f"Tag index refresh failed: {e}")
+
+def _parse_tags(text: str) -> list:
+    """[(name, count)] from a tag API page. Safebooru sends JSON or XML depending on its mood."""
+    try:
+        return [(tag["name"], int(tag.get("count") or 0)) for tag in json.loads(text) if tag.get("name")]
+    except (ValueError, TypeError, AttributeError):
+        pass
+    try:
+        root = ET.fromstring(text)
+        return [(el.get("name"), int(el.get("count") or 0)) for el in root.findall("tag") if el.get("name")]
+    except Exception as e:
+        logger.error(f"Tag page parse failed: {e}")
         return []
 
-async def get_post_html(session, post_id):
+async def download_tags() -> list:
+    """Pages through Safebooru's tag list (ordered by post count) and keeps tags above TAG_INDEX_MIN_COUNT."""
+    pairs = []
+    for pid in range(TAG_INDEX_MAX_PAGES):
+        params = {
+            "page": "dapi",
+            "s": "tag",
+            "q": "index",
+            "json": "1",
+            "limit": str(TAG_PAGE_SIZE),
+            "order": "count",
+            "pid": str(pid)
+        }
+        async with http_clients.get(DANBOORU_URL, client="safebooru", params=params, headers=HEADERS) as response:
+            if response.status != 200:
+                logger.warning(f"Tag download stopped at page {pid}: HTTP {response.status}")
+                break
+            page = _parse_tags(await response.text())
+        pairs.extend(p for p in page if p[1] >= TAG_INDEX_MIN_COUNT)
+        if len(page) < TAG_PAGE_SIZE or max((c for _, c in page), default=0) < TAG_INDEX_MIN_COUNT: break
+        await asyncio.sleep(0.5) # Background job: stay polite to the API
+    return pairs
+
+async def get_post_html(post_id):
     """Fetches the HTML page for a specific post to extract detailed tags."""
     url = f"{DANBOORU_URL}?page=post&s=view&id={post_id}"
     try:
-        async with session.get(url, headers=HEADERS, timeout=10) as response:
+        async with http_clients.get(url, client="safebooru", headers=HEADERS, timeout=aiohttp.ClientTimeout(total=10)) as response:
             if response.status == 200:
                 return await response.text()
     except Exception as e:
         logger.error(f"Failed to fetch HTML for post {post_id}: {e}")
     return None
 
-async def get_random_danbooru_image(gender_tag: str = "1girl", nsfw: bool = False):
+async def get_post_count(tags: str) -> int:
+    """Posts matching `tags`, from the XML API's count attribute; 0 if unknown."""
+    cached = _post_counts.get(tags)
+    if cached and time.time() - cached[1] < POST_COUNT_TTL_SECONDS: return cached[0]
+    params = {"page": "dapi", "s": "post", "q": "index", "limit": "0", "tags": tags}
+    try:
+        async with http_clients.get(DANBOORU_URL, client="safebooru", params=params, headers=HEADERS, timeout=aiohttp.ClientTimeout(total=10)) as response:
+            if response.status != 200: return 0
+            count = int(ET.fromstring(await response.text()).get("count") or 0)
+    except Exception as e:
+        logger.warning(f"Post count for '{tags}' failed: {type(e).__name__}: {e}")
+        return 0
+    _post_counts[tags] = (count, time.time())
+    return count
+
+def _pick_post(posts, exclude):
+    """A random post with a file, preferring ones not in `exclude`."""
+    posts = [p for p in posts if p.get("file_url")]
+    fresh = [p for p in posts if p.get("id") not in exclude]
+    return random.choice(fresh or posts) if posts else None
+
+async def get_random_danbooru_image(gender_tag: str = "1girl", nsfw: bool = False, exclude=()):
     """
     Fetches a random image from Safebooru (as Danbooru fallback).
-    Safebooru does not support 'random=true' well, so we use PID randomization.
+    Safebooru does not support 'random=true' well, so we use PID randomization: a random page of
+    POST_PAGE_SIZE posts across the tag's post count, then a random post on it that is not in `exclude`.
     """
     # Safebooru is SFW only.
     if nsfw:
@@ -94,59 +161,161 @@ async def get_random_danbooru_image(gender_tag: str = "1girl", nsfw: bool = Fals
     
     # Core tags: gender + solo (to avoid crowds or comics often)
     search_tags = f"{gender_tag}"
+    url = DANBOORU_URL
+    params = {
+        "page": "dapi",
+        "s": "post",
+        "q": "index",
+        "json": "1",
+        "limit": str(POST_PAGE_SIZE),
+        "tags": search_tags,
+        "pid": "0"
+    }
     
-    connector = aiohttp.TCPConnector(ssl=False, family=socket.AF_INET)
-    
-    async with aiohttp.ClientSession(connector=connector, trust_env=True) as session:
-        # STRATEGY 1: Random Page (Safebooru has ~20000 pages for popular queries)
-        try:
-            random_page = random.randint(0, 100) # 0-indexed
-            url = DANBOORU_URL
-            params = {
-                "page": "dapi",
-                "s": "post",
-                "q": "index",
-                "json": "1",
-                "limit": "1",
-                "tags": search_tags,
-                "pid": str(random_page)
-            }
-            
-            async with session.get(url, params=params, headers=HEADERS, timeout=10) as response:
-                if response.status == 200:
-                    # Safebooru sometimes sends text/xml content-type for JSON
-                    posts = await response.json(content_type=None)
-                    if posts:
-                        post = posts[0]
-                        # Fetch HTML for detailed metadata
-                        html = await get_post_html(session, post['id'])
-                        return process_post(post, gender_tag, html)
-                    else:
-                        logger.info("Strategy 1 (Random Page) returned empty. Trying Page 0.")
+    # STRATEGY 1: Random Page (Safebooru has thousands of pages for popular queries)
+    try:
+        count = await get_post_count(search_tags)
+        pages = max(1, min(count, MAX_POST_OFFSET) // POST_PAGE_SIZE) if count else 100
+        params["pid"] = str(random.randrange(pages)) # 0-indexed
+        
+        async with http_clients.get(url, client="safebooru", params=params, headers=HEADERS, timeout=aiohttp.ClientTimeout(total=10)) as response:
+            if response.status == 200:
+                # Safebooru sometimes sends text/xml content-type for JSON
+                post = _pick_post(await response.json(content_type=None) or [], exclude)
+                if post:
+                    # Fetch the post page for detailed metadata (cached per post)
+                    metadata = await get_post_metadata(post['id'])
+                    return process_post(post, gender_tag, metadata=metadata)
                 else:
-                    text = await response.text()
-                    logger.warning(f"Strategy 1 failed with {response.status}. Body: {text[:200]}...")
+                    logger.info("Strategy 1 (Random Page) returned empty. Trying Page 0.")
+            else:
+                text = await response.text()
+                logger.warning(f"Strategy 1 failed with {response.status}. Body: {text[:200]}...")
 
-        except Exception as e:
-            logger.error(f"Strategy 1 Error: {type(e).__name__}: {e}")
+    except Exception as e:
+        logger.error(f"Strategy 1 Error: {type(e).__name__}: {e}")
 
-        # STRATEGY 2: Fallback to Page 0
-        try:
-            params["pid"] = "0"
-            async with session.get(url, params=params, headers=HEADERS, timeout=10) as response:
-                if response.status == 200:
-                    posts = await response.json(content_type=None)
-                    if posts:
-                        post = posts[0]
-                        html = await get_post_html(session, post['id'])
-                        return process_post(post, gender_tag, html)
-        except Exception as e:
-            logger.error(f"Strategy 2 Error: {type(e).__name__}: {e}")
+    # STRATEGY 2: Fallback to Page 0
+    try:
+        params["pid"] = "0"
+        async with http_clients.get(url, client="safebooru", params=params, headers=HEADERS, timeout=aiohttp.ClientTimeout(total=10)) as response:
+            if response.status == 200:
+                post = _pick_post(await response.json(content_type=None) or [], exclude)
+                if post:
+                    metadata = await get_post_metadata(post['id'])
+                    return process_post(post, gender_tag, metadata=metadata)
+    except Exception as e:
+        logger.error(f"Strategy 2 Error: {type(e).__name__}: {e}")
 
     return None
 
-def process_post(post, gender_tag, html=None):
-    """Helper to extract data safely from Safebooru response, optionally using HTML for better metadata."""
+# --- POST METADATA ---
+# Safebooru's post API only returns an untyped tag string, so artist/series/character come from the
+# post page's #tag-sidebar. Only the sidebar and #stats are parsed, and results are cached per post.
+POST_METADATA_CACHE_SIZE = 2048
+_metadata_cache = collections.OrderedDict() # post_id -> metadata dict
+
+_SIDEBAR_START = re.compile(r"<ul\b[^>]*\bid=[\"']?tag-sidebar\b", re.I)
+_STATS_START = re.compile(r"<div\b[^>]*\bid=[\"']?stats\b", re.I)
+_NESTING = {"ul": re.compile(r"<(/?)ul\b", re.I), "div": re.compile(r"<(/?)div\b", re.I)}
+# Only artist/copyright/character entries matter; general tags are never visited. The type must be a
+# whole class token (start of the value or after whitespace, then whitespace or the value's end)
+_TYPED_LI = re.compile(r"""<li\b[^>]*?\sclass\s*=\s*["']?(?:[^"'>]*?\s)?tag-type-(artist|copyright|character)(?=[\s"'>])[^>]*>""", re.I)
+_NEXT_LI = re.compile(r"<li\b", re.I)
+_LINK = re.compile(r"""<a\b[^>]*?\bhref\s*=\s*["']?([^"'\s>]*)[^>]*>(.*?)</a>""", re.I | re.S)
+_ANY_TAG = re.compile(r"<[^>]+>")
+
+def _element_span(html: str, start_pattern, tag: str):
+    """(start, end) of one element, found by counting its own open/close tags; None if absent."""
+    match = start_pattern.search(html)
+    if not match: return None
+    depth = 0
+    for m in _NESTING[tag].finditer(html, match.start()):
+        depth += -1 if m.group(1) else 1
+        if depth <= 0: return match.start(), m.start()
+    return match.start(), len(html)
+
+def _text(fragment: str) -> str:
+    return html_lib.unescape(_ANY_TAG.sub("", fragment))
+
+def extract_post_metadata(html: str) -> dict:
+    """
+    Artist/series/character (top 2 each) and score from a post page; None where the page has nothing.
+    Reads only the #tag-sidebar and #stats elements instead of parsing the whole page.
+    """
+    meta = {"character": None, "series": None, "artist": None, "score": None}
+    span = _element_span(html, _SIDEBAR_START, "ul")
+    if span:
+        found = {"artist": [], "copyright": [], "character": []}
+        for li in _TYPED_LI.finditer(html, span[0], span[1]):
+            nxt = _NEXT_LI.search(html, li.end(), span[1])
+            li_end = nxt.start() if nxt else span[1]
+            for link in _LINK.finditer(html, li.end(), li_end):
+                href = html_lib.unescape(link.group(1))
+                if 'page=post' in href and 's=list' in href:
+                    found[li.group(1).lower()].append(_text(link.group(2)).replace("_", " ").title())
+                    break
+        if found["artist"]: meta["artist"] = ", ".join(found["artist"][:2])
+        if found["copyright"]: meta["series"] = ", ".join(found["copyright"][:2])
+        if found["character"]: meta["character"] = ", ".join(found["character"][:2])
+
+    span = _element_span(html, _STATS_START, "div")
+    if span:
+        # Safebooru stats: "Score: 0 (vote up) Favorites: 0"
+        text = _text(html[span[0]:span[1]])
+        if "Score:" in text:
+            try: meta["score"] = int(text.split("Score:")[1].split()[0])
+            except: pass
+    return meta
+
+def extract_post_metadata_bs4(html: str) -> dict:
+    """Reference extraction over the whole page with BeautifulSoup (used by benchmark_tag_extraction.py)."""
+    meta = {"character": None, "series": None, "artist": None, "score": None}
+    soup = BeautifulSoup(html, 'html.parser')
+    tag_sidebar = soup.find('ul', id='tag-sidebar')
+    if tag_sidebar:
+        artists, copyrights, characters = [], [], []
+        for li in tag_sidebar.find_all('li'):
+            classes = li.get('class', [])
+            tag_name = None
+            for a in li.find_all('a'):
+                if 'page=post' in a.get('href', '') and 's=list' in a.get('href', ''):
+                    tag_name = a.text.replace("_", " ").title()
+                    break
+            if not tag_name: continue
+            if 'tag-type-artist' in classes: artists.append(tag_name)
+            elif 'tag-type-copyright' in classes: copyrights.append(tag_name)
+            elif 'tag-type-character' in classes: characters.append(tag_name)
+        if artists: meta["artist"] = ", ".join(artists[:2])
+        if copyrights: meta["series"] = ", ".join(copyrights[:2])
+        if characters: meta["character"] = ", ".join(characters[:2])
+
+    stats_div = soup.find('div', id='stats')
+    if stats_div and "Score:" in stats_div.text:
+        try: meta["score"] = int(stats_div.text.split("Score:")[1].split()[0])
+        except: pass
+    return meta
+
+async def get_post_metadata(post_id):
+    """Cached metadata for a post; fetches and parses its page on a miss (failures are not cached)."""
+    meta = _metadata_cache.get(post_id)
+    if meta is not None:
+        _metadata_cache.move_to_end(post_id)
+        return meta
+    html = await get_post_html(post_id)
+    if not html: return None
+    try:
+        meta = extract_post_metadata(html)
+    except Exception as e:
+        logger.error(f"HTML Parsing Error: {e}")
+        return None
+    _metadata_cache[post_id] = meta
+    while len(_metadata_cache) > POST_METADATA_CACHE_SIZE:
+        _metadata_cache.popitem(last=False)
+    return meta
+
+def process_post(post, gender_tag, html=None, metadata=None):
+    """Helper to extract data safely from Safebooru response, optionally using page metadata (or raw HTML)."""
     file_url = post.get("file_url")
     
     if not file_url:
@@ -158,61 +327,19 @@ def process_post(post, gender_tag, html=None):
     artist = "Unknown Artist"
     score = post.get("score") or 0
     
-    if html:
+    if metadata is None and html:
         try:
-            soup = BeautifulSoup(html, 'html.parser')
-            
-            # Extract Tags from Sidebar
-            tag_sidebar = soup.find('ul', id='tag-sidebar')
-            if tag_sidebar:
-                artists = []
-                copyrights = []
-                characters = []
-                
-                for li in tag_sidebar.find_all('li'):
-                    classes = li.get('class', [])
-                    
-                    # Tag Name Extraction (Safebooru uses standard gelbooru style: <a href="...&tags=tagname">tagname</a>)
-                    # Often the second link is the search link.
-                    # Text usually works but might include count.
-                    links = li.find_all('a')
-                    tag_name = None
-                    for a in links:
-                        # Looking for the search link
-                        if 'page=post' in a.get('href', '') and 's=list' in a.get('href', ''):
-                            tag_name = a.text.replace("_", " ").title()
-                            break
-                    
-                    if not tag_name: continue
-
-                    if 'tag-type-artist' in classes:
-                        artists.append(tag_name)
-                    elif 'tag-type-copyright' in classes:
-                        copyrights.append(tag_name)
-                    elif 'tag-type-character' in classes:
-                        characters.append(tag_name)
-
-                if artists: artist = ", ".join(artists[:2]) # Top 2 artists
-                if copyrights: series = ", ".join(copyrights[:2]) # Top 2 series
-                if characters: character = ", ".join(characters[:2]) # Top 2 characters
-            
-            # Extract Stats (Score/Favorites) if available in text (harder on Safebooru)
-            # Safebooru stats: "Score: 0 (vote up) Favorites: 0"
-            stats_div = soup.find('div', id='stats')
-            if stats_div:
-                text = stats_div.text
-                if "Score:" in text:
-                    # Very rough parsing
-                    try:
-                        score_text = text.split("Score:")[1].split()[0]
-                        score = int(score_text)
-                    except: pass
-
+            metadata = extract_post_metadata(html)
         except Exception as e:
             logger.error(f"HTML Parsing Error: {e}")
+    if metadata:
+        character = metadata["character"] or character
+        series = metadata["series"] or series
+        artist = metadata["artist"] or artist
+        if metadata["score"] is not None: score = metadata["score"]
 
     # Fallback to tag parsing if HTML failed or returned nothing useful
-    if character == "Original Character" and not html:
+    if character == "Original Character" and not metadata:
         tags_string = post.get("tags", "")
         tag_list = tags_string.split(" ")
         potential_names = [t for t in tag_list if "(" in t]
@@ -1,6 +1,8 @@
 # utils/db.py
 import os
 from pymongo import MongoClient
+from pymongo.errors import OperationFailure
+from motor.motor_asyncio import AsyncIOMotorClient
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -9,18 +11,27 @@ MONGO_URI = os.getenv("MONGO_URI")
 DB_NAME = "antima_db"
 
 if not MONGO_URI:
-    client = MongoClient("mongodb://localhost:27017/")
-else:
-    client = MongoClient(MONGO_URI)
+    MONGO_URI = "mongodb://localhost:27017/"
 
+# Dashboard log buckets older than this are removed by a TTL index
+LOG_RETENTION_DAYS = int(os.getenv("LOG_RETENTION_DAYS", "30"))
+
+# Sync client: startup indexing, standalone scripts and the few sync-only call sites (tools, timezone lookups).
+client = MongoClient(MONGO_URI)
 db = client[DB_NAME]
 
+# Async client: everything running on the Discord / FastAPI event loop must use this one.
+# Motor binds to the running loop lazily, so importing this module before the loop starts is safe.
+async_client = AsyncIOMotorClient(MONGO_URI)
+async_db = async_client[DB_NAME]
+
 # --- COLLECTIONS ---
 ai_config_collection = db["ai_config"]
 ai_personal_memories_collection = db["ai_personal_memories"]
 ai_global_memories_collection = db["ai_global_memories"]
 server_lore_collection = db["server_lore"]
 search_debug_collection = db["search_debug"] 
+search_cache_collection = db["search_cache"] # Web search summaries, hits and scraped pages (per-doc expires_at)
 
 # RPG Core
 rpg_sessions_collection = db["rpg_sessions"]
@@ -31,10 +42,14 @@ user_personas_collection = db["user_personas"]
 # RPG Extended Memory & State
 rpg_vector_memory_collection = db["rpg_vector_memory"] # Stores embeddings
 rpg_world_state_collection = db["rpg_world_state"]   # Stores detailed NPC/Location sheets
+rpg_world_entities_collection = db["rpg_world_entities"] # One doc per NPC/location/quest/event (entity-store threads)
+rpg_embedding_cache_collection = db["rpg_embedding_cache"] # Content-hash -> embedding
+rpg_world_snapshots_collection = db["rpg_world_snapshots"] # Per-turn world-state checkpoints + deltas
 
 # Anime Gacha System
 anime_gacha_users_collection = db["anime_gacha_users"]       # Currency, stats, cooldowns
 anime_gacha_inventory_collection = db["anime_gacha_inventory"] # Owned cards
+anime_gacha_card_pool_collection = db["anime_gacha_card_pool"] # Prefetched cards + recently served ids
 
 stats_collection = db["bot_stats"] 
 live_activity_collection = db["live_activity"]
@@ -44,6 +59,40 @@ user_timezones_collection = db["user_timezones"]
 reminders_collection = db["reminders"]
 logs_collection = db["improved_logs"]
 
+# --- ASYNC COLLECTIONS (Motor) ---
+# Same collections as above. Await these from cogs, tasks and dashboard routes instead of
+# pushing PyMongo calls through run_in_executor.
+async_ai_config_collection = async_db["ai_config"]
+async_ai_personal_memories_collection = async_db["ai_personal_memories"]
+async_ai_global_memories_collection = async_db["ai_global_memories"]
+async_server_lore_collection = async_db["server_lore"]
+async_search_debug_collection = async_db["search_debug"]
+async_search_cache_collection = async_db["search_cache"]
+
+async_rpg_sessions_collection = async_db["rpg_sessions"]
+async_rpg_inventory_collection = async_db["rpg_inventory"]
+async_rpg_web_tokens_collection = async_db["rpg_web_tokens"]
+async_user_personas_collection = async_db["user_personas"]
+
+async_rpg_vector_memory_collection = async_db["rpg_vector_memory"]
+async_rpg_world_state_collection = async_db["rpg_world_state"]
+async_rpg_world_entities_collection = async_db["rpg_world_entities"]
+async_rpg_debug_terminal_collection = async_db["rpg_debug_terminal"]
+async_rpg_embedding_cache_collection = async_db["rpg_embedding_cache"]
+async_rpg_world_snapshots_collection = async_db["rpg_world_snapshots"]
+
+async_anime_gacha_users_collection = async_db["anime_gacha_users"]
+async_anime_gacha_inventory_collection = async_db["anime_gacha_inventory"]
+async_anime_gacha_card_pool_collection = async_db["anime_gacha_card_pool"]
+
+async_stats_collection = async_db["bot_stats"]
+async_live_activity_collection = async_db["live_activity"]
+async_web_actions_collection = async_db["web_actions"]
+
+async_user_timezones_collection = async_db["user_timezones"]
+async_reminders_collection = async_db["reminders"]
+async_logs_collection = async_db["improved_logs"]
+
 def init_db():
     try:
         client.admin.command('ping')
@@ -57,6 +106,14 @@ def init_db():
         
         # 2. World State: Always 1:1 with thread_id
         rpg_world_state_collection.create_index("thread_id", unique=True)
+
+        # 2b. World Entities: keyed lookups plus the filters the world sheet builds on
+        rpg_world_entities_collection.create_index([("thread_id", 1), ("category", 1), ("key", 1)], unique=True)
+        rpg_world_entities_collection.create_index([("thread_id", 1), ("category", 1), ("status_key", 1)])
+        rpg_world_entities_collection.create_index([("thread_id", 1), ("category", 1), ("loc_key", 1)])
+        
+        # 2c. AI Config: the proactive chat scheduler loads (channel, next_chat_time) at startup
+        ai_config_collection.create_index([("channel", 1), ("next_chat_time", 1)])
         
         # 3. Web Actions: Poller queries by status+type every 3 seconds
         web_actions_collection.create_index([("status", 1), ("type", 1)])
@@ -64,9 +121,46 @@ def init_db():
         # 4. Vector Memory: Frequent lookups by thread_id
         rpg_vector_memory_collection.create_index("thread_id")
 
+        # 4b. Embedding Cache: keyed by content hash (_id); entries unused for 90 days age out.
+        # Hits refresh last_used; the TTL used to sit on created_at, which expired hot entries too.
+        try:
+            rpg_embedding_cache_collection.drop_index("created_at_1")
+        except OperationFailure:
+            pass
+        rpg_embedding_cache_collection.update_many({"last_used": {"$exists": False}}, [{"$set": {"last_used": "$created_at"}}])
+        rpg_embedding_cache_collection.create_index("last_used", expireAfterSeconds=90 * 24 * 3600)
+
+        # 4c. World Snapshots: one doc per (thread, turn); restores seek the nearest checkpoint
+        rpg_world_snapshots_collection.create_index([("thread_id", 1), ("turn_id", 1)], unique=True)
+        rpg_world_snapshots_collection.create_index([("thread_id", 1), ("kind", 1), ("turn_id", -1)])
+
+        # 4d. Logs: TTL retention on bucket creation time (collMod if the retention was changed)
+        try:
+            logs_collection.create_index("created_at", expireAfterSeconds=LOG_RETENTION_DAYS * 24 * 3600)
+        except OperationFailure:
+            db.command("collMod", logs_collection.name, index={"keyPattern": {"created_at": 1}, "expireAfterSeconds": LOG_RETENTION_DAYS * 24 * 3600})
+
+        # 4e. Reminders: the reminder wheel pages in by due time
+        reminders_collection.create_index("due_at")
+
+        # 4f. Search Cache: each entry expires at its own expires_at (freshness depends on the query)
+        search_cache_collection.create_index("expires_at", expireAfterSeconds=0)
+
         # 5. Gacha System
         anime_gacha_users_collection.create_index("user_id", unique=True)
         anime_gacha_inventory_collection.create_index([("user_id", 1), ("image_id", 1)], unique=True)
+        # Inventory pages walk (claimed_at, _id) newest-first; leaderboards read the users' collection summaries
+        anime_gacha_inventory_collection.create_index([("user_id", 1), ("claimed_at", -1), ("_id", -1)])
+        # (field, user_id): the global board walks the field; a server board also filters user_id in the index
+        for field in ("collection.value", "collection.count", "collection.by_rarity.LEGENDARY"):
+            try:
+                anime_gacha_users_collection.drop_index(f"{field}_-1") # Superseded by the compound index
+            except OperationFailure:
+                pass
+            anime_gacha_users_collection.create_index([(field, -1), ("user_id", 1)])
+        # Card pool: an image is pooled once per tag; served cards block re-pooling until served_at expires
+        anime_gacha_card_pool_collection.create_index([("tag", 1), ("image_id", 1)], unique=True)
+        anime_gacha_card_pool_collection.create_index("served_at", expireAfterSeconds=7 * 24 * 3600)
         
         print("✅ Database Indexes Verified.")
         
@@ -0,0 +1,127 @@
+# utils/event_bus.py
+"""
+Wake-ups for the loops that used to poll Mongo every few seconds.
+
+A topic is one change stream ($match on a collection) shared by every subscriber in the
+process. Subscribers still do their own query to pick up work; the bus only tells them *when*
+to look, so nothing is lost if an event is missed:
+
+    sub = event_bus.subscribe("web_actions", async_web_actions_collection, {"operationType": "insert"})
+    while True:
+        ...process pending documents...
+        await sub.wait(3)   # woken by the stream, or after 3s when change streams are unavailable
+
+Change streams need a replica set (or mongos). On a standalone mongod, or with
+EVENT_BUS_MODE=poll, wait() simply sleeps for the given poll interval as before. While a stream
+is healthy, wait() still returns every EVENT_BUS_RESYNC_SECONDS as a safety net.
+"""
+import os
+import asyncio
+from utils.db import async_client
+
+EVENT_BUS_MODE = os.environ.get("EVENT_BUS_MODE", "auto")  # "auto" or "poll"
+EVENT_BUS_RESYNC_SECONDS = float(os.environ.get("EVENT_BUS_RESYNC_SECONDS", "60"))
+
+class Subscription:
+    def __init__(self, topic, predicate=None):
+        self.topic = topic
+        # Optional filter on the changed document (inserts carry it as fullDocument)
+        self.predicate = predicate
+        self._event = asyncio.Event()
+
+    def notify(self, change: dict = None):
+        if change is None or self.predicate is None or self.predicate(change.get("fullDocument") or {}):
+            self._event.set()
+
+    async def wait(self, poll_seconds: float) -> bool:
+        """Returns True when woken by an event, False when the interval ran out."""
+        timeout = max(poll_seconds, EVENT_BUS_RESYNC_SECONDS) if self.topic.streaming else poll_seconds
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout=timeout)
+            woke = True
+        except asyncio.TimeoutError:
+            woke = False
+        # Cleared before the caller queries, so an event arriving mid-query triggers another pass
+        self._event.clear()
+        return woke
+
+    def close(self):
+        self.topic.remove(self)
+
+class Topic:
+    def __init__(self, bus, name: str, collection, match: dict):
+        self.bus = bus
+        self.name = name
+        self.collection = collection
+        self.match = match
+        self.subscribers = set()
+        self.streaming = False
+        self._task = None
+
+    def add(self, sub: Subscription):
+        self.subscribers.add(sub)
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def remove(self, sub: Subscription):
+        self.subscribers.discard(sub)
+        if not self.subscribers and self._task:
+            self._task.cancel()
+            self._task = None
+            self.streaming = False
+
+    def _wake_all(self):
+        for sub in list(self.subscribers): sub.notify()
+
+    async def _run(self):
+        if not await self.bus.supports_change_streams(): return
+        backoff = 1
+        while True:
+            try:
+                async with self.collection.watch([{"$match": self.match}]) as stream:
+                    self.streaming = True
+                    backoff = 1
+                    # Anything written before the stream opened (or while it was down) is picked up by a re-query
+                    self._wake_all()
+                    async for change in stream:
+                        for sub in list(self.subscribers): sub.notify(change)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if self.streaming:
+                    print(f"⚠️ Event bus '{self.name}' lost its change stream ({e}); polling until it reconnects.")
+                self.streaming = False
+                # Waiters may be sitting on the long resync timeout; let them fall back to polling now
+                self._wake_all()
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 60)
+
+class EventBus:
+    def __init__(self):
+        self._topics = {}
+        self._supported = None
+
+    async def supports_change_streams(self) -> bool:
+        if self._supported is not None: return self._supported
+        if EVENT_BUS_MODE == "poll":
+            self._supported = False
+            return False
+        try:
+            info = await async_client.admin.command("ismaster")
+        except Exception:
+            return False # Not cached: try again on the next subscription
+        self._supported = bool(info.get("setName")) or info.get("msg") == "isdbgrid"
+        print(f"📡 Event bus: {'change streams' if self._supported else 'standalone mongod, polling fallback'}.")
+        return self._supported
+
+    def subscribe(self, name: str, collection, match: dict, predicate=None) -> Subscription:
+        """Must be called from the event loop. Topics are keyed by name; the first subscriber defines collection/match."""
+        topic = self._topics.get(name)
+        if topic is None:
+            topic = self._topics[name] = Topic(self, name, collection, match)
+        sub = Subscription(topic, predicate)
+        topic.add(sub)
+        return sub
+
+# One bus per process (the bot and each dashboard worker get their own)
+event_bus = EventBus()
@@ -0,0 +1,107 @@
+# utils/http_client.py
+"""
+Process-wide outbound HTTP. Each named client is one aiohttp session whose connector pools
+keep-alive connections per host and caches DNS, so repeated calls to the same API skip the
+lookup and TLS handshake. The bot closes every session on shutdown (AnTiMaBot.close).
+
+    async with http_clients.get(url, params=params) as resp:
+        data = await resp.json()
+"""
+import asyncio
+import contextlib
+import logging
+import os
+import random
+import socket
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+HTTP_TIMEOUT_SECONDS = float(os.environ.get("HTTP_TIMEOUT_SECONDS", "15"))
+HTTP_CONNECT_TIMEOUT_SECONDS = float(os.environ.get("HTTP_CONNECT_TIMEOUT_SECONDS", "5"))
+HTTP_POOL_SIZE = int(os.environ.get("HTTP_POOL_SIZE", "100"))
+HTTP_POOL_PER_HOST = int(os.environ.get("HTTP_POOL_PER_HOST", "10"))
+HTTP_KEEPALIVE_SECONDS = float(os.environ.get("HTTP_KEEPALIVE_SECONDS", "30"))
+HTTP_DNS_TTL_SECONDS = int(os.environ.get("HTTP_DNS_TTL_SECONDS", "300"))
+HTTP_RETRIES = int(os.environ.get("HTTP_RETRIES", "2"))
+
+# Responses worth another attempt; anything else is returned to the caller as-is
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 10.0
+
+# Extra connector options per client name
+PROFILES = {
+    "default": {},
+    # Safebooru: IPv4 only and no certificate checks, as its per-call connectors always used
+    "safebooru": {"ssl": False, "family": socket.AF_INET},
+}
+
+class HTTPClients:
+    def __init__(self):
+        self._sessions = {} # name -> (loop, ClientSession)
+
+    def session(self, name: str = "default") -> aiohttp.ClientSession:
+        """The shared session for `name`, created on first use in the running loop."""
+        loop = asyncio.get_running_loop()
+        entry = self._sessions.get(name)
+        if entry and entry[0] is loop and not entry[1].closed:
+            return entry[1]
+
+        connector = aiohttp.TCPConnector(
+            limit=HTTP_POOL_SIZE,
+            limit_per_host=HTTP_POOL_PER_HOST,
+            keepalive_timeout=HTTP_KEEPALIVE_SECONDS,
+            ttl_dns_cache=HTTP_DNS_TTL_SECONDS,
+            **PROFILES.get(name, {})
+        )
+        session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=HTTP_TIMEOUT_SECONDS, connect=HTTP_CONNECT_TIMEOUT_SECONDS),
+            trust_env=True
+        )
+        self._sessions[name] = (loop, session)
+        return session
+
+    @staticmethod
+    def _retry_delay(attempt: int, resp=None) -> float:
+        if resp is not None:
+            try: return min(float(resp.headers.get("Retry-After")), RETRY_MAX_DELAY)
+            except (TypeError, ValueError): pass
+        return min(RETRY_BASE_DELAY * 2 ** attempt, RETRY_MAX_DELAY) * random.uniform(0.5, 1.0)
+
+    @contextlib.asynccontextmanager
+    async def get(self, url: str, *, client: str = "default", retries: int = HTTP_RETRIES, **kwargs):
+        """
+        GET through the shared session. Connection errors, timeouts and RETRY_STATUSES are retried
+        up to `retries` times with jittered backoff (honouring Retry-After); the last response is
+        yielded whatever its status, and released when the block exits.
+        """
+        session = self.session(client)
+        for attempt in range(retries + 1):
+            last = attempt == retries
+            try:
+                resp = await session.get(url, **kwargs)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if last: raise
+                logger.debug(f"GET {url} failed ({type(e).__name__}), retrying")
+                await asyncio.sleep(self._retry_delay(attempt))
+                continue
+
+            if resp.status in RETRY_STATUSES and not last:
+                resp.release()
+                await asyncio.sleep(self._retry_delay(attempt, resp))
+                continue
+
+            try:
+                yield resp
+            finally:
+                resp.release()
+            return
+
+    async def close(self):
+        sessions, self._sessions = self._sessions, {}
+        for _, session in sessions.values():
+            if not session.closed: await session.close()
+
+http_clients = HTTPClients()
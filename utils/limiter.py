@@ -0,0 +1,161 @@
+# utils/limiter.py
+"""
+Process-wide gateway for Gemini calls.
+
+Every call site wraps its request in a slot for the model it uses:
+
+    async with limiter.slot(model, PRIORITY_GATE):
+        response = await model.generate_content_async(prompt)
+
+Each model gets a lane with a concurrency cap and a token bucket sized from its requests-per-minute
+quota. Waiters are served strictly by priority (then arrival), and background work may only use
+part of a lane: at most half its concurrency and never the last BACKGROUND_TOKEN_RESERVE of the
+bucket, so scribe/lore/personality jobs cannot delay a player's turn or push the key into 429s.
+A 429 empties the bucket and pauses the lane with exponential backoff.
+"""
+import os
+import time
+import heapq
+import asyncio
+import itertools
+import contextlib
+import collections
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Priority classes (lower runs first)
+PRIORITY_INTERACTIVE = 0  # RPG turns, direct chat replies
+PRIORITY_GATE = 1         # "should I respond" checks, topic detection, GIF checks
+PRIORITY_BACKGROUND = 2   # Scribe, lore, personality, memory summaries, proactive chat
+
+# model -> (max concurrent calls, requests per minute)
+MODEL_LIMITS = {
+    "gemini-2.5-pro": (int(os.environ.get("LLM_PRO_CONCURRENCY", "4")), float(os.environ.get("LLM_PRO_RPM", "150"))),
+    "gemini-2.5-flash": (int(os.environ.get("LLM_FLASH_CONCURRENCY", "8")), float(os.environ.get("LLM_FLASH_RPM", "1000"))),
+}
+DEFAULT_LIMITS = (4, 60.0)
+# Share of each bucket that only interactive and gate calls may spend
+BACKGROUND_TOKEN_RESERVE = 0.2
+# Bucket holds this many seconds of quota, i.e. the largest burst allowed
+BURST_SECONDS = 10
+
+def _model_name(model) -> str:
+    """Accepts a GenerativeModel, a ChatSession or a plain name."""
+    name = getattr(model, "model_name", None) or getattr(getattr(model, "model", None), "model_name", None) or str(model)
+    return name.split("/")[-1]
+
+def _is_rate_limit(e: Exception) -> bool:
+    return type(e).__name__ in ("ResourceExhausted", "TooManyRequests") or "429" in str(e)
+
+class _Lane:
+    def __init__(self, name: str, concurrency: int, rpm: float):
+        self.name = name
+        self.concurrency = max(1, concurrency)
+        self.rate = rpm / 60.0
+        self.capacity = max(1.0, self.rate * BURST_SECONDS)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.running = 0
+        self.running_background = 0
+        self.paused_until = 0.0
+        self.backoff = 0.0
+        self._waiters = []  # (priority, seq, future)
+        self._seq = itertools.count()
+        self._timer = None
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def _can_start(self, priority: int) -> bool:
+        if time.monotonic() < self.paused_until or self.running >= self.concurrency: return False
+        if priority >= PRIORITY_BACKGROUND:
+            if self.running_background >= max(1, self.concurrency // 2): return False
+            return self.tokens >= 1 + self.capacity * BACKGROUND_TOKEN_RESERVE
+        return self.tokens >= 1
+
+    def _start(self, priority: int):
+        self.running += 1
+        self.tokens -= 1
+        if priority >= PRIORITY_BACKGROUND: self.running_background += 1
+
+    def _dispatch(self):
+        self._refill()
+        while self._waiters:
+            priority, _, future = self._waiters[0]
+            if future.done():  # Cancelled while waiting
+                heapq.heappop(self._waiters)
+                continue
+            if not self._can_start(priority): break
+            heapq.heappop(self._waiters)
+            self._start(priority)
+            future.set_result(None)
+
+        if self._timer: self._timer.cancel()
+        self._timer = None
+        if self._waiters and self.running < self.concurrency:
+            # Blocked on tokens or a 429 pause rather than concurrency: wake when that clears
+            priority = self._waiters[0][0]
+            needed = 1 + (self.capacity * BACKGROUND_TOKEN_RESERVE if priority >= PRIORITY_BACKGROUND else 0)
+            delay = max(self.paused_until - time.monotonic(), (needed - self.tokens) / self.rate if self.rate else 1.0, 0.05)
+            self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+
+    async def acquire(self, priority: int):
+        self._refill()
+        if not self._waiters and self._can_start(priority):
+            self._start(priority)
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            # Granted just as the caller was cancelled: hand the slot back
+            if future.done() and not future.cancelled(): self.release(priority)
+            raise
+
+    def release(self, priority: int):
+        self.running -= 1
+        if priority >= PRIORITY_BACKGROUND: self.running_background -= 1
+        self._dispatch()
+
+    def penalize(self):
+        self.backoff = min(max(self.backoff * 2, 2.0), 60.0)
+        self.tokens = 0
+        self.paused_until = time.monotonic() + self.backoff
+        logger.warning(f"LLM lane {self.name} hit a rate limit; pausing {self.backoff:.0f}s.")
+
+class LLMLimiter:
+    def __init__(self):
+        self._lanes = {}
+        self.stats = collections.Counter()
+
+    def _lane(self, name: str) -> _Lane:
+        lane = self._lanes.get(name)
+        if lane is None:
+            lane = self._lanes[name] = _Lane(name, *MODEL_LIMITS.get(name, DEFAULT_LIMITS))
+        return lane
+
+    @contextlib.asynccontextmanager
+    async def slot(self, model, priority: int = PRIORITY_INTERACTIVE):
+        lane = self._lane(_model_name(model))
+        queued_at = time.monotonic()
+        await lane.acquire(priority)
+        self.stats[f"calls_p{priority}"] += 1
+        self.stats[f"wait_ms_p{priority}"] += int((time.monotonic() - queued_at) * 1000)
+        try:
+            yield
+        except Exception as e:
+            if _is_rate_limit(e):
+                self.stats["rate_limited"] += 1
+                lane.penalize()
+            raise
+        else:
+            lane.backoff = 0.0
+        finally:
+            lane.release(priority)
+
+limiter = LLMLimiter()
@@ -0,0 +1,123 @@
+# utils/log_store.py
+"""
+Storage layout for the improved_logs collection.
+
+Each 10-minute bucket ("YYYY-MM-DD-HH-m") is split into documents of at most
+LOG_BUCKET_MAX_ENTRIES entries with `_id` "<bucket>-<seq:03d>", so ids sort chronologically
+and a noisy bucket rolls over into a new document instead of growing towards the 16MB limit.
+Buckets older than LOG_COMPRESS_AFTER_MINUTES are compacted into a zlib-compressed BSON blob,
+and a TTL index on created_at (see utils/db.py) expires everything after LOG_RETENTION_DAYS.
+
+Pre-rollover documents (`_id` == bucket, plain `logs` array) are still read transparently.
+"""
+import os
+import re
+import zlib
+import bson
+from datetime import datetime, timedelta, timezone
+from bson.binary import Binary
+from pymongo import UpdateOne
+from utils.db import async_logs_collection
+
+LOG_BUCKET_MAX_ENTRIES = int(os.environ.get("LOG_BUCKET_MAX_ENTRIES", "1000"))
+LOG_COMPRESS_AFTER_MINUTES = int(os.environ.get("LOG_COMPRESS_AFTER_MINUTES", "60"))
+
+def bucket_id(ts: datetime) -> str:
+    return f"{ts.strftime('%Y-%m-%d-%H')}-{ts.minute // 10}"
+
+def doc_id(bucket: str, seq: int) -> str:
+    return f"{bucket}-{seq:03d}"
+
+# --- WRITES ---
+
+async def load_heads(buckets) -> dict:
+    """bucket -> (seq, count) of the newest document already stored for each bucket."""
+    heads = {}
+    for bucket in buckets:
+        # Range over "<bucket>-000".."<bucket>-999" on _id; ':' sorts right after '9'
+        doc = await async_logs_collection.find_one(
+            {"_id": {"$gt": f"{bucket}-", "$lt": f"{bucket}-:"}}, {"seq": 1, "count": 1}, sort=[("_id", -1)]
+        )
+        if doc: heads[bucket] = (doc.get("seq", 0), doc.get("count", 0))
+    return heads
+
+def plan_writes(entries: list, heads: dict, cap: int = LOG_BUCKET_MAX_ENTRIES):
+    """
+    Groups queued entries (each carrying a "bucket" key) into one $push per target document,
+    opening the next sequence number whenever the current one would exceed `cap`.
+    Returns (ops, new_heads); the caller should only adopt new_heads once the ops are written.
+    """
+    grouped = {}
+    for e in entries:
+        e = dict(e)
+        grouped.setdefault(e.pop("bucket"), []).append(e)
+
+    ops, new_heads = [], {}
+    for bucket, batch in grouped.items():
+        seq, count = heads.get(bucket, (0, 0))
+        while batch:
+            room = cap - count
+            if room <= 0:
+                seq, count = seq + 1, 0
+                continue
+            chunk, batch = batch[:room], batch[room:]
+            ops.append(UpdateOne(
+                {"_id": doc_id(bucket, seq)},
+                {
+                    "$push": {"logs": {"$each": chunk}},
+                    "$inc": {"count": len(chunk)},
+                    "$setOnInsert": {"bucket": bucket, "seq": seq, "created_at": chunk[0]["timestamp"]}
+                },
+                upsert=True
+            ))
+            count += len(chunk)
+        new_heads[bucket] = (seq, count)
+    return ops, new_heads
+
+async def compact_buckets(older_than_minutes: int = LOG_COMPRESS_AFTER_MINUTES, limit: int = 200) -> int:
+    """Compresses the `logs` array of closed buckets into `blob`. Returns the number of documents compacted."""
+    cutoff = datetime.now(timezone.utc) - timedelta(minutes=older_than_minutes)
+    cursor = async_logs_collection.find({"created_at": {"$lt": cutoff}, "logs.0": {"$exists": True}}).limit(limit)
+    compacted = 0
+    async for doc in cursor:
+        entries = decode_entries(doc)
+        blob = zlib.compress(bson.encode({"logs": entries}), 6)
+        # Only swap if no late write landed on this document since we read it
+        result = await async_logs_collection.update_one(
+            {"_id": doc["_id"], "count": doc.get("count")},
+            {"$set": {"blob": Binary(blob), "count": len(entries), "compressed": True}, "$unset": {"logs": ""}}
+        )
+        compacted += result.modified_count
+    return compacted
+
+# --- READS ---
+
+def decode_entries(doc: dict) -> list:
+    """All entries of a stored document, compressed part first."""
+    entries = []
+    if doc.get("blob"):
+        entries.extend(bson.decode(zlib.decompress(doc["blob"]))["logs"])
+    entries.extend(doc.get("logs") or [])
+    return entries
+
+async def tail(n: int, date_str: str = None) -> list:
+    """
+    The last `n` entries (oldest first), optionally within one day ("YYYY-MM-DD").
+    Walks documents newest-first by _id and asks the server for only the last n entries of each
+    uncompressed array, so a full bucket is never shipped to show a screenful of lines.
+    """
+    query = {"_id": {"$regex": f"^{re.escape(date_str)}"}} if date_str else {}
+    cursor = async_logs_collection.find(query, {"logs": {"$slice": -n}}).sort("_id", -1).batch_size(4)
+    collected = []
+    async for doc in cursor:
+        collected.extend(decode_entries(doc)[-(n - len(collected)):])
+        if len(collected) >= n: break
+    collected.sort(key=lambda x: x["timestamp"])
+    return collected[-n:]
+
+async def entries_for_date(date_str: str) -> list:
+    entries = []
+    async for doc in async_logs_collection.find({"_id": {"$regex": f"^{re.escape(date_str)}"}}):
+        entries.extend(decode_entries(doc))
+    entries.sort(key=lambda x: x["timestamp"])
+    return entries
@@ -0,0 +1,47 @@
+# utils/single_flight.py
+import asyncio
+
+class SingleFlight:
+    """
+    Collapses concurrent calls for the same key into one: the first caller (the leader) runs
+    `fn()`, later callers await its outcome. A failure reaches every waiter. If the leader is
+    cancelled, waiters are not: they retry, and one of them becomes the new leader.
+    """
+    def __init__(self):
+        self._inflight = {} # key -> Future
+
+    def __contains__(self, key):
+        return key in self._inflight
+
+    def forget(self, key=None):
+        """Detaches in-flight calls (one key, or all) so the next caller starts a fresh one."""
+        if key is None: self._inflight.clear()
+        else: self._inflight.pop(key, None)
+
+    async def run(self, key, fn):
+        while True:
+            pending = self._inflight.get(key)
+            if pending is None: break
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                task = asyncio.current_task()
+                if not pending.cancelled() or (task is not None and task.cancelling()): raise
+                # Only the leader was cancelled: try again
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception() # Nobody may be waiting; retrieving it avoids "exception never retrieved"
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            if self._inflight.get(key) is future: del self._inflight[key]
@@ -0,0 +1,88 @@
+# utils/tag_index.py
+import bisect
+import gzip
+import heapq
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+TAG_INDEX_PATH = os.environ.get("TAG_INDEX_PATH", os.path.join("data", "safebooru_tags.tsv.gz"))
+
+class TagIndex:
+    """
+    Safebooru tag names and post counts as two parallel arrays sorted by name. Every tag starting
+    with a prefix sits in one contiguous slice found with bisect, and the slice's most-used tags
+    are the suggestions. Short prefixes cover huge slices, so their answers are memoized until the
+    next reload. Persisted as a gzipped "name<TAB>count" file.
+    """
+    SCAN_LIMIT = 512 # Slices up to this size are ranked on every call
+
+    def __init__(self, path: str = TAG_INDEX_PATH):
+        self.path = path
+        self._data = ([], []) # (names, counts), swapped as one tuple so readers never see a mix
+        self._memo = {}
+        self.updated_at = 0.0 # When the data was downloaded (file mtime after a load)
+
+    def __len__(self):
+        return len(self._data[0])
+
+    def age(self) -> float:
+        return time.time() - self.updated_at if self.updated_at else float("inf")
+
+    def replace(self, pairs):
+        """Installs a fresh [(name, count)] dump (any order, duplicates keep the highest count)."""
+        best = {}
+        for name, count in pairs:
+            name = name.strip().lower()
+            if name and count > best.get(name, -1): best[name] = count
+        names = sorted(best)
+        self._data = (names, [best[n] for n in names])
+        self._memo = {}
+        self.updated_at = time.time()
+
+    def search(self, prefix: str, limit: int = 10) -> list:
+        """Up to `limit` tag names starting with `prefix`, most-used first."""
+        names, counts = self._data
+        prefix = prefix.strip().lower().replace(" ", "_")
+        lo = bisect.bisect_left(names, prefix)
+        hi = bisect.bisect_left(names, prefix + "\U0010ffff", lo)
+        if hi - lo > self.SCAN_LIMIT:
+            cached = self._memo.get((prefix, limit))
+            if cached is not None: return cached
+        best = heapq.nlargest(limit, range(lo, hi), key=counts.__getitem__)
+        result = [names[i] for i in best]
+        if hi - lo > self.SCAN_LIMIT: self._memo[(prefix, limit)] = result
+        return result
+
+    # --- PERSISTENCE (blocking; run in a thread) ---
+
+    def save(self):
+        names, counts = self._data
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with gzip.open(tmp, "wt", encoding="utf-8") as f:
+            for name, count in zip(names, counts): f.write(f"{name}\t{count}\n")
+        os.replace(tmp, self.path)
+
+    def load(self) -> bool:
+        if not os.path.exists(self.path): return False
+        try:
+            names, counts = [], []
+            with gzip.open(self.path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    name, _, count = line.rstrip("\n").rpartition("\t")
+                    if name:
+                        names.append(name)
+                        counts.append(int(count))
+        except Exception as e:
+            logger.warning(f"Tag index at {self.path} is unreadable: {e}")
+            return False
+        self._data = (names, counts) # Written sorted by save()
+        self._memo = {}
+        self.updated_at = os.path.getmtime(self.path)
+        logger.info(f"Loaded {len(names)} tags from {self.path}.")
+        return True
+
+tag_index = TagIndex()
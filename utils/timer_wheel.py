@@ -0,0 +1,62 @@
+# utils/timer_wheel.py
+import math
+
+class TimerWheel:
+    """
+    Hierarchical timer wheel. Level 0 has `slots` buckets of `tick` seconds; each bucket of a
+    higher level spans one full rotation of the level below (3 levels x 60 one-second slots
+    cover 60 hours). Entries cascade down a level when their bucket comes round, so adding a
+    timer and expiring it are O(1) no matter how many are pending, and nothing sleeps per timer.
+
+    Timers further out than the wheel covers are parked in the top level and re-placed each
+    time their bucket comes round.
+    """
+    def __init__(self, start: float, tick: float = 1.0, slots: int = 60, levels: int = 3):
+        self.tick = tick
+        self.slots = slots
+        self.levels = levels
+        self._wheels = [[[] for _ in range(slots)] for _ in range(levels)]
+        self._now = int(start // tick)  # Last tick processed
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def add(self, due: float, item):
+        """Schedules `item` for the first tick at or after `due` (epoch seconds); past times fire on the next tick."""
+        self._place(max(math.ceil(due / self.tick), self._now + 1), item)
+        self._count += 1
+
+    def _place(self, t: int, item):
+        delta = t - self._now
+        for level in range(self.levels):
+            if delta < self.slots ** (level + 1) or level == self.levels - 1:
+                idx = (t // self.slots ** level) % self.slots
+                self._wheels[level][idx].append((t, item))
+                return
+
+    def advance(self, now: float) -> list:
+        """Moves the wheel up to `now` and returns the items that expired, oldest tick first."""
+        target = int(now // self.tick)
+        if self._count == 0:
+            self._now = max(self._now, target)
+            return []
+
+        expired = []
+        while self._now < target:
+            self._now += 1
+            t = self._now
+            # Cascade from the highest level whose rotation boundary this tick crosses
+            for level in range(self.levels - 1, 0, -1):
+                if t % (self.slots ** level) == 0:
+                    idx = (t // self.slots ** level) % self.slots
+                    bucket, self._wheels[level][idx] = self._wheels[level][idx], []
+                    for due_tick, item in bucket: self._place(due_tick, item)
+
+            idx = t % self.slots
+            bucket, self._wheels[0][idx] = self._wheels[0][idx], []
+            for due_tick, item in bucket:
+                if due_tick <= t: expired.append(item)
+                else: self._place(due_tick, item)
+        self._count -= len(expired)
+        return expired
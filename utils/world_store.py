@@ -0,0 +1,231 @@
+# utils/world_store.py
+"""
+RPG world-state storage with two layouts:
+
+- legacy: one rpg_world_state document per thread holding npcs/locations/quests/events as nested maps.
+- entity store: the rpg_world_state document keeps only thread-level fields (environment, story_log)
+  and is flagged `entity_store: True`; every NPC/location/quest/event is its own rpg_world_entities
+  document, indexed by (thread_id, category, status / location) so callers load only what they need.
+
+Callers go through these helpers and get the legacy nested shape back either way.
+"""
+from pymongo import UpdateOne, ReplaceOne, DeleteOne
+from utils.db import async_rpg_world_state_collection, async_rpg_world_entities_collection
+
+# Categories the world sheet knows about; tools may create others, which are stored the same way
+ENTITY_MAPS = ("npcs", "locations", "quests", "events")
+# Fields on entity documents that are storage bookkeeping rather than entity payload
+_INTERNAL_FIELDS = ("_id", "thread_id", "category", "key", "status_key", "loc_key", "is_companion")
+
+def entity_key(name: str) -> str:
+    """Map key / document key for an entity name (Mongo field names cannot contain '.' or '$')."""
+    return name.strip().replace('.', '_').replace('$', '')
+
+def to_entity_doc(thread_id, category: str, key: str, payload: dict) -> dict:
+    """Entity payload -> rpg_world_entities document, with the derived fields the indexes use."""
+    attrs = payload.get("attributes") or {}
+    role = str(attrs.get("role", "")).lower()
+    doc = dict(payload)
+    doc.update({
+        "thread_id": int(thread_id),
+        "category": category.lower(),
+        "key": key,
+        "status_key": str(payload.get("status", "background")).lower(),
+        "loc_key": str(attrs.get("location", "")).lower().strip(),
+        "is_companion": "companion" in role or "party" in role,
+    })
+    return doc
+
+def from_entity_doc(doc: dict) -> dict:
+    return {k: v for k, v in doc.items() if k not in _INTERNAL_FIELDS}
+
+# --- READS ---
+
+async def load_world(thread_id, categories=None, world_doc=None) -> dict:
+    """
+    Returns the world in the legacy nested shape ({} if none). `categories` (e.g. ("quests",))
+    limits which entity maps are loaded; thread-level fields are always included.
+    """
+    tid = int(thread_id)
+    if world_doc is None:
+        projection = None
+        if categories is not None:
+            projection = {"npcs": 0, "locations": 0, "quests": 0, "events": 0}
+            for c in categories: projection.pop(c, None)
+        world_doc = await async_rpg_world_state_collection.find_one({"thread_id": tid}, projection)
+    if not world_doc: return {}
+    if not world_doc.get("entity_store"): return world_doc
+
+    world = dict(world_doc)
+    query = {"thread_id": tid}
+    if categories is not None:
+        query["category"] = {"$in": [c[:-1] for c in categories]}
+        for c in categories: world.setdefault(c, {})
+    else:
+        for c in ENTITY_MAPS: world.setdefault(c, {})
+    async for doc in async_rpg_world_entities_collection.find(query).sort("_id", 1):
+        world.setdefault(doc["category"] + "s", {})[doc["key"]] = from_entity_doc(doc)
+    return world
+
+async def find_entities(thread_id, category: str, query: dict = None, projection: dict = None, sort=None, limit: int = 0) -> list:
+    """Entity-store query for one category; `query` may use status_key / loc_key / is_companion."""
+    q = {"thread_id": int(thread_id), "category": category}
+    if query: q.update(query)
+    cursor = async_rpg_world_entities_collection.find(q, projection)
+    if sort: cursor = cursor.sort(sort)
+    if limit: cursor = cursor.limit(limit)
+    return [from_entity_doc(d) async for d in cursor]
+
+async def entity_keys(thread_id, categories=("npcs", "locations")) -> list:
+    """Map keys of the given categories, without loading entity bodies."""
+    world_doc = await async_rpg_world_state_collection.find_one(
+        {"thread_id": int(thread_id)}, {"entity_store": 1, **{c: 1 for c in categories}}
+    ) or {}
+    if not world_doc.get("entity_store"):
+        return [k for c in categories for k in world_doc.get(c, {}).keys()]
+    cursor = async_rpg_world_entities_collection.find(
+        {"thread_id": int(thread_id), "category": {"$in": [c[:-1] for c in categories]}}, {"key": 1}
+    )
+    return [d["key"] async for d in cursor]
+
+# --- WRITES ---
+
+async def set_entity(thread_id, category: str, name: str, payload: dict, old_name: str = None):
+    """Upserts one entity (optionally renaming it from old_name) in whichever layout the thread uses."""
+    tid = int(thread_id)
+    plural = category.lower() + "s"
+    key = entity_key(name)
+    world_doc = await async_rpg_world_state_collection.find_one({"thread_id": tid}, {"entity_store": 1}) or {}
+
+    if world_doc.get("entity_store"):
+        if old_name and entity_key(old_name) != key:
+            await async_rpg_world_entities_collection.delete_one({"thread_id": tid, "category": category.lower(), "key": entity_key(old_name)})
+        await async_rpg_world_entities_collection.update_one(
+            {"thread_id": tid, "category": category.lower(), "key": key},
+            {"$set": to_entity_doc(tid, category, key, payload)}, upsert=True
+        )
+        return
+
+    if old_name and entity_key(old_name) != key:
+        await async_rpg_world_state_collection.update_one({"thread_id": tid}, {"$unset": {f"{plural}.{entity_key(old_name)}": ""}})
+    await async_rpg_world_state_collection.update_one({"thread_id": tid}, {"$set": {f"{plural}.{key}": payload}}, upsert=True)
+
+async def delete_entity(thread_id, category: str, name: str):
+    tid = int(thread_id)
+    key = entity_key(name)
+    world_doc = await async_rpg_world_state_collection.find_one({"thread_id": tid}, {"entity_store": 1}) or {}
+    if world_doc.get("entity_store"):
+        await async_rpg_world_entities_collection.delete_one({"thread_id": tid, "category": category.lower(), "key": key})
+    else:
+        await async_rpg_world_state_collection.update_one({"thread_id": tid}, {"$unset": {f"{category.lower()}s.{key}": ""}})
+
+async def replace_world(thread_id, world: dict):
+    """
+    Writes a full nested-shape world (e.g. a snapshot) back. In entity-store mode only entities
+    that differ from what is stored are rewritten.
+    """
+    tid = int(thread_id)
+    world = {k: v for k, v in world.items() if k != "_id"}
+    world["thread_id"] = tid
+    current = await async_rpg_world_state_collection.find_one({"thread_id": tid}, {"entity_store": 1}) or {}
+    if not current.get("entity_store"):
+        world.pop("entity_store", None)
+        await async_rpg_world_state_collection.replace_one({"thread_id": tid}, world, upsert=True)
+        return
+
+    entity_maps = {k: world.pop(k) for k in list(world.keys()) if k in ENTITY_MAPS or _is_entity_map(world[k])}
+    world["entity_store"] = True
+    await async_rpg_world_state_collection.replace_one({"thread_id": tid}, world, upsert=True)
+
+    stored = {}
+    async for doc in async_rpg_world_entities_collection.find({"thread_id": tid}):
+        stored[(doc["category"], doc["key"])] = doc
+
+    ops = []
+    wanted = set()
+    for plural, entities in entity_maps.items():
+        for key, payload in (entities or {}).items():
+            ident = (plural[:-1], key)
+            wanted.add(ident)
+            doc = to_entity_doc(tid, plural[:-1], key, payload)
+            old = stored.get(ident)
+            if old is not None and from_entity_doc(old) == payload: continue
+            if old is not None: doc["_id"] = old["_id"] # Keep insertion order (events are read newest-by-_id)
+            ops.append(ReplaceOne({"thread_id": tid, "category": ident[0], "key": key}, doc, upsert=True))
+    for ident, old in stored.items():
+        if ident not in wanted: ops.append(DeleteOne({"_id": old["_id"]}))
+    if ops: await async_rpg_world_entities_collection.bulk_write(ops, ordered=False)
+
+async def reset_entities(thread_id):
+    """Clears all entities and the environment (used when a rewind removes every turn)."""
+    tid = int(thread_id)
+    world_doc = await async_rpg_world_state_collection.find_one({"thread_id": tid}, {"entity_store": 1}) or {}
+    if world_doc.get("entity_store"):
+        await async_rpg_world_state_collection.update_one({"thread_id": tid}, {"$set": {"environment": {}}})
+        await async_rpg_world_entities_collection.delete_many({"thread_id": tid})
+    else:
+        await async_rpg_world_state_collection.update_one(
+            {"thread_id": tid},
+            {"$set": {"quests": {}, "npcs": {}, "locations": {}, "events": {}, "environment": {}}}
+        )
+
+async def demote_background_npcs(thread_id) -> int:
+    """Sets every non-companion NPC that isn't already background to 'background'. Returns the count."""
+    tid = int(thread_id)
+    world_doc = await async_rpg_world_state_collection.find_one({"thread_id": tid}, {"entity_store": 1, "npcs": 1}) or {}
+    if world_doc.get("entity_store"):
+        result = await async_rpg_world_entities_collection.update_many(
+            {"thread_id": tid, "category": "npc", "is_companion": False, "status_key": {"$ne": "background"}},
+            {"$set": {"status": "background", "status_key": "background"}}
+        )
+        return result.modified_count
+
+    fields = {}
+    for key, npc in world_doc.get("npcs", {}).items():
+        role = str((npc.get("attributes") or {}).get("role", "")).lower()
+        if "companion" in role or "party" in role: continue
+        if npc.get("status") != "background": fields[f"npcs.{key}.status"] = "background"
+    if fields: await async_rpg_world_state_collection.update_one({"thread_id": tid}, {"$set": fields})
+    return len(fields)
+
+async def delete_thread(thread_id):
+    await async_rpg_world_state_collection.delete_one({"thread_id": int(thread_id)})
+    await async_rpg_world_entities_collection.delete_many({"thread_id": int(thread_id)})
+
+# --- MIGRATION ---
+
+def _is_entity_map(value) -> bool:
+    return isinstance(value, dict) and bool(value) and all(isinstance(v, dict) and "name" in v for v in value.values())
+
+async def migrate_thread(thread_id) -> int:
+    """Moves one thread from the legacy layout into the entity store. Idempotent; returns entities moved."""
+    tid = int(thread_id)
+    world_doc = await async_rpg_world_state_collection.find_one({"thread_id": tid})
+    if not world_doc or world_doc.get("entity_store"): return 0
+
+    maps = [k for k, v in world_doc.items() if k in ENTITY_MAPS or (k != "environment" and _is_entity_map(v))]
+    ops = []
+    for plural in maps:
+        # Dict order is insertion order, so _ids (and "latest events") keep the original ordering
+        for key, payload in (world_doc.get(plural) or {}).items():
+            ops.append(UpdateOne(
+                {"thread_id": tid, "category": plural[:-1], "key": key},
+                {"$set": to_entity_doc(tid, plural[:-1], key, payload)}, upsert=True
+            ))
+    if ops: await async_rpg_world_entities_collection.bulk_write(ops, ordered=True)
+
+    # Flip the flag and drop the maps in one update, but only if nothing was written meanwhile
+    unset = {k: "" for k in maps}
+    result = await async_rpg_world_state_collection.update_one(
+        {"_id": world_doc["_id"], **{k: world_doc[k] for k in maps}},
+        {"$set": {"entity_store": True}, **({"$unset": unset} if unset else {})}
+    )
+    if result.modified_count == 0:
+        raise RuntimeError(f"World state for thread {tid} changed during migration; run it again.")
+    return len(ops)
+
+async def enable_for_new_thread(thread_id):
+    """New adventures start directly in the entity store."""
+    await async_rpg_world_state_collection.update_one(
+        {"thread_id": int(thread_id)}, {"$set": {"entity_store": True}}, upsert=True
+    )